@@ -0,0 +1,17 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def cache_home(monkeypatch, tmp_path):
+    """Keeps the package caches the tests build out of the user's cache"""
+    cache_home = tmp_path / "cache"
+    monkeypatch.setenv("XDG_CACHE_HOME", str(cache_home))
+    return cache_home
+
+
+@pytest.fixture(autouse=True)
+def runtime_dir(monkeypatch, tmp_path):
+    """Keeps the commands tested from forwarding to a tinyget daemon the user runs"""
+    runtime_dir = tmp_path / "run"
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(runtime_dir))
+    return runtime_dir
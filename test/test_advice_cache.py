@@ -0,0 +1,118 @@
+import time
+import pytest
+from tinyget.common_utils import setup_logger
+from tinyget.globals import global_configs
+from tinyget.interact import advice_cache, ai_helper
+from tinyget.interact.advice_cache import (
+    get_advice_key,
+    get_advice_stats,
+    get_error_signature,
+    lookup_advice,
+    normalize,
+    store_advice,
+)
+from tinyget.interact.ai_helper import get_advice
+
+setup_logger(debug=True)
+
+APT_STDERR = """WARNING: apt does not have a stable CLI interface.
+E: Unable to locate package foo
+"""
+
+
+def test_normalize():
+    assert (
+        normalize("Get:1 http://deb.debian.org/debian bookworm/main vim 2:9.0.1378-2")
+        == "Get:<n> <url> bookworm/main vim <version>"
+    )
+    assert (
+        normalize("E: Could not get lock /var/lib/dpkg/lock-frontend. It is held by")
+        == "E: Could not get lock <path> It is held by"
+    )
+    assert normalize("2024-04-01 10:00:00 upgrade  libc6:amd64") == (
+        "<time> upgrade libc6:amd64"
+    )
+    assert normalize("error: failed retrieving file 'zsh-5.9-4-x86_64.pkg'") == (
+        "error: failed retrieving file 'zsh-<version>'"
+    )
+    assert normalize("python3.11 lib32-glibc") == "python3.11 lib32-glibc"
+
+
+def test_advice_key():
+    key = get_advice_key(["apt-get", "install", "-y", "foo"], "", APT_STDERR)
+    assert get_error_signature("", APT_STDERR) == ["E: Unable to locate package foo"]
+    # versions, paths and timestamps don't matter
+    assert key == get_advice_key(
+        "apt-get install -y foo", "Reading package lists... Done\n", APT_STDERR
+    )
+    assert get_advice_key(
+        "apt-get install vim=2:9.0.1378-2",
+        None,
+        "E: Version '2:9.0.1378-2' for 'vim' was not found",
+    ) == get_advice_key(
+        "apt-get install vim=2:9.0.1378-3",
+        None,
+        "E: Version '2:9.0.1378-3' for 'vim' was not found",
+    )
+    # other packages or errors do
+    assert key != get_advice_key("apt-get install -y bar", "", APT_STDERR)
+    assert key != get_advice_key(
+        "apt-get install -y foo", "", "E: Could not get lock /var/lib/dpkg/lock"
+    )
+    # no error line, the last lines are the signature
+    assert get_error_signature("a\nb 12\n", None) == ["a", "b <n>"]
+
+
+def test_advice_cache(monkeypatch):
+    assert lookup_advice("a") is None
+    store_advice("a", "Run `apt update`")
+    assert lookup_advice("a") == "Run `apt update`"
+    assert get_advice_stats() == {"entries": 1, "hits": 1, "misses": 1}
+    # least recently used evicted
+    monkeypatch.setitem(global_configs, "advice_cache_size", 2)
+    store_advice("b", "b")
+    lookup_advice("a")
+    store_advice("c", "c")
+    assert lookup_advice("b") is None
+    assert lookup_advice("a") is not None and lookup_advice("c") is not None
+    # expired
+    monkeypatch.setattr(time, "time", lambda: 1e12)
+    assert lookup_advice("a") is None
+    assert get_advice_stats()["entries"] == 0
+
+
+class FakeAIHelper:
+    def __init__(self):
+        self.asked = 0
+
+    def fix_command_stream(self, command, stdout=None, stderr=None):
+        self.asked += 1
+        yield "Run "
+        yield "`apt update`"
+
+
+def test_get_advice(monkeypatch):
+    helper = FakeAIHelper()
+    monkeypatch.setattr(ai_helper, "try_to_get_ai_helper", lambda: helper)
+    args = ["apt-get", "install", "foo"]
+    assert "".join(get_advice(args, "", APT_STDERR)) == "Run `apt update`"
+    assert helper.asked == 1
+    # answered offline
+    monkeypatch.setattr(ai_helper, "try_to_get_ai_helper", lambda: None)
+    assert "".join(get_advice(args, "", APT_STDERR)) == "Run `apt update`"
+    assert get_advice(["apt-get", "install", "bar"], "", APT_STDERR) is None
+    # an advice which didn't fully arrive is not cached
+    monkeypatch.setattr(ai_helper, "try_to_get_ai_helper", lambda: helper)
+    advice = get_advice(["apt-get", "remove", "foo"], "", APT_STDERR)
+    next(advice)
+    advice.close()
+    assert get_advice_stats()["entries"] == 1
+    # disabled by `tinyget config --no-advice-cache`
+    monkeypatch.setitem(global_configs, "advice_cache", False)
+    "".join(get_advice(args, "", APT_STDERR))
+    assert helper.asked == 3
+    assert advice_cache.get_advice_stats()["hits"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,216 @@
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from rich.console import Console
+from tinyget.common_utils import setup_logger
+from tinyget.globals import global_configs
+from tinyget.interact import ai_helper
+from tinyget.interact.ai_helper import AIHelper, print_advice, try_to_get_ai_helper
+
+setup_logger(debug=True)
+
+
+@pytest.fixture
+def silent_host():
+    """A host accepting connections and never answering"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        s.listen(8)
+        yield f"http://127.0.0.1:{s.getsockname()[1]}"
+
+
+@pytest.fixture
+def configured(monkeypatch, silent_host):
+    monkeypatch.setenv("OPENAI_API_HOST", silent_host)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("DEFAULT_MODEL", "test-model")
+    monkeypatch.setenv("MAX_TOKENS", "16")
+    monkeypatch.setattr(ai_helper, "_helpers", {})
+    monkeypatch.setitem(global_configs, "ai_timeout", 0.2)
+    return silent_host
+
+
+def test_import_does_not_contact_ai_helper(configured):
+    code = "import sys, tinyget.wrappers; print('requests' in sys.modules)"
+    p = subprocess.run(
+        [sys.executable, "-c", code],
+        stdout=subprocess.PIPE,
+        env=dict(os.environ, LANG="C.UTF-8"),
+        check=True,
+        timeout=30,
+    )
+    assert p.stdout.decode().strip() == "False"
+
+
+def test_ai_helper_health_cached(configured, monkeypatch):
+    checks = []
+
+    def ok(self):
+        checks.append(self.host)
+        return True
+
+    monkeypatch.setattr(AIHelper, "ok", ok)
+    helper = try_to_get_ai_helper()
+    assert helper is not None and helper.timeout == 0.2
+    assert try_to_get_ai_helper() is helper
+    assert len(checks) == 1
+    # another tinyget process reads the health checked
+    ai_helper._helpers.clear()
+    assert try_to_get_ai_helper() is not None
+    assert len(checks) == 1
+    # checked again once the TTL expired
+    ai_helper._helpers.clear()
+    monkeypatch.setitem(global_configs, "ai_health_ttl", 0)
+    assert try_to_get_ai_helper() is not None
+    assert len(checks) == 2
+
+
+def test_ai_helper_timeout(configured, monkeypatch):
+    start = time.monotonic()
+    assert try_to_get_ai_helper() is None
+    assert time.monotonic() - start < 2
+    # the failure is remembered, the next commands don't wait for the endpoint again
+    ai_helper._helpers.clear()
+    monkeypatch.setattr(AIHelper, "ok", lambda self: pytest.fail("checked again"))
+    assert try_to_get_ai_helper() is None
+
+
+def test_ai_helper_not_configured(monkeypatch):
+    for name in ["OPENAI_API_HOST", "OPENAI_API_KEY", "DEFAULT_MODEL", "MAX_TOKENS"]:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setitem(global_configs, "config_path", "/nonexistent/config.json")
+    monkeypatch.setattr(AIHelper, "ok", lambda self: pytest.fail("not configured"))
+    assert try_to_get_ai_helper() is None
+
+
+class StubAPI(ThreadingHTTPServer):
+    """A local OpenAI-compatible API answering with keep-alive connections"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.requests = []
+        self.clients = set()
+        # statuses answered before the real answers
+        self.failures = []
+        self.answer = ["Run ", "`apt ", "update`"]
+        # set by the test to let the stream go on after its first event
+        self.resume = threading.Event()
+        self.resume.set()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def handle_request(self, body=None):
+        server = self.server
+        server.requests.append((self.command, self.path, body))
+        server.clients.add(self.client_address)
+        if server.failures:
+            self.send_json(server.failures.pop(0), {"error": "busy"})
+        elif self.path == "/v1/models":
+            self.send_json(200, {"data": [{"id": "test-model"}]})
+        elif not body.get("stream"):
+            content = "".join(server.answer)
+            self.send_json(200, {"choices": [{"message": {"content": content}}]})
+        else:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.send_chunk(b": keep-alive\n\n")
+            for i, part in enumerate(server.answer):
+                event = {"choices": [{"delta": {"content": part}}]}
+                self.send_chunk(f"data: {json.dumps(event)}\n\n".encode())
+                if i == 0:
+                    server.resume.wait(5)
+            self.send_chunk(b"data: [DONE]\n\n")
+            self.send_chunk(b"")
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.handle_request(json.loads(self.rfile.read(length)))
+
+
+@pytest.fixture
+def api(monkeypatch):
+    server = StubAPI()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(ai_helper, "_session", None)
+    monkeypatch.setattr(ai_helper, "AI_RETRY_BACKOFF", 0.01)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_ai_helper_session(api):
+    helper = AIHelper(host=api.url, api_key="sk-test", model="test-model", timeout=5)
+    assert helper.ok()
+    assert helper.fix_command(["apt", "install", "foo"]) == "Run `apt update`"
+    # one connection kept alive for the requests
+    assert len(api.requests) == 3
+    assert len(api.clients) == 1
+    # busy API retried
+    api.failures = [503, 429]
+    assert helper.ask("again") == "Run `apt update`"
+    assert len(api.requests) == 6
+
+
+def test_ai_helper_stream(api):
+    helper = AIHelper(host=api.url, api_key="sk-test", model="test-model", timeout=5)
+    api.resume.clear()
+    advice = helper.fix_command_stream("apt install foo", "", "E: Unable to locate")
+    # the first part arrives while the API is still generating the rest
+    assert next(advice) == "Run "
+    api.resume.set()
+    assert "".join(advice) == "`apt update`"
+    assert api.requests[0][2]["stream"] is True
+
+    console = Console(file=io.StringIO(), width=60)
+    advice = helper.fix_command_stream("apt install foo")
+    answer = print_advice(console, advice, status="Asking", title="Advice")
+    assert answer == "Run `apt update`"
+    assert "Run `apt update`" in console.file.getvalue()
+
+
+def test_print_advice_failure(api):
+    helper = AIHelper(host=api.url, api_key="sk-test", model="test-model", timeout=5)
+    api.failures = [500] * 4
+    console = Console(file=io.StringIO())
+    advice = helper.fix_command_stream("apt install foo")
+    assert print_advice(console, advice, status="Asking", title="Advice") == ""
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,247 @@
+import io
+import os
+import re
+import shutil
+import time
+import tracemalloc
+import pytest
+from tinyget.common_utils import logger, setup_logger
+from tinyget.package import ManagerType, Package
+from tinyget.globals import global_configs
+from tinyget.wrappers._apt import (
+    _,
+    iter_history,
+    iter_packages,
+    parse_apt_list,
+    parse_install_status,
+)
+from tinyget.wrappers._dpkg import compare_versions, iter_native_packages
+
+setup_logger(debug=True)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+DPKG_ROOT = os.path.join(FIXTURES, "dpkg")
+
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), "r") as f:
+        return f.read()
+
+
+def legacy_parse_apt_list(content: str):
+    """The block / regex parser get_packages used before streaming"""
+    installed_regex = re.compile(
+        r"^(?P<package_name>.+)/(?P<repo>.+)\s(?P<version>.+)\s(?P<architecture>.+)"
+        r"\s\[(?P<install_status>.+)\]\n  (?P<description>.+)$",
+        re.MULTILINE,
+    )
+    uninstalled_regex = re.compile(
+        r"^(?P<package_name>.+)/(?P<repo>.+)\s(?P<version>.+)\s(?P<architecture>.+)"
+        r"\n  (?P<description>.+)$",
+        re.MULTILINE,
+    )
+    packages = []
+    for block in content.split("\n\n"):
+        match = installed_regex.search(block)
+        if match:
+            fields = parse_install_status(
+                match.group("install_status"), match.group("version")
+            )
+        else:
+            match = uninstalled_regex.search(block)
+            if not match:
+                continue
+            fields = {
+                "installed": False,
+                "automatically_installed": False,
+                "upgradable": False,
+                "version": match.group("version"),
+                "available_version": None,
+            }
+        packages.append(
+            Package(
+                package_type=ManagerType.apt,
+                package_name=match.group("package_name"),
+                architecture=match.group("architecture"),
+                description=match.group("description"),
+                remain={"repo": match.group("repo").split(",")},
+                **fields,
+            )
+        )
+    return packages
+
+
+def parse(content: str):
+    return list(parse_apt_list(line.rstrip("\n") for line in io.StringIO(content)))
+
+
+def test_parse_apt_list():
+    packages = {
+        p.package_name + ":" + p.architecture: p
+        for p in parse(load_fixture("apt_list_v.txt"))
+    }
+    adduser = packages["adduser:all"]
+    assert adduser.installed
+    assert adduser.remain == {"repo": ["now"]}
+    assert adduser.description == "add and remove users and groups"
+    libc = packages["libc6:amd64"]
+    assert libc.installed and libc.automatically_installed
+    assert libc.remain == {"repo": ["stable", "now"]}
+    vim = packages["vim:amd64"]
+    assert vim.upgradable and vim.installed
+    assert vim.version == "2:9.0.1378-2"
+    assert vim.available_version == "2:9.0.1378-2+deb12u1"
+    zsh = packages["zsh:i386"]
+    assert not zsh.installed
+    assert zsh.version == "5.9-4+b2"
+    assert zsh.available_version is None
+
+
+def test_parse_apt_list_matches_legacy():
+    content = load_fixture("apt_list_v.txt")
+    assert parse(content) == legacy_parse_apt_list(content)
+
+
+def test_parse_apt_list_is_lazy():
+    def lines():
+        yield "Listing..."
+        yield "zsh/stable 5.9-4+b2 amd64"
+        yield "  shell with lots of features"
+        raise AssertionError("read past the first package")
+
+    assert next(parse_apt_list(lines())).package_name == "zsh"
+
+
+def test_benchmark_parse_apt_list():
+    # about 70k package versions, as on a Debian box with a few repos
+    fixture = load_fixture("apt_list_v.txt")
+    content = fixture * (70000 // fixture.count("\n\n"))
+
+    def measure(fn):
+        start = time.perf_counter()
+        count = fn()
+        elapsed = time.perf_counter() - start
+        # tracing slows everything down, measure memory in a second run
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return count, elapsed, peak
+
+    legacy = measure(lambda: len(legacy_parse_apt_list(content)))
+    # count without keeping the packages, as a consumer of the stream would
+    streaming = measure(
+        lambda: sum(
+            1 for _ in parse_apt_list(l.rstrip("\n") for l in io.StringIO(content))
+        )
+    )
+    logger.info(
+        f"apt list -v, {legacy[0]} packages: legacy {legacy[1] * 1000:.0f}ms "
+        f"peak {legacy[2] / 1024 / 1024:.1f}MB, streaming {streaming[1] * 1000:.0f}ms "
+        f"peak {streaming[2] / 1024 / 1024:.1f}MB"
+    )
+    assert legacy[0] == streaming[0]
+    assert streaming[2] < legacy[2]
+
+
+def native(softs: str = ""):
+    return {
+        p.package_name + ":" + p.architecture: p
+        for p in iter_native_packages(
+            softs,
+            status_path=os.path.join(DPKG_ROOT, "status"),
+            extended_states_path=os.path.join(DPKG_ROOT, "extended_states"),
+            lists_dir=os.path.join(DPKG_ROOT, "lists"),
+        )
+    }
+
+
+def test_compare_versions():
+    assert compare_versions("1.0", "1.0") == 0
+    assert compare_versions("1.0~rc1", "1.0") < 0
+    assert compare_versions("1.0", "1.0+b1") < 0
+    assert compare_versions("1.10", "1.9") > 0
+    assert compare_versions("1:0.1", "2.0") > 0
+    assert compare_versions("2:9.0.1378-2", "2:9.0.1378-2+deb12u1") < 0
+    assert compare_versions("1.0-1", "1.0-10") < 0
+    assert compare_versions("1.0a", "1.0+") < 0
+
+
+def test_native_packages():
+    packages = native()
+    # removed packages with config files left are not listed
+    assert list(packages) == [
+        "adduser:all",
+        "libc6:amd64",
+        "libgdbm6:amd64",
+        "vim:amd64",
+        "zsh:amd64",
+        "zsh:i386",
+    ]
+    adduser = packages["adduser:all"]
+    assert adduser.installed and not adduser.automatically_installed
+    assert adduser.remain == {"repo": ["now"]}
+    assert adduser.description == "add and remove users and groups"
+    libc = packages["libc6:amd64"]
+    assert libc.installed and libc.automatically_installed
+    assert libc.remain == {"repo": ["stable", "now"]}
+    # apt shows `installed,local` for versions no repository provides
+    gdbm = packages["libgdbm6:amd64"]
+    assert gdbm.installed and not gdbm.automatically_installed
+    assert gdbm.description == "GNU dbm database routines (runtime version) "
+    vim = packages["vim:amd64"]
+    assert vim.upgradable and vim.installed
+    assert vim.version == "2:9.0.1378-2"
+    assert vim.available_version == "2:9.0.1378-2+deb12u1"
+    assert vim.remain == {"repo": ["stable-security"]}
+    # the highest version, described by the Translation-en index
+    zsh = packages["zsh:amd64"]
+    assert not zsh.installed
+    assert zsh.version == "5.9-4+b2"
+    assert zsh.description == "shell with lots of features"
+    assert packages["zsh:i386"].remain == {"repo": ["stable-security"]}
+    assert list(native("z*")) == ["zsh:amd64", "zsh:i386"]
+
+
+APT_HISTORY = """
+Start-Date: 2024-04-01  10:00:00
+Commandline: apt install vim
+Install: vim:amd64 (2:9.0.1378-2)
+End-Date: 2024-04-01  10:00:05
+
+Start-Date: 2024-04-02  11:00:00
+Commandline: apt remove zsh
+Remove: zsh:amd64 (5.9-4+b2)
+End-Date: 2024-04-02  11:00:01"""
+
+
+def test_iter_history(tmp_path):
+    path = tmp_path / "history.log"
+    path.write_text(APT_HISTORY)
+    histories = iter_history(str(path))
+    first = next(histories)
+    assert (first.id, first.command, first.operations) == (
+        "0",
+        "apt install vim",
+        ["Install"],
+    )
+    assert str(first.date) == "2024-04-01 10:00:00"
+    # the last operation isn't followed by an empty line
+    assert [(h.id, h.operations) for h in histories] == [("1", ["Remove"])]
+
+
+@pytest.mark.skipif(
+    shutil.which("apt") is None or not os.path.exists("/var/lib/dpkg/status"),
+    reason="needs apt",
+)
+def test_native_packages_match_apt():
+    live_output = global_configs["live_output"]
+    global_configs["live_output"] = False
+    try:
+        assert list(iter_native_packages()) == list(iter_packages())
+    finally:
+        global_configs["live_output"] = live_output
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
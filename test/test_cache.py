@@ -0,0 +1,101 @@
+import os
+import pytest
+from tinyget import cache
+from tinyget.common_utils import setup_logger
+from tinyget.package import ManagerType, Package
+
+setup_logger(debug=True)
+
+PACKAGES = [
+    Package(
+        package_type=ManagerType.apt,
+        package_name="vim",
+        architecture="amd64",
+        description="Vi IMproved - enhanced vi editor",
+        version="2:9.0.1378-2",
+        installed=True,
+        automatically_installed=False,
+        upgradable=True,
+        available_version="2:9.0.1378-2+deb12u1",
+        remain={"repo": ["stable-security"]},
+    ),
+    Package(
+        package_type=ManagerType.apt,
+        package_name="zsh",
+        architecture="i386",
+        description="",
+        version="5.9-4+b2",
+        installed=False,
+        automatically_installed=False,
+        upgradable=False,
+        available_version=None,
+        remain={"repo": ["stable", "now"]},
+    ),
+]
+
+
+@pytest.fixture
+def state(monkeypatch, tmp_path):
+    status = tmp_path / "status"
+    status.write_text("Package: vim\n")
+    monkeypatch.setitem(cache.STATE_PATHS, "apt", [str(status)])
+    return status
+
+
+def test_encode_packages():
+    data = cache.encode_packages(PACKAGES)
+    assert cache.decode_packages(ManagerType.apt, data) == PACKAGES
+    assert cache.decode_packages(ManagerType.apt, cache.encode_packages([])) == []
+    broken = Package(package_type=ManagerType.apt, description="a\x1fb")
+    assert cache.encode_packages([broken]) is None
+
+
+def test_cached_packages(state, caplog):
+    caplog.set_level("DEBUG")
+    loads = []
+
+    def load():
+        loads.append(1)
+        return list(PACKAGES)
+
+    assert cache.cached_packages(ManagerType.apt, "cli", load) == PACKAGES
+    assert "cache miss (cold)" in caplog.text
+    assert cache.cached_packages(ManagerType.apt, "cli", load) == PACKAGES
+    assert "cache hit (warm)" in caplog.text
+    assert len(loads) == 1
+    # another backend builds its own list
+    cache.cached_packages(ManagerType.apt, "native", load)
+    assert len(loads) == 2
+    # the package manager changed its state
+    state.write_text("Package: vim\nPackage: zsh\n")
+    cache.cached_packages(ManagerType.apt, "native", load)
+    assert len(loads) == 3
+
+
+def test_cache_invalidated(state):
+    loads = []
+
+    def load():
+        loads.append(1)
+        return list(PACKAGES)
+
+    @cache.invalidates_cache
+    def install():
+        raise RuntimeError("dpkg interrupted")
+
+    cache.cached_packages(ManagerType.apt, "cli", load)
+    with pytest.raises(RuntimeError):
+        install()
+    assert not os.path.exists(cache.get_cache_path(ManagerType.apt))
+    cache.cached_packages(ManagerType.apt, "cli", load)
+    assert len(loads) == 2
+    # a broken file is rebuilt
+    with open(cache.get_cache_path(ManagerType.apt), "r+b") as f:
+        f.seek(cache.CACHE_HEADER.size)
+        f.write(b"\xff\xff")
+    assert cache.cached_packages(ManagerType.apt, "cli", load) == PACKAGES
+    assert len(loads) == 3
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
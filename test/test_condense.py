@@ -0,0 +1,88 @@
+import time
+import pytest
+from tinyget.common_utils import logger, setup_logger
+from tinyget.globals import global_configs
+from tinyget.interact.ai_helper import SYSTEM_PROMPT, AIHelper
+from tinyget.interact.condense import condense_output, estimate_tokens, get_lines
+
+setup_logger(debug=True)
+
+
+def make_upgrade_log(count: int) -> str:
+    lines = []
+    for i in range(count):
+        lines.append(
+            f"Get:{i} http://deb.debian.org/debian bookworm/main lib{i} [9 kB]"
+        )
+        lines.append(f"Unpacking lib{i} (1.{i}-1) over (1.{i}-0) ...")
+    lines[count] = "dpkg: error processing package foo (--configure):"
+    lines.append("Errors were encountered while processing:")
+    lines.append(" foo")
+    lines.append("E: Sub-process /usr/bin/dpkg returned an error code (1)")
+    return "\n".join(lines)
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("apt-get install vim") == 5
+    assert estimate_tokens("我执行的命令是") == 7
+
+
+def test_get_lines():
+    output = "\x1b[1mReading\x1b[0m lists\n0% [Working]\r50% [Working]\r100% [Done]\n\n"
+    output += "Setting up a (1.0)\nSetting up a (1.1)\nSetting up b\n"
+    assert get_lines(output) == [
+        ("Reading lists", 1),
+        ("100% [Done]", 1),
+        ("Setting up a (1.0)", 2),
+        ("Setting up b", 1),
+    ]
+
+
+def test_condense_output():
+    assert condense_output(None, 10) is None
+    assert condense_output("E: Unable to locate package foo", 100) == (
+        "E: Unable to locate package foo"
+    )
+    lines = [f"Reading line {chr(97 + i % 26)}{chr(97 + i // 26)}" for i in range(200)]
+    lines[100] = "E: Unable to locate package foo"
+    condensed = condense_output("\n".join(lines), 60)
+    assert estimate_tokens(condensed) <= 60
+    # the error line, its context and the last lines kept, the others skipped
+    assert condensed.splitlines() == [
+        "[... 98 lines skipped ...]",
+        *lines[98:103],
+        "[... 92 lines skipped ...]",
+        *lines[195:],
+    ]
+
+
+def test_condense_upgrade_log():
+    output = make_upgrade_log(50000)
+    start = time.perf_counter()
+    condensed = condense_output(output, 500)
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"{len(output)} bytes, about {estimate_tokens(output)} tokens condensed to "
+        f"{estimate_tokens(condensed)} tokens in {elapsed * 1000:.0f}ms"
+    )
+    assert estimate_tokens(condensed) <= 500
+    assert "dpkg: error processing package foo (--configure):" in condensed
+    assert condensed.endswith("E: Sub-process /usr/bin/dpkg returned an error code (1)")
+    assert "[49999 similar lines]" in condensed
+    assert elapsed < 5
+
+
+def test_fix_question_budget(monkeypatch):
+    monkeypatch.setitem(global_configs, "ai_prompt_budget", 1000)
+    helper = AIHelper(host="http://127.0.0.1", api_key="sk-test", model="test")
+    stdout = make_upgrade_log(20000)
+    stderr = "\n".join(f"W: warning {i}" for i in range(3000)) + "\nE: failed"
+    question = helper.get_fix_question("apt-get upgrade", stdout, stderr)
+    assert estimate_tokens(SYSTEM_PROMPT + question) <= 1000
+    assert "E: failed" in question
+    assert "dpkg: error processing package foo" in question
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,665 @@
+import asyncio
+import dataclasses
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import datetime
+import pytest
+from tinyget import daemon
+from tinyget.common_utils import logger, setup_logger
+from tinyget.globals import global_configs
+from tinyget.gui import tinyget_server
+from tinyget.interact.process import execute_command, spawn
+from tinyget.package import History, Package
+from tinyget.wrappers import MANAGER
+
+setup_logger(debug=True)
+
+PACKAGES = [
+    Package(
+        package_type=MANAGER,
+        package_name="vim",
+        architecture="amd64",
+        description="Vi IMproved - enhanced vi editor",
+        version="2:9.0.1378-2",
+        installed=True,
+        automatically_installed=False,
+        upgradable=True,
+        available_version="2:9.0.1378-2+deb12u1",
+        remain={"repo": ["stable-security"]},
+    ),
+    Package(
+        package_type=MANAGER,
+        package_name="zsh",
+        architecture="i386",
+        description="",
+        version="5.9-4+b2",
+        installed=False,
+        automatically_installed=False,
+        upgradable=False,
+        available_version=None,
+        remain={"repo": ["stable", "now"]},
+    ),
+]
+
+HISTORIES = [
+    History(
+        id="1",
+        command="install vim",
+        date=datetime(2024, 4, 1, 10, 0),
+        operations=["Install"],
+    )
+]
+
+
+# seconds the fake system upgrade / the fake listings block their thread
+UPGRADE_SECONDS = 1.0
+SCAN_SECONDS = 0.0
+# the commands the fake installs spawned
+CHILDREN = []
+# the command the fake update runs
+UPDATE_SCRIPT = "echo updated"
+# cleared by the tests to hold the fake listings after their first package
+RESUME = threading.Event()
+RESUME.set()
+
+
+class FakePackageManager:
+    def __init__(self):
+        self.calls = []
+
+    def list_packages(self, only_installed=False, only_upgradable=False):
+        self.calls.append("list")
+        time.sleep(SCAN_SECONDS)
+        return [
+            p
+            for p in PACKAGES
+            if (p.installed or not only_installed)
+            and (p.upgradable or not only_upgradable)
+        ]
+
+    def iter_packages(self):
+        self.calls.append("list")
+        time.sleep(SCAN_SECONDS)
+        for i, package in enumerate(PACKAGES):
+            if i == 1:
+                RESUME.wait(10)
+            yield package
+
+    def search(self, pattern):
+        self.calls.append("search")
+        time.sleep(SCAN_SECONDS)
+        if pattern == "slow":
+            # runs until stopped
+            p = spawn(["sleep", "30"])
+            CHILDREN.append(p)
+            p.wait()
+        return [p for p in PACKAGES if pattern in p.package_name]
+
+    def history(self):
+        self.calls.append("history")
+        return HISTORIES
+
+    def iter_history(self):
+        yield from self.history()
+
+    def upgrade(self):
+        self.calls.append("upgrade")
+        time.sleep(UPGRADE_SECONDS)
+        return "upgraded", "", 0
+
+    def update(self):
+        self.calls.append("update")
+        return execute_command(["sh", "-c", UPDATE_SCRIPT])
+
+    def install(self, packages):
+        self.calls.append("install")
+        p = spawn(["sleep", "30"])
+        CHILDREN.append(p)
+        p.wait()
+        return "", "", p.returncode
+
+    def uninstall(self, packages):
+        self.calls.append("uninstall")
+        return execute_command(["echo", "removed", *packages])
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths are limited to about 100 characters
+    path = os.path.join(f"/tmp/tinyget-test-{os.getpid()}", "tinyget.sock")
+    yield path
+    if os.path.exists(path):
+        os.remove(path)
+    os.rmdir(os.path.dirname(path))
+
+
+@pytest.fixture
+def server(monkeypatch, socket_path):
+    monkeypatch.setattr(tinyget_server, "PackageManager", FakePackageManager)
+    server = tinyget_server.TinygetServer(socket_path=socket_path)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    serving = asyncio.run_coroutine_threadsafe(server.serve(), loop)
+    deadline = time.monotonic() + 10
+    while server._server is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(server.stop(0), loop).result(timeout=10)
+        serving.result(timeout=10)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=10)
+
+    server.stop_thread = stop
+    yield server
+    if thread.is_alive():
+        stop()
+    loop.close()
+
+
+def test_daemon_calls(server, socket_path):
+    # created private, not made private afterwards
+    assert os.stat(socket_path).st_mode & 0o077 == 0
+    call = daemon.call_daemon
+    packages = call(lambda d: d.list_packages(), socket_path)
+    assert packages == PACKAGES
+    assert call(lambda d: d.list_packages(only_installed=True), socket_path) == [
+        PACKAGES[0]
+    ]
+    # filtered and counted by the service
+    assert call(lambda d: d.list_packages(architecture="i386"), socket_path) == [
+        PACKAGES[1]
+    ]
+    assert call(lambda d: d.list_packages(repo="now"), socket_path) == [PACKAGES[1]]
+    assert (
+        call(lambda d: d.list_packages(only_installed=True, repo="now"), socket_path)
+        == []
+    )
+    assert call(lambda d: d.count_packages(), socket_path) == 2
+    assert call(lambda d: d.count_packages(architecture="amd64"), socket_path) == 1
+    assert call(lambda d: d.count_packages(repo="unknown"), socket_path) == 0
+    assert server._service._pkg_manager.calls.count("list") == 1
+    assert call(lambda d: d.search("zs"), socket_path) == [PACKAGES[1]]
+    assert call(lambda d: d.history(), socket_path) == HISTORIES
+    # a second daemon doesn't steal the socket
+    with pytest.raises(RuntimeError):
+        daemon.prepare_socket(socket_path)
+    server.stop_thread()
+    assert not os.path.exists(socket_path)
+
+
+def test_no_daemon(socket_path):
+    def call(d):
+        raise AssertionError("no daemon to call")
+
+    # no socket
+    assert daemon.call_daemon(call, socket_path) is None
+    # the socket of a daemon which died
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.bind(socket_path)
+    start = time.monotonic()
+    assert daemon.call_daemon(call, socket_path) is None
+    assert time.monotonic() - start < daemon.DAEMON_CONNECT_TIMEOUT
+    daemon.prepare_socket(socket_path)
+    assert not os.path.exists(socket_path)
+
+
+def test_socket_directory(socket_path):
+    socket_dir = os.path.dirname(socket_path)
+    daemon.prepare_socket(socket_path)
+    assert os.stat(socket_dir).st_mode & 0o777 == 0o700
+    # others could replace the socket
+    os.chmod(socket_dir, 0o777)
+    with pytest.raises(RuntimeError):
+        daemon.prepare_socket(socket_path)
+    os.chmod(socket_dir, 0o1777)
+    with pytest.raises(RuntimeError):
+        daemon.prepare_socket(socket_path)
+    os.chmod(socket_dir, 0o755)
+    daemon.prepare_socket(socket_path)
+    if os.getuid() == 0:
+        os.chown(socket_dir, 65534, -1)
+        with pytest.raises(RuntimeError):
+            daemon.prepare_socket(socket_path)
+
+
+def test_daemon_disabled(server, socket_path, monkeypatch):
+    monkeypatch.setitem(global_configs, "daemon", False)
+    assert daemon.call_daemon(lambda d: d.history(), socket_path) is None
+
+
+def get_stub(socket_path):
+    import grpc
+    import tinyget.gui.tinyget_pb2_grpc as tinygetgrpc
+
+    channel = grpc.insecure_channel(f"unix:{socket_path}")
+    return channel, tinygetgrpc.TinygetGRPCStub(channel)
+
+
+def unbatch(batches):
+    packages = []
+    for batch in batches:
+        assert 0 < len(batch.packages) <= tinyget_server.STREAM_BATCH
+        packages.extend(batch.packages)
+    return packages
+
+
+def test_streams_during_update(server, socket_path):
+    import tinyget.gui.tinyget_pb2 as tinygetlib
+
+    request = tinygetlib.SoftsResquest()
+    channel, stub = get_stub(socket_path)
+    assert len(unbatch(stub.SoftsGetStream(request, timeout=10))) == 2
+    update = stub.SysUpdate.future(tinygetlib.SysUpdateRequest(upgrade=True))
+    time.sleep(0.1)
+
+    # GUI clients listing while the upgrade blocks its thread
+    latencies = []
+
+    def client():
+        client_channel, client_stub = get_stub(socket_path)
+        with client_channel:
+            for _ in range(5):
+                start = time.monotonic()
+                softs = unbatch(client_stub.SoftsGetStream(request, timeout=10))
+                latencies.append(time.monotonic() - start)
+                assert len(softs) == 2
+
+    clients = [threading.Thread(target=client) for _ in range(8)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    assert not update.done()
+    assert len(latencies) == 40
+    assert max(latencies) < UPGRADE_SECONDS / 2
+    assert update.result(timeout=10).stdout == "upgraded"
+    channel.close()
+
+
+def test_cancel_install(server, socket_path):
+    import grpc
+    import tinyget.gui.tinyget_pb2 as tinygetlib
+
+    CHILDREN.clear()
+    channel, stub = get_stub(socket_path)
+    install = stub.SoftsInstall.future(tinygetlib.SoftsInstallRequests(pkgs=["vim"]))
+    deadline = time.monotonic() + 10
+    while not CHILDREN and time.monotonic() < deadline:
+        time.sleep(0.01)
+    install.cancel()
+    with pytest.raises(grpc.FutureCancelledError):
+        install.result()
+    # the command the install ran is stopped with the request
+    assert CHILDREN[0].wait(timeout=5) == -signal.SIGTERM
+    # and the service is available again
+    histories = stub.SysHistory(tinygetlib.SysHistoryRequest(), timeout=10)
+    assert len(histories.histories) == 1
+    channel.close()
+
+
+def test_concurrent_clients(server, socket_path, monkeypatch):
+    import tinyget.gui.tinyget_pb2 as tinygetlib
+
+    monkeypatch.setitem(globals(), "SCAN_SECONDS", 0.3)
+    # 50 GUI clients, 5 different requests, none listed yet
+    requests = [
+        tinygetlib.SoftsResquest(),
+        tinygetlib.SoftsResquest(only_installed=True),
+        tinygetlib.SoftsResquest(pkgs="vim"),
+        tinygetlib.SoftsResquest(pkgs="zs"),
+        tinygetlib.SoftsResquest(pkgs="emacs"),
+    ]
+    clients = 50
+    barrier = threading.Barrier(clients, timeout=30)
+    latencies = []
+
+    def client(i: int):
+        channel, stub = get_stub(socket_path)
+        with channel:
+            stub.SysHistory(tinygetlib.SysHistoryRequest(), timeout=10)
+            barrier.wait()
+            start = time.monotonic()
+            stub.SoftsGet(requests[i % len(requests)], timeout=30)
+            latencies.append(time.monotonic() - start)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    logger.info(
+        f"{clients} clients: p50 {latencies[clients // 2] * 1000:.0f}ms, "
+        f"max {latencies[-1] * 1000:.0f}ms, total {time.monotonic() - start:.2f}s"
+    )
+    assert len(latencies) == clients
+    # one scan per different request, the installed packages filtered from the full
+    # listing, run together instead of in a row
+    calls = server._service._pkg_manager.calls
+    assert sorted(c for c in calls if c != "history") == ["list"] + ["search"] * 3
+    assert latencies[-1] < 3 * SCAN_SECONDS
+
+
+def test_service_cache(server, socket_path, monkeypatch):
+    import tinyget.gui.tinyget_pb2 as tinygetlib
+
+    state = ["installed vim"]
+    monkeypatch.setattr(tinyget_server, "get_state_key", lambda *args: tuple(state))
+    channel, stub = get_stub(socket_path)
+    calls = server._service._pkg_manager.calls
+    cache = server._service._cached_list_softwares
+
+    def get_names(**fields):
+        softs = stub.SoftsGet(tinygetlib.SoftsResquest(**fields), timeout=10).softs
+        return [p.package_name for p in softs]
+
+    # the filtered listings derived from the full one
+    assert get_names() == ["vim", "zsh"]
+    assert get_names(only_installed=True) == ["vim"]
+    assert get_names(only_upgradable=True) == ["vim"]
+    assert calls == ["list"]
+    # the searches bounded
+    for i in range(3 * tinyget_server.CACHE_SIZE):
+        get_names(pkgs=f"vim{i}")
+    assert len(cache) == tinyget_server.CACHE_SIZE
+    # another package installed outside of tinyget
+    state[0] = "installed zsh"
+    assert get_names(only_installed=True) == ["vim"]
+    assert calls[-1] == "list" and len(cache) == 1
+    # expired
+    monkeypatch.setattr(cache, "ttl", 0)
+    get_names()
+    assert calls[-1] == "list"
+    channel.close()
+
+
+def test_stream_while_parsing(server, socket_path):
+    import tinyget.gui.tinyget_pb2 as tinygetlib
+
+    channel, stub = get_stub(socket_path)
+    RESUME.clear()
+    try:
+        stream = stub.SoftsGetStream(tinygetlib.SoftsResquest(), timeout=10)
+        # sent while the listing is still parsed
+        assert [p.package_name for p in next(stream).packages] == ["vim"]
+        # another client follows the same listing
+        installed = stub.SoftsGetStream(
+            tinygetlib.SoftsResquest(only_installed=True), timeout=10
+        )
+        assert [p.package_name for p in next(installed).packages] == ["vim"]
+    finally:
+        RESUME.set()
+    assert [p.package_name for p in unbatch(stream)] == ["zsh"]
+    assert unbatch(installed) == []
+    assert server._service._pkg_manager.calls == ["list"]
+    # the listing cached once parsed, in one batch
+    batches = list(stub.SoftsGetStream(tinygetlib.SoftsResquest(), timeout=10))
+    assert [len(batch.packages) for batch in batches] == [2]
+    assert server._service._pkg_manager.calls == ["list"]
+    channel.close()
+
+
+def test_slow_client(server, socket_path, monkeypatch):
+    import tinyget.gui.tinyget_pb2 as tinygetlib
+
+    packages = [
+        dataclasses.replace(PACKAGES[1], package_name=f"zsh{i}") for i in range(20000)
+    ]
+    monkeypatch.setitem(globals(), "PACKAGES", packages)
+    request = tinygetlib.SoftsResquest()
+    channel, stub = get_stub(socket_path)
+    slow = stub.SoftsGetStream(request, timeout=30)
+    first = next(slow).packages
+    assert first[0].package_name == "zsh0"
+    # the client reading nothing more holds neither the listing nor the others
+    other_channel, other_stub = get_stub(socket_path)
+    with other_channel:
+        batches = list(other_stub.SoftsGetStream(request, timeout=30))
+    assert len(unbatch(batches)) == 20000
+    # far fewer messages than packages
+    assert len(batches) < 20000 // tinyget_server.STREAM_BATCH * 4
+    assert server._service._scans == {}
+    assert len(first) + len(unbatch(slow)) == 20000
+    channel.close()
+
+
+def test_hand_over():
+    batches = []
+
+    async def main():
+        progress = tinyget_server.ScanProgress()
+        loop = asyncio.get_running_loop()
+
+        def items():
+            yield 0
+            # the client is sent the first item before the scan goes on
+            time.sleep(0.1)
+            yield from range(1, 1000)
+
+        async def scan():
+            await loop.run_in_executor(
+                None, tinyget_server.hand_over, loop, items(), progress.extend
+            )
+            return progress.items
+
+        async for batch in progress.follow(asyncio.ensure_future(scan())):
+            batches.append(batch)
+
+    asyncio.run(main())
+    # the first item handed over alone, the others in batches
+    assert batches[0] == [0]
+    assert [i for batch in batches for i in batch] == list(range(1000))
+    assert 1 < len(batches) <= 1000 // tinyget_server.STREAM_BATCH + 2
+
+
+def test_bidi_streams(server, socket_path, monkeypatch):
+    import tinyget.gui.tinyget_pb2 as tinygetlib
+
+    channel, stub = get_stub(socket_path)
+    requests = [tinygetlib.SoftsResquest(pkgs="zs")]
+    softs = unbatch(stub.SoftsGetBidiStream(iter(requests), timeout=10))
+    assert [p.package_name for p in softs] == ["zsh"]
+    histories = stub.SysHistoryBidiStream(
+        iter([tinygetlib.SysHistoryRequest()] * 2), timeout=10
+    )
+    assert [h.command for h in histories] == ["install vim"] * 2
+    # the output of each request streamed, its retcode last
+    uninstalls = stub.SoftsUninstallBidiStream(
+        iter([tinygetlib.SoftsUninstallRequests(pkgs=[name]) for name in "ab"]),
+        timeout=10,
+    )
+    assert [r.stdout if r.HasField("stdout") else r.retcode for r in uninstalls] == [
+        "removed a\n",
+        0,
+        "removed b\n",
+        0,
+    ]
+    monkeypatch.setitem(globals(), "UPDATE_SCRIPT", "echo updated; exit 2")
+    updates = stub.SysUpdateBidiStream(
+        iter([tinygetlib.SysUpdateRequest()] * 2), timeout=10
+    )
+    assert [r.stdout if r.HasField("stdout") else r.retcode for r in updates] == [
+        "updated\n",
+        2,
+    ] * 2
+    channel.close()
+
+
+def test_bidi_stream_cancels_query(server, socket_path):
+    import tinyget.gui.tinyget_pb2 as tinygetlib
+
+    CHILDREN.clear()
+    channel, stub = get_stub(socket_path)
+
+    def requests():
+        yield tinygetlib.SoftsResquest(pkgs="slow")
+        deadline = time.monotonic() + 10
+        while not CHILDREN and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # the user typed on, the search still running is of no use
+        yield tinygetlib.SoftsResquest(pkgs="zs")
+        yield tinygetlib.SoftsResquest(only_installed=True)
+
+    start = time.monotonic()
+    softs = unbatch(stub.SoftsGetBidiStream(requests(), timeout=20))
+    # the last request answered at least, the "slow" one never
+    assert [p.package_name for p in softs][-1:] == ["vim"]
+    assert "slow" not in [p.package_name for p in softs]
+    # the command of the first query stopped with it
+    assert CHILDREN[0].wait(timeout=5) == -signal.SIGTERM
+    assert time.monotonic() - start < 10
+    assert server._service._scans == {} and server._service._waiters == {}
+    channel.close()
+
+
+def test_update_stream(server, socket_path, monkeypatch, tmp_path):
+    import tinyget.gui.tinyget_pb2 as tinygetlib
+
+    gate = tmp_path / "gate"
+    script = (
+        "echo 'Get:1 http://deb.debian.org/debian bookworm/main amd64 vim amd64 "
+        "2:9.0 [1.7 MB]'\n"
+        f"while [ ! -e {gate} ]; do sleep 0.01; done\n"
+        "echo 'W: low disk space' >&2\n"
+        "printf 'Unpacking vim (2:9.0) ...\\nSetting up vim (2:9.0) ...'\n"
+        "exit 3\n"
+    )
+    monkeypatch.setitem(globals(), "UPDATE_SCRIPT", script)
+    channel, stub = get_stub(socket_path)
+    stream = stub.SysUpdateStream(tinygetlib.SysUpdateRequest(), timeout=10)
+    # sent while the command runs
+    first = next(stream)
+    assert first.stdout.startswith("Get:1 ") and not first.HasField("progress")
+    download = next(stream).progress
+    assert (download.stage, download.package) == ("download", "vim")
+    gate.touch()
+    responses = list(stream)
+    assert "".join(r.stderr for r in responses) == "W: low disk space\n"
+    assert [(r.progress.stage, r.progress.package) for r in responses[:-1]][-2:] == [
+        ("unpack", "vim"),
+        ("configure", "vim"),
+    ]
+    # the retcode only, last
+    assert responses[-1].retcode == 3
+    assert not responses[-1].HasField("stdout")
+    channel.close()
+
+
+def test_update_stream_stalled_client(server, socket_path, monkeypatch, tmp_path):
+    import tinyget.gui.tinyget_pb2 as tinygetlib
+
+    size = 20 * 1024 * 1024
+    marker = tmp_path / "written"
+    script = f"head -c {size} /dev/zero | tr '\\0' x; touch {marker}"
+    monkeypatch.setitem(globals(), "UPDATE_SCRIPT", script)
+    monkeypatch.setattr(tinyget_server, "OUTPUT_BUFFER", 2)
+    channel, stub = get_stub(socket_path)
+    stream = stub.SysUpdateStream(tinygetlib.SysUpdateRequest(), timeout=30)
+    received = len(next(stream).stdout)
+    # the client reads nothing more: the command doesn't wait for it
+    deadline = time.monotonic() + 10
+    while not marker.exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert marker.exists()
+    # nor the listings for the write lock
+    other_channel, other_stub = get_stub(socket_path)
+    with other_channel:
+        softs = other_stub.SoftsGet(tinygetlib.SoftsResquest(), timeout=5).softs
+        assert len(softs) == 2
+    for response in stream:
+        received += len(response.stdout)
+    # the output the client was too slow for dropped, the retcode still sent
+    assert 0 < received < size
+    assert response.retcode == 0 and not response.HasField("stdout")
+    # a client going away stops the command, the service is available again
+    marker.unlink()
+    monkeypatch.setitem(
+        globals(), "UPDATE_SCRIPT", f"echo started; sleep 5; touch {marker}"
+    )
+    stream = stub.SysUpdateStream(tinygetlib.SysUpdateRequest(), timeout=30)
+    assert next(stream).stdout == "started\n"
+    stream.cancel()
+    start = time.monotonic()
+    histories = stub.SysHistory(tinygetlib.SysHistoryRequest(), timeout=10)
+    assert len(histories.histories) == 1
+    assert time.monotonic() - start < 3
+    assert not marker.exists()
+    channel.close()
+
+
+def test_softs_cache(monkeypatch):
+    cache = tinyget_server.SoftsCache(size=2, ttl=10)
+    cache.put(("state",), ("a",), PACKAGES)
+    cache.put(("state",), ("b",), [])
+    assert cache.get(("state",), ("a",)) == PACKAGES
+    # least recently used dropped
+    cache.put(("state",), ("c",), [])
+    assert cache.get(("state",), ("b",)) is None
+    assert cache.get(("state",), ("a",)) == PACKAGES
+    # expired
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 10)
+    assert cache.get(("state",), ("a",)) is None
+    # another state
+    cache.put(("state",), ("a",), PACKAGES)
+    assert cache.get(("other",), ("a",)) is None
+    assert len(cache) == 0
+
+
+def test_read_write_lock():
+    lock = tinyget_server.ReadWriteLock()
+    events = []
+
+    async def read(name: str, seconds: float):
+        async with lock.read():
+            events.append(f"{name} start")
+            await asyncio.sleep(seconds)
+            events.append(f"{name} end")
+
+    async def write(name: str):
+        async with lock.write():
+            events.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            events.append(f"{name} end")
+
+    async def main():
+        first = asyncio.ensure_future(read("read1", 0.05))
+        second = asyncio.ensure_future(read("read2", 0.05))
+        await asyncio.sleep(0)
+        writing = asyncio.ensure_future(write("write"))
+        await asyncio.sleep(0)
+        # arrives after the write, waits for it
+        third = asyncio.ensure_future(read("read3", 0))
+        await asyncio.gather(first, second, writing, third)
+
+    asyncio.run(main())
+    assert events == [
+        "read1 start",
+        "read2 start",
+        "read1 end",
+        "read2 end",
+        "write start",
+        "write end",
+        "read3 start",
+        "read3 end",
+    ]
+
+
+def test_get_socket_path(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    assert daemon.get_socket_path() == str(tmp_path / "tinyget.sock")
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    assert daemon.get_socket_path().startswith(str(tmp_path))
+    monkeypatch.setitem(global_configs, "daemon_socket", "/run/tinyget.sock")
+    assert daemon.get_socket_path() == "/run/tinyget.sock"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,255 @@
+import gzip
+import os
+import shutil
+import time
+import tracemalloc
+import pytest
+from tinyget.common_utils import logger, setup_logger
+from tinyget.wrappers import _dnf, _rpmmd
+from tinyget.wrappers._rpmmd import find_repositories, iter_primary, open_metadata
+
+setup_logger(debug=True)
+
+DNF_CACHE = os.path.join(os.path.dirname(__file__), "fixtures", "dnf")
+ENABLED_REPOS = """[fedora]
+name=Fedora $releasever - $basearch
+metalink=https://mirrors.fedoraproject.org/metalink?repo=fedora-$releasever
+enabled=1
+
+[updates]
+name=Fedora $releasever - $basearch - Updates
+metalink=https://mirrors.fedoraproject.org/metalink?repo=updates-$releasever
+"""
+
+INSTALLED = [
+    {
+        "name": "bash",
+        "version": "5.2.26",
+        "release": "1.fc40",
+        "epoch": "0",
+        "arch": "x86_64",
+        "reponame": "@System",
+        "summary": "The GNU Bourne Again shell",
+        "reason": "user",
+        "installtime": "2024-04-01 10:00",
+    },
+    {
+        "name": "glibc",
+        "version": "2.39",
+        "release": "2.fc40",
+        "epoch": "0",
+        "arch": "x86_64",
+        "reponame": "@System",
+        "summary": "The GNU libc libraries",
+        "reason": "dependency",
+        "installtime": "2024-04-01 10:00",
+    },
+    {
+        "name": "tinyget",
+        "version": "0.1",
+        "release": "1",
+        "epoch": "0",
+        "arch": "noarch",
+        "reponame": "@commandline",
+        "summary": "Tiny package manager wrapper",
+        "reason": "user",
+        "installtime": "2024-04-02 10:00",
+    },
+]
+
+
+@pytest.fixture
+def repos_dir(monkeypatch, tmp_path):
+    repos_dir = tmp_path / "yum.repos.d"
+    repos_dir.mkdir()
+    (repos_dir / "fedora.repo").write_text(ENABLED_REPOS)
+    monkeypatch.setattr(_rpmmd, "REPOS_DIRS", [str(repos_dir)])
+    return repos_dir
+
+
+@pytest.fixture
+def dnf_cache(monkeypatch, repos_dir):
+    queries = []
+
+    def fake_repoquery(flags=[], softs=""):
+        queries.append(flags)
+        return [dict(info) for info in INSTALLED]
+
+    monkeypatch.setattr(_rpmmd, "DNF_CACHE_DIRS", [DNF_CACHE])
+    monkeypatch.setattr(_dnf, "repoquery", fake_repoquery)
+    return queries
+
+
+def test_native_packages(dnf_cache):
+    packages = {
+        f"{p.package_name}.{p.architecture}": p
+        for p in _dnf.get_packages(enable_third_party=False, backend="native")
+    }
+    # the only dnf run, without loading the repositories
+    assert dnf_cache == [["--installed", "--disablerepo=*"]]
+    # source packages are left out
+    assert sorted(packages) == [
+        "bash.x86_64",
+        "glibc.i686",
+        "glibc.x86_64",
+        "tinyget.noarch",
+        "vim-enhanced.x86_64",
+        "zsh.x86_64",
+    ]
+    glibc = packages["glibc.x86_64"]
+    assert glibc.installed and glibc.automatically_installed and glibc.upgradable
+    assert glibc.version == "2.39"
+    assert glibc.available_version == "2.39-10.fc40"
+    assert glibc.remain == {"repo": ["updates"]}
+    bash = packages["bash.x86_64"]
+    assert bash.installed and not bash.upgradable
+    # the highest version whatever the repository
+    zsh = packages["zsh.x86_64"]
+    assert not zsh.installed
+    assert zsh.remain == {"repo": ["fedora"]}
+    assert packages["tinyget.noarch"].remain == {"repo": ["@commandline"]}
+    assert packages["vim-enhanced.x86_64"].description.startswith("A version of")
+
+
+def test_stale_repositories(repos_dir, tmp_path):
+    cache_dir = tmp_path / "cache"
+    for repo_dir in sorted(os.listdir(DNF_CACHE)):
+        shutil.copytree(os.path.join(DNF_CACHE, repo_dir), cache_dir / repo_dir)
+    # a disabled repository and a removed one, dnf doesn't clean their cache
+    shutil.copytree(
+        os.path.join(DNF_CACHE, "updates-9c1b7a3e5d2f4b60"),
+        cache_dir / "updates-testing-3f8e2a1c7b6d5e40",
+    )
+    shutil.copytree(
+        os.path.join(DNF_CACHE, "fedora-6d9a2b4c1e0f3a57"),
+        cache_dir / "rpmfusion-free-0a1b2c3d4e5f6a7b",
+    )
+    (repos_dir / "fedora-updates-testing.repo").write_text(
+        "[updates-testing]\nname=Fedora - Test Updates\nenabled=0\n"
+    )
+    repositories = find_repositories([str(cache_dir)])
+    assert [repo for repo, _ in repositories] == ["fedora", "updates"]
+    assert len(find_repositories([str(cache_dir)], set())) == 0
+    # without any .repo file every cached repository is read
+    os.remove(repos_dir / "fedora.repo")
+    os.remove(repos_dir / "fedora-updates-testing.repo")
+    assert len(find_repositories([str(cache_dir)])) == 4
+
+
+def test_backends_parity(dnf_cache, monkeypatch):
+    # zsh installed older than both repositories, the version is the installed one
+    installed = [dict(info) for info in INSTALLED] + [
+        {
+            "name": "zsh",
+            "version": "5.8",
+            "release": "4.fc40",
+            "epoch": "0",
+            "arch": "x86_64",
+            "reponame": "@System",
+            "summary": "Powerful interactive shell",
+            "reason": "user",
+            "installtime": "2024-04-03 10:00",
+        }
+    ]
+    available = []
+    for repo, primary in find_repositories([DNF_CACHE]):
+        with open_metadata(primary) as f:
+            for info in iter_primary(f):
+                available.append(dict(info, reponame=repo, reason="", installtime=""))
+
+    def fake_repoquery(flags=[], softs=""):
+        if "--installed" in flags:
+            return [dict(info) for info in installed]
+        return [dict(info) for info in available]
+
+    def fake_check_update():
+        return [
+            {
+                "name": "glibc",
+                "version": "2.39-10.fc40",
+                "arch": "x86_64",
+                "repo": "updates",
+            },
+            {
+                "name": "zsh",
+                "version": "5.9-13.fc40",
+                "arch": "x86_64",
+                "repo": "fedora",
+            },
+        ]
+
+    monkeypatch.setattr(_dnf, "repoquery", fake_repoquery)
+    monkeypatch.setattr(_dnf, "check_update", fake_check_update)
+
+    def summary(packages):
+        return sorted(
+            (
+                p.package_name,
+                p.architecture,
+                p.version,
+                p.installed,
+                p.automatically_installed,
+                p.upgradable,
+                p.available_version,
+                tuple(p.remain["repo"]),
+            )
+            for p in packages
+        )
+
+    native = summary(_dnf.get_native_packages())
+    assert native == summary(_dnf.get_cli_packages())
+    assert ("zsh", "x86_64", "5.8", True, False, True, "5.9-13.fc40", ("fedora",)) in (
+        native
+    )
+
+
+def test_native_packages_fallback(monkeypatch, repos_dir, tmp_path):
+    monkeypatch.setattr(_rpmmd, "DNF_CACHE_DIRS", [str(tmp_path)])
+    assert _dnf.get_native_packages() is None
+    os.makedirs(tmp_path / "fedora-0123" / "repodata")
+    (tmp_path / "fedora-0123" / "repodata" / "0-primary.xml.gz").write_bytes(
+        b"not gzip"
+    )
+    assert _dnf.get_native_packages() is None
+
+
+def test_benchmark_iter_primary(tmp_path):
+    # about the size of the Fedora repository
+    count = 70000
+    path = str(tmp_path / "primary.xml.gz")
+    with gzip.open(path, "wt", compresslevel=1) as f:
+        f.write('<metadata xmlns="http://linux.duke.edu/metadata/common">\n')
+        for i in range(count):
+            f.write(
+                f'<package type="rpm"><name>pkg{i}</name><arch>x86_64</arch>'
+                f'<version epoch="0" ver="1.{i}" rel="1.fc40"/>'
+                f"<summary>package number {i}</summary>"
+                f"<description>{'long description ' * 20}</description>"
+                f'<format><requires><entry name="glibc"/></requires></format>'
+                f"</package>\n"
+            )
+        f.write("</metadata>\n")
+
+    def parse():
+        with open_metadata(path) as f:
+            return sum(1 for _ in iter_primary(f))
+
+    start = time.perf_counter()
+    parsed = parse()
+    elapsed = time.perf_counter() - start
+    # tracing slows everything down, measure memory in a second run
+    tracemalloc.start()
+    parse()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    logger.info(
+        f"primary.xml, {count} packages: {elapsed * 1000:.0f}ms, "
+        f"peak {peak / 1024 / 1024:.1f}MB"
+    )
+    assert parsed == count
+    # the elements are dropped once read, nothing grows with the package count
+    assert peak < 4 * 1024 * 1024
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,133 @@
+import random
+import time
+import pytest
+from tinyget import cache
+from tinyget.common_utils import logger, setup_logger
+from tinyget.package import ManagerType, Package, PackageTable, package_matches
+
+setup_logger(debug=True)
+
+PACKAGES = [
+    Package(
+        package_type=ManagerType.apt,
+        package_name="vim",
+        architecture="amd64",
+        description="Vi IMproved - enhanced vi editor",
+        version="2:9.0.1378-2",
+        installed=True,
+        automatically_installed=False,
+        upgradable=True,
+        available_version="2:9.0.1378-2+deb12u1",
+        remain={"repo": ["stable-security"]},
+    ),
+    Package(
+        package_type=ManagerType.apt,
+        package_name="zsh",
+        architecture="i386",
+        description="",
+        version="5.9-4+b2",
+        installed=False,
+        automatically_installed=False,
+        upgradable=False,
+        available_version=None,
+        remain={"repo": ["stable", "now"]},
+    ),
+]
+
+
+def test_package_table():
+    table = PackageTable.from_packages(ManagerType.apt, PACKAGES * 3)
+    assert len(table) == 6
+    assert list(table) == PACKAGES * 3
+    assert not hasattr(table[0], "__dict__")
+    # the architectures and repository lists are stored once
+    assert table.architecture_names == ["amd64", "i386"]
+    assert table.repo_names == [("stable-security",), ("stable", "now")]
+    assert table[0].architecture is table[2].architecture
+    # every row gets its own repository list
+    assert table[0].remain is not table[2].remain
+    upgradable = table.filter(upgradable=True)
+    assert upgradable.to_packages() == [PACKAGES[0]] * 3
+    data = cache.encode_packages(PACKAGES)
+    assert cache.decode_table(ManagerType.apt, data).to_packages() == PACKAGES
+
+
+@pytest.mark.parametrize(
+    "filters, rows",
+    [
+        ({}, [0, 1, 2, 3, 4, 5]),
+        ({"installed": True}, [0, 2, 4]),
+        ({"installed": False, "upgradable": False}, [1, 3, 5]),
+        ({"installed": False, "upgradable": True}, []),
+        ({"architecture": "i386"}, [1, 3, 5]),
+        ({"architecture": "arm64"}, []),
+        ({"repo": "now"}, [1, 3, 5]),
+        ({"repo": "stable-security", "installed": True}, [0, 2, 4]),
+        ({"repo": "stable-security", "architecture": "i386"}, []),
+    ],
+)
+def test_package_table_mask(filters, rows):
+    packages = PACKAGES * 3
+    table = PackageTable.from_packages(ManagerType.apt, packages)
+    assert table.select(**filters) == rows
+    assert table.count(**filters) == len(rows)
+    assert [i for i, p in enumerate(packages) if package_matches(p, **filters)] == rows
+
+
+def test_package_table_codes():
+    # codes above 255 compare both of their bytes
+    packages = [
+        Package(
+            package_type=ManagerType.dnf,
+            package_name=f"pkg{i}",
+            architecture=f"arch{i % 300}",
+            remain={"repo": [f"repo{i % 257}"]},
+        )
+        for i in range(600)
+    ]
+    table = PackageTable.from_packages(ManagerType.dnf, packages)
+    assert table.select(architecture="arch1") == [1, 301]
+    assert table.select(architecture="arch257") == [257, 557]
+    assert table.select(repo="repo256") == [256, 513]
+
+
+def test_benchmark_count():
+    # about the size of the Debian repository, a few hundred packages installed
+    count = 60000
+    rng = random.Random(0)
+    packages = [
+        Package(
+            package_type=ManagerType.apt,
+            package_name=f"pkg{i}",
+            architecture=rng.choice(["amd64", "all", "i386"]),
+            description="package",
+            version="1.0",
+            installed=rng.random() < 0.02,
+            upgradable=rng.random() < 0.01,
+            available_version=None,
+            remain={"repo": [rng.choice(["stable", "stable-updates"])]},
+        )
+        for i in range(count)
+    ]
+    table = PackageTable.from_packages(ManagerType.apt, packages)
+    filters = {"installed": True, "architecture": "amd64"}
+
+    start = time.perf_counter()
+    listed = len([p for p in packages if package_matches(p, **filters)])
+    scanned = time.perf_counter() - start
+    start = time.perf_counter()
+    counted = table.count(**filters)
+    masked = time.perf_counter() - start
+    start = time.perf_counter()
+    rows = table.filter(**filters).to_packages()
+    filtered = time.perf_counter() - start
+    logger.info(
+        f"count of {count} packages: list comprehension {scanned * 1000:.1f}ms, "
+        f"mask {masked * 1000:.2f}ms, {counted} rows built in {filtered * 1000:.1f}ms"
+    )
+    assert counted == listed == len(rows)
+    assert masked < scanned
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,171 @@
+import gzip
+import io
+import os
+import tarfile
+import time
+import pytest
+from tinyget.common_utils import logger, setup_logger
+from tinyget.wrappers import _pacman
+from tinyget.wrappers._alpm import iter_native_packages, parse_desc
+from tinyget.wrappers._vercmp import rpmvercmp, vercmp
+
+setup_logger(debug=True)
+
+PACMAN_ROOT = os.path.join(os.path.dirname(__file__), "fixtures", "pacman")
+
+
+def native(pattern=None, db_path=PACMAN_ROOT):
+    return {
+        p.package_name: p
+        for p in iter_native_packages(
+            pattern, db_path=db_path, conf=os.path.join(PACMAN_ROOT, "pacman.conf")
+        )
+    }
+
+
+def test_vercmp():
+    assert rpmvercmp("1.0", "1.0") == 0
+    assert rpmvercmp("1.0", "1.0.1") < 0
+    assert rpmvercmp("1.0a", "1.0") < 0
+    assert rpmvercmp("1.0", "1.0alpha") > 0
+    assert rpmvercmp("1.10", "1.9") > 0
+    assert rpmvercmp("1.001", "1.1") == 0
+    assert rpmvercmp("1..0", "1.0") > 0
+    assert vercmp("2.39-1", "2.39-2") < 0
+    assert vercmp("1:1.0-1", "2.0-1") > 0
+    # releases only count when both have one
+    assert vercmp("1.0", "1.0-3") == 0
+
+
+def test_parse_desc():
+    fields = parse_desc("%NAME%\nbash\n\n%LICENSE%\nGPL\nMIT\n\n\n%EMPTY%\n")
+    assert fields == {"NAME": ["bash"], "LICENSE": ["GPL", "MIT"], "EMPTY": []}
+
+
+def test_native_packages():
+    packages = native()
+    # repositories in pacman.conf order, foreign packages are not listed
+    assert list(packages) == ["bash", "glibc", "zsh", "vim", "python"]
+    glibc = packages["glibc"]
+    assert glibc.installed and glibc.automatically_installed
+    assert glibc.upgradable
+    assert glibc.version == "2.39-1"
+    assert glibc.available_version == "2.39-2"
+    bash = packages["bash"]
+    assert bash.installed and not bash.automatically_installed
+    assert not bash.upgradable and bash.available_version is None
+    # the first repository providing a package wins
+    zsh = packages["zsh"]
+    assert not zsh.installed
+    assert zsh.version == "5.9-5"
+    assert zsh.remain == {"repo": ["core"]}
+    # regex on names and descriptions, case insensitive
+    assert list(native("^VIM$")) == ["vim"]
+    assert list(native("shell")) == ["bash", "zsh"]
+
+
+def test_native_fallback(monkeypatch, tmp_path):
+    # zstd databases can't be streamed by tarfile, pacman is run instead
+    os.makedirs(tmp_path / "local")
+    os.makedirs(tmp_path / "sync")
+    (tmp_path / "sync" / "core.db").write_bytes(b"(\xb5/\xfd" + b"\0" * 64)
+    monkeypatch.setattr(
+        _pacman,
+        "iter_native_packages",
+        lambda pattern: iter_native_packages(pattern, db_path=str(tmp_path)),
+    )
+    called = []
+    monkeypatch.setattr(
+        _pacman, "get_all_installed_package_name", lambda: called.append(1) or []
+    )
+    monkeypatch.setattr(_pacman, "get_all_package_name", lambda: [])
+    monkeypatch.setattr(_pacman, "get_installed_info", lambda names: [])
+    monkeypatch.setattr(_pacman, "get_available_info", lambda names: [])
+    monkeypatch.setattr(_pacman, "get_upgradable", lambda: {})
+    assert _pacman.get_all_packages(enable_third_party=False, backend="native") == []
+    assert called
+
+
+def make_sync_db(path: str, count: int):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for i in range(count):
+            data = (
+                f"%NAME%\npkg{i}\n\n%VERSION%\n1.{i}-1\n\n%DESC%\npackage number {i}\n\n"
+                f"%ARCH%\nx86_64\n\n%DEPENDS%\nglibc\nbash\n\n"
+            ).encode()
+            info = tarfile.TarInfo(f"pkg{i}-1.{i}-1/desc")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    with open(path, "wb") as f:
+        f.write(gzip.compress(buf.getvalue(), compresslevel=1))
+
+
+def test_benchmark_native_packages(monkeypatch, tmp_path):
+    count = 15000
+    installed = range(0, count, 10)
+    os.makedirs(tmp_path / "sync")
+    make_sync_db(str(tmp_path / "sync" / "extra.db"), count)
+    for i in installed:
+        os.makedirs(tmp_path / "local" / f"pkg{i}-1.{i}-0")
+        (tmp_path / "local" / f"pkg{i}-1.{i}-0" / "desc").write_text(
+            f"%NAME%\npkg{i}\n\n%VERSION%\n1.{i}-0\n\n%DESC%\npackage number {i}\n\n"
+            f"%ARCH%\nx86_64\n\n%REASON%\n1\n\n"
+        )
+
+    start = time.perf_counter()
+    packages = native(db_path=str(tmp_path))
+    native_elapsed = time.perf_counter() - start
+
+    # the CLI path, pacman itself is replaced by the output it would print
+    def field(name, value):
+        return f"{name:<16}: {value}\n"
+
+    outputs = {
+        "-Qq": "".join(f"pkg{i}\n" for i in installed),
+        "-Ssq": "".join(f"pkg{i}\n" for i in range(count)),
+        "-Qi": "\n".join(
+            field("Name", f"pkg{i}")
+            + field("Version", f"1.{i}-0")
+            + field("Description", f"package number {i}")
+            + field("Architecture", "x86_64")
+            + field("Install Reason", "Installed as a dependency for another package")
+            for i in installed
+        ),
+        "-Si": "\n".join(
+            field("Repository", "extra")
+            + field("Name", f"pkg{i}")
+            + field("Version", f"1.{i}-1")
+            + field("Description", f"package number {i}")
+            + field("Architecture", "x86_64")
+            + field("Replaces", "None")
+            for i in range(count)
+        ),
+        "-Qu": "".join(f"pkg{i} 1.{i}-0 -> 1.{i}-1\n" for i in installed),
+    }
+    argv_sizes = []
+
+    def fake_pacman(args, timeout=None, bounded=False):
+        argv_sizes.append(sum(len(arg) + 1 for arg in args))
+        return outputs[args[0]], "", 0
+
+    monkeypatch.setattr(_pacman, "execute_pacman_command", fake_pacman)
+    monkeypatch.setitem(_pacman.global_configs, "live_output", False)
+    start = time.perf_counter()
+    cli = _pacman.get_all_packages(enable_third_party=False, backend="cli")
+    cli_elapsed = time.perf_counter() - start
+
+    logger.info(
+        f"pacman, {count} packages: native {native_elapsed * 1000:.0f}ms, cli parsing "
+        f"{cli_elapsed * 1000:.0f}ms without the 5 pacman runs, largest argv "
+        f"{max(argv_sizes)} bytes"
+    )
+    assert len(packages) == len(cli) == count
+    assert sum(p.upgradable for p in packages.values()) == len(installed)
+    assert all(
+        p.installed == cli_p.installed for p, cli_p in zip(packages.values(), cli)
+    )
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,423 @@
+import asyncio
+import codecs
+import fcntl
+import os
+import sys
+import time
+import pytest
+from tinyget.common_utils import logger, setup_logger
+from tinyget.globals import global_configs
+from tinyget.interact import execute_command as interact_execute_command
+from tinyget.interact import process
+from tinyget.interact.buffer import RingBuffer
+from tinyget.interact.queries import run_queries
+from tinyget.interact.process import (
+    CommandExecutionError,
+    CommandStream,
+    EscapeFilter,
+    FdReader,
+    OutputScope,
+    async_execute_command,
+    execute_command,
+    open_pty,
+    spawn,
+)
+
+setup_logger(debug=True)
+
+# 50 MB of multi-byte output written in chunks that split characters
+LOCALIZED_CHILD = """
+import sys
+data = ("正在读取软件包列表... 完成 " * 8 + "\\n").encode() * (50 * 1024 * 1024 // 301)
+for i in range(0, len(data), 1000):
+    sys.stdout.buffer.write(data[i : i + 1000])
+sys.stdout.buffer.flush()
+"""
+
+CHATTY_CHILD = """
+import sys, time
+for i in range({lines}):
+    sys.stdout.write("line %d %.6f\\n" % (i, time.time()))
+    sys.stdout.flush()
+    time.sleep({interval})
+"""
+
+
+def run_with_engine(args, on_data=None):
+    """Run args on the pty engine, returns (first byte latency, wall clock, output)"""
+    master_fd, slave_fd = open_pty()
+    err_read_fd, err_write_fd = os.pipe()
+    first_byte = []
+    chunks = []
+
+    def on_output(data: bytes):
+        if not first_byte:
+            first_byte.append(time.perf_counter())
+        if on_data is None:
+            chunks.append(data)
+        else:
+            on_data(data)
+
+    start = time.perf_counter()
+    p = spawn(args, stdoutfd=slave_fd, stdinfd=slave_fd, stderrfd=err_write_fd)
+    os.close(slave_fd)
+    os.close(err_write_fd)
+    try:
+        retcode = asyncio.run(
+            async_execute_command(
+                p, master_fd, err_read_fd, on_output, lambda data: None
+            )
+        )
+    finally:
+        os.close(master_fd)
+        os.close(err_read_fd)
+    end = time.perf_counter()
+    assert retcode == 0
+    return first_byte[0] - start, end - start, b"".join(chunks).decode()
+
+
+def test_execute_command_realtime():
+    out, err, retcode = execute_command(
+        [
+            sys.executable,
+            "-c",
+            "import sys; print('out'); print('err', file=sys.stderr)",
+        ],
+        realtime_output=True,
+    )
+    assert out == "out\n"
+    assert err == "err\n"
+    assert retcode == 0
+
+
+def test_execute_command_realtime_retcode():
+    out, err, retcode = execute_command(
+        [sys.executable, "-c", "import sys; sys.exit(3)"], realtime_output=True
+    )
+    assert out == ""
+    assert retcode == 3
+
+
+def test_execute_command_realtime_bounded():
+    out, err, retcode = execute_command(
+        [
+            sys.executable,
+            "-c",
+            "import sys; print('x' * 100000); print('y' * 100000, file=sys.stderr)",
+        ],
+        realtime_output=True,
+        max_output_size=1024,
+    )
+    assert out == "x" * 1023 + "\n"
+    assert err == "y" * 1023 + "\n"
+    assert retcode == 0
+
+
+def test_execute_command_output_scope():
+    code = (
+        "import sys, time\n"
+        "sys.stdout.write('\\x1b[1mfirst\\x1b[0m\\n')\n"
+        "sys.stdout.flush()\n"
+        "time.sleep(0.5)\n"
+        "sys.stderr.write('err\\n')\n"
+        "sys.stdout.write('second\\n')\n"
+    )
+    chunks = []
+    start = time.perf_counter()
+
+    def on_output(kind: str, text: str):
+        chunks.append((kind, text, time.perf_counter() - start))
+
+    scope = OutputScope(on_output)
+    out, err, retcode = scope.run(execute_command, [sys.executable, "-c", code])
+    assert (out, err, retcode) == ("first\nsecond\n", "err\n", 0)
+    # watched while the command runs, without a terminal
+    assert chunks[0][:2] == ("stdout", "first\n") and chunks[0][2] < 0.5
+    assert "".join(text for kind, text, _ in chunks if kind == "stdout") == out
+    assert "".join(text for kind, text, _ in chunks if kind == "stderr") == err
+    # not watched outside of the scope
+    execute_command([sys.executable, "-c", code])
+    assert len(chunks) == 3
+
+
+def test_ring_buffer():
+    buffer = RingBuffer(4)
+    buffer.add(b"ab")
+    assert buffer.get() == b"ab"
+    buffer.add(b"cdef")
+    assert buffer.get() == b"cdef"
+    assert buffer.dropped == 2
+    buffer.add(b"0123456789")
+    assert buffer.get() == b"6789"
+    assert len(buffer) == 4
+    with pytest.raises(ValueError):
+        RingBuffer(0)
+
+
+def test_ring_buffer_boundary():
+    # the kept tail starts in the middle of a character
+    buffer = RingBuffer(5)
+    buffer.add("成功".encode())
+    assert buffer.get().decode() == "功"
+    # the kept tail starts in the middle of an escape sequence
+    buffer = RingBuffer(8)
+    buffer.add(b"\x1b[0mold\nnew")
+    assert buffer.get() == b"new"
+
+
+def test_execute_command_invalid_size():
+    with pytest.raises(ValueError):
+        execute_command(
+            [sys.executable, "-c", "import time; time.sleep(10)"],
+            realtime_output=True,
+            max_output_size=0,
+        )
+
+
+def test_benchmark_chatty_child():
+    lines = 200
+    interval = 0.002
+    code = CHATTY_CHILD.format(lines=lines, interval=interval)
+    # child's own runtime, without the engine
+    start = time.perf_counter()
+    p = spawn([sys.executable, "-c", code])
+    p.communicate()
+    baseline = time.perf_counter() - start
+
+    # delay between the child writing a line and the sink receiving it
+    latencies = []
+    received = []
+
+    def on_data(data: bytes):
+        now = time.time()
+        received.append(data)
+        for line in data.decode().splitlines():
+            latencies.append(now - float(line.split()[2]))
+
+    ttfb, wall, _ = run_with_engine([sys.executable, "-c", code], on_data)
+    overhead = wall - baseline
+    latencies.sort()
+    median = latencies[len(latencies) // 2]
+    worst = latencies[-1]
+    logger.info(
+        f"time to first byte: {ttfb * 1000:.2f}ms, wall clock: {wall * 1000:.2f}ms, "
+        f"overhead: {overhead * 1000:.2f}ms, chunk latency median: "
+        f"{median * 1000:.3f}ms, worst: {worst * 1000:.3f}ms"
+    )
+    assert len(latencies) == lines
+    # The old polling loop waited up to 0.5s on the quiet stderr per iteration
+    assert overhead < 0.5
+    # sub-millisecond in practice, bounds leave room for loaded CI machines
+    assert median < 0.005
+    assert worst < 0.05
+
+
+def test_execute_command_propagates_errors(monkeypatch):
+    def broken_sink(*args, **kwargs):
+        raise RuntimeError("sink failed")
+
+    monkeypatch.setattr(process.click, "echo", broken_sink)
+    with pytest.raises(RuntimeError):
+        execute_command(
+            [sys.executable, "-c", "import time; print('x'); time.sleep(10)"],
+            realtime_output=True,
+        )
+
+
+def test_execute_command_missing_binary():
+    fds = len(os.listdir("/proc/self/fd"))
+    with pytest.raises(FileNotFoundError):
+        execute_command(["tinyget-no-such-binary"], realtime_output=True)
+    assert len(os.listdir("/proc/self/fd")) == fds
+
+
+def test_incremental_decode():
+    # the 3 bytes of each character land in different chunks
+    out, err, retcode = execute_command(
+        [
+            sys.executable,
+            "-c",
+            "import sys, time\n"
+            "data = '完成'.encode()\n"
+            "for i in range(len(data)):\n"
+            "    sys.stdout.buffer.write(data[i : i + 1])\n"
+            "    sys.stdout.buffer.flush()\n"
+            "    time.sleep(0.01)\n",
+        ],
+        realtime_output=True,
+    )
+    assert out == "完成"
+    assert retcode == 0
+
+
+def test_fd_reader_adaptive_size():
+    read_fd, write_fd = os.pipe()
+    try:
+        reader = FdReader(read_fd, min_size=16, max_size=64)
+        os.write(write_fd, b"x" * 176)
+        assert len(reader.read()) == 16
+        assert len(reader.read()) == 32
+        assert len(reader.read()) == 64
+        assert len(reader.read()) == 64
+        # quiet child, shrink back
+        os.write(write_fd, b"x")
+        assert reader.read() == b"x"
+        assert reader.size == 32
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+@pytest.mark.skipif(
+    not hasattr(fcntl, "F_SETPIPE_SZ"), reason="pipe size can't be changed"
+)
+def test_fd_reader_busy_child():
+    read_fd, write_fd = os.pipe()
+    try:
+        fcntl.fcntl(write_fd, fcntl.F_SETPIPE_SZ, 1024 * 1024)
+        reader = FdReader(read_fd)
+        os.write(write_fd, b"x" * 512 * 1024)
+        batches = []
+        while sum(batches) < 512 * 1024:
+            batches.append(len(reader.read()))
+        assert max(batches) == process.MAX_READ_CHUNK_SIZE
+        assert max(batches) >= 64 * 1024
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+def test_benchmark_localized_throughput(monkeypatch):
+    def run():
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="strict")
+        received = []
+        batches = []
+
+        def on_data(data: bytes):
+            batches.append(len(data))
+            received.append(len(decoder.decode(data)))
+
+        ttfb, wall, _ = run_with_engine(
+            [sys.executable, "-c", LOCALIZED_CHILD], on_data
+        )
+        decoder.decode(b"", final=True)
+        return wall, sum(received), batches
+
+    wall, chars, batches = run()
+    # the old engine: a single 1 KiB read per wake up
+    monkeypatch.setattr(process, "MAX_READ_CHUNK_SIZE", process.READ_CHUNK_SIZE)
+    fixed_wall, fixed_chars, fixed_batches = run()
+    logger.info(
+        f"50 MB localized output: adaptive {50 / wall:.2f} MB/s in {len(batches)} "
+        f"batches (largest {max(batches)} bytes), fixed {process.READ_CHUNK_SIZE} "
+        f"bytes reads {50 / fixed_wall:.2f} MB/s in {len(fixed_batches)} batches"
+    )
+    assert chars == fixed_chars
+    assert chars > 0
+    # batches grow past the 4095 bytes a single pty read returns, how large they
+    # get is bounded by what the child wrote since the last wake up
+    assert max(batches) > 4095
+    assert len(batches) < len(fixed_batches)
+
+
+def test_escape_filter_split_sequences():
+    stream = b"\x1b[1mbold\x1b[0m \x1b[33;1mwarn\x1b[0m\n\x1b[?25h50%\x1b"
+    expected = b"bold warn\n50%"
+    # every possible split point
+    for i in range(len(stream) + 1):
+        escape_filter = EscapeFilter()
+        data = escape_filter.feed(stream[:i]) + escape_filter.feed(stream[i:])
+        assert data + escape_filter.flush() == expected + b"\x1b"
+    # byte by byte
+    escape_filter = EscapeFilter()
+    data = b"".join(escape_filter.feed(stream[i : i + 1]) for i in range(len(stream)))
+    assert data == expected
+
+
+def test_command_stream_incremental():
+    code = (
+        "import sys, time\n"
+        "sys.stdout.write('\\x1b[1mfirst\\x1b[0m\\n')\n"
+        "sys.stdout.flush()\n"
+        "time.sleep(0.5)\n"
+        "sys.stdout.write('second\\n')\n"
+        "sys.stderr.write('err\\n')\n"
+    )
+    for realtime_output in (False, True):
+        stream = CommandStream(
+            [sys.executable, "-c", code], realtime_output=realtime_output
+        )
+        start = time.perf_counter()
+        lines = stream.lines()
+        assert next(lines) == "first"
+        # delivered before the child finished
+        assert time.perf_counter() - start < 0.5
+        assert list(lines) == ["second"]
+        assert stream.returncode == 0
+        assert stream.stderr == "err\n"
+
+
+def test_wait_not_queued():
+    # more children running than the waits a small pool would run together
+    sleepers = [CommandStream(["sleep", "5"]) for _ in range(6)]
+    for stream in sleepers:
+        stream.start()
+    try:
+        start = time.perf_counter()
+        assert list(CommandStream(["echo", "done"])) == ["done\n"]
+        # the return code doesn't wait for the others to exit
+        assert time.perf_counter() - start < 2
+    finally:
+        for stream in sleepers:
+            stream.close()
+
+
+def test_command_stream_abandoned():
+    stream = CommandStream(
+        [sys.executable, "-c", "while True: print('y' * 1000, flush=True)"],
+        queue_size=2,
+    )
+    for _ in stream:
+        break
+    assert stream.returncode is not None
+    assert stream.returncode != 0
+
+
+def test_run_queries_concurrently(caplog, monkeypatch):
+    monkeypatch.setitem(global_configs, "live_output", True)
+
+    def query(name):
+        out, err, retcode = interact_execute_command(
+            [sys.executable, "-c", f"import time; time.sleep(0.5); print('{name}')"]
+        )
+        return out
+
+    caplog.set_level("DEBUG")
+    start = time.perf_counter()
+    results = run_queries({name: lambda name=name: query(name) for name in "abc"})
+    elapsed = time.perf_counter() - start
+    # the outputs are parsed, never interleaved on the terminal
+    assert results == {"a": "a\n", "b": "b\n", "c": "c\n"}
+    assert elapsed < 1.0
+    assert "Query a took" in caplog.text
+    assert "Queries a, b, c took" in caplog.text
+
+
+def test_run_queries_errors():
+    finished = []
+
+    def slow():
+        time.sleep(0.2)
+        finished.append(1)
+
+    def broken():
+        raise CommandExecutionError("failed", [], {}, "", "")
+
+    with pytest.raises(CommandExecutionError):
+        run_queries({"slow": slow, "broken": broken})
+    # raised once every query finished, no process left behind
+    assert finished
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,80 @@
+import pytest
+from tinyget.common_utils import setup_logger
+from tinyget.interact.progress import (
+    MAX_LINE_LENGTH,
+    ProgressEvent,
+    ProgressParser,
+    parse_progress,
+)
+
+setup_logger(debug=True)
+
+
+def test_parse_apt():
+    assert parse_progress(
+        "Get:1 http://deb.debian.org/debian bookworm/main amd64 vim amd64 "
+        "2:9.0.1378-2 [1,567 kB]"
+    ) == ProgressEvent("download", "vim")
+    # the indexes downloaded by `apt update`
+    assert parse_progress(
+        "Get:2 http://deb.debian.org/debian bookworm InRelease [151 kB]"
+    ) == ProgressEvent("download", "bookworm InRelease")
+    assert parse_progress("Unpacking vim (2:9.0.1378-2) ...") == ProgressEvent(
+        "unpack", "vim"
+    )
+    assert parse_progress("Setting up vim (2:9.0.1378-2) ...") == ProgressEvent(
+        "configure", "vim"
+    )
+    assert parse_progress("Removing zsh (5.9-4+b2) ...") == ProgressEvent(
+        "remove", "zsh"
+    )
+    assert parse_progress("Progress: [ 40%]") == ProgressEvent("progress", "", 40)
+    assert parse_progress("Reading package lists... Done") is None
+
+
+def test_parse_dnf():
+    assert parse_progress(
+        "(1/3): vim-enhanced-9.0.2081-1.fc39.x86_64.rpm  2.0 MB/s | 1.9 MB  00:00"
+    ) == ProgressEvent("download", "vim-enhanced-9.0.2081-1.fc39.x86_64.rpm", 33)
+    assert parse_progress(
+        "  Installing       : vim-enhanced-2:9.0.2081-1.fc39.x86_64        2/3"
+    ) == ProgressEvent("unpack", "vim-enhanced-2:9.0.2081-1.fc39.x86_64", 66)
+    assert parse_progress(
+        "  Verifying        : vim-enhanced-2:9.0.2081-1.fc39.x86_64        3/3"
+    ) == ProgressEvent("configure", "vim-enhanced-2:9.0.2081-1.fc39.x86_64", 100)
+    assert parse_progress("  Erasing          : zsh-5.9-6.fc39.x86_64   1/1") == (
+        ProgressEvent("remove", "zsh-5.9-6.fc39.x86_64", 100)
+    )
+
+
+def test_parse_pacman():
+    assert parse_progress(" vim-9.0.2190-1-x86_64 downloading...") == (
+        ProgressEvent("download", "vim-9.0.2190-1-x86_64")
+    )
+    assert parse_progress("(1/2) installing vim          [######] 100%") == (
+        ProgressEvent("unpack", "vim", 50)
+    )
+    assert parse_progress("(2/2) removing zsh            [######] 100%") == (
+        ProgressEvent("remove", "zsh", 100)
+    )
+
+
+def test_progress_parser():
+    parser = ProgressParser()
+    # the lines split across chunks, the progress redrawn
+    assert parser.feed("Unpacking v") == []
+    assert parser.feed("im (2:9.0) ...\nProgress: [ 10%]\rProgress: [ 2") == [
+        ProgressEvent("unpack", "vim"),
+        ProgressEvent("progress", "", 10),
+    ]
+    assert parser.feed("0%]\r") == [ProgressEvent("progress", "", 20)]
+    assert parser.feed("Setting up vim (2:9.0) ...") == []
+    assert parser.flush() == [ProgressEvent("configure", "vim")]
+    assert parser.flush() == []
+    # output without line breaks doesn't pile up
+    parser.feed("x" * (10 * MAX_LINE_LENGTH))
+    assert len(parser._pending) == MAX_LINE_LENGTH
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,220 @@
+import random
+import time
+import pytest
+from tinyget import cache, search_index
+from tinyget.common_utils import logger, setup_logger
+from tinyget.package import ManagerType, Package, PackageTable
+from tinyget.search_index import (
+    SearchIndex,
+    get_regex_literals,
+    glob_query,
+    regex_query,
+    search_packages,
+)
+
+setup_logger(debug=True)
+
+
+def make_package(name: str, description: str = "", arch: str = "x86_64") -> Package:
+    return Package(
+        package_type=ManagerType.pacman,
+        package_name=name,
+        architecture=arch,
+        description=description,
+        version="1.0-1",
+        available_version=None,
+        remain={"repo": ["extra"]},
+    )
+
+
+PACKAGES = [
+    make_package("gvim", "Vi Improved, a highly configurable text editor"),
+    make_package("neovim", "Fork of Vim aiming to improve user experience"),
+    make_package("vim-runtime", "Vi Improved, runtime files"),
+    make_package("vim", "Vi Improved, a highly configurable text editor"),
+    make_package("python-pynvim", "Python client for Neovim"),
+    make_package("zsh", "A very advanced and programmable command interpreter"),
+    make_package("lib32-glibc", "GNU C Library (32-bit)", arch="i686"),
+]
+
+
+def names(packages):
+    return [p.package_name for p in packages]
+
+
+def search(query):
+    index = SearchIndex.build(PACKAGES, query.descriptions)
+    result = search_index.search_index(index, PACKAGES, query)
+    # the index only narrows the search down
+    assert sorted(names(result)) == sorted(
+        p.package_name for p in PACKAGES if query.match(p)
+    )
+    return names(result)
+
+
+def test_get_regex_literals():
+    assert get_regex_literals("vim") == ["vim"]
+    assert get_regex_literals("^Vim$") == ["vim"]
+    assert get_regex_literals("py.*vim") == ["py", "vim"]
+    assert get_regex_literals("vims?") == ["vim"]
+    assert get_regex_literals("lib[0-9]+-gl") == ["lib", "-gl"]
+    assert get_regex_literals("ab{2}c") == ["a", "c"]
+    assert get_regex_literals(r"python\.org") == ["python", "org"]
+    assert get_regex_literals("vim|emacs") == []
+    assert get_regex_literals("(neo)?vim") == []
+
+
+def test_search_ranking():
+    # exact name, name prefix, whole word, then the package list order
+    assert search(regex_query("vim")) == [
+        "vim",
+        "vim-runtime",
+        "neovim",
+        "gvim",
+        "python-pynvim",
+    ]
+    assert search(regex_query("VI IMPROVED")) == ["gvim", "vim-runtime", "vim"]
+    assert search(regex_query("^z")) == ["zsh"]
+    # no literal, every package is matched
+    assert search(regex_query("vim|zsh")) == [
+        "gvim",
+        "neovim",
+        "vim-runtime",
+        "vim",
+        "python-pynvim",
+        "zsh",
+    ]
+    # invalid regexes match literally
+    assert search(regex_query("[vim")) == []
+    assert search(glob_query("vim*")) == ["vim", "vim-runtime"]
+    assert search(glob_query("*vim")) == ["vim", "neovim", "gvim", "python-pynvim"]
+    assert search(glob_query("Vim")) == []
+    assert search(glob_query("lib32-glibc.i686", with_arch=True)) == ["lib32-glibc"]
+    assert search(glob_query("*.i686", with_arch=True)) == ["lib32-glibc"]
+    assert search(glob_query("*")) == names(PACKAGES)
+
+
+@pytest.fixture
+def state(monkeypatch, tmp_path):
+    status = tmp_path / "local"
+    status.write_text("vim\n")
+    monkeypatch.setitem(cache.STATE_PATHS, "pacman", [str(status)])
+    monkeypatch.setattr(search_index, "_loaded", {})
+    return status
+
+
+def test_search_packages(state, caplog):
+    caplog.set_level("DEBUG")
+    loads = []
+
+    def load():
+        loads.append(1)
+        return list(PACKAGES)
+
+    def run(pattern):
+        return names(
+            search_packages(ManagerType.pacman, "native", load, regex_query(pattern))
+        )
+
+    assert run("vim")[0] == "vim"
+    assert "Search index built" in caplog.text
+    assert run("zsh") == ["zsh"]
+    assert len(loads) == 1
+    # read from disk by another process
+    search_index._loaded.clear()
+    caplog.clear()
+    assert run("zsh") == ["zsh"]
+    assert "Search index loaded" in caplog.text
+    # an index without the description trigrams is rebuilt for description searches
+    search_packages(ManagerType.pacman, "native", load, glob_query("zsh"))
+    search_index._loaded.clear()
+    state.write_text("vim\nzsh\n")
+    search_packages(ManagerType.pacman, "native", load, glob_query("zsh"))
+    caplog.clear()
+    assert run("interpreter") == ["zsh"]
+    assert "Search index built" in caplog.text
+    # the index goes with the package cache
+    cache.invalidate(ManagerType.pacman)
+    assert not (state.parent / "cache" / "tinyget" / "search-pacman.bin").exists()
+
+
+def test_benchmark_search(monkeypatch):
+    # about the size of the Debian repository
+    count = 60000
+    rng = random.Random(0)
+    words = ["lib", "python3", "dev", "data", "doc", "perl", "gtk", "qt5", "tools"]
+    packages = [
+        make_package(
+            f"{rng.choice(words)}-{rng.choice(words)}{i}",
+            " ".join(rng.choice(words) for _ in range(8)),
+        )
+        for i in range(count)
+    ]
+    monkeypatch.setattr(search_index, "_loaded", {})
+    start = time.perf_counter()
+    index = SearchIndex.build(packages, descriptions=True)
+    built = time.perf_counter() - start
+    data = index.encode(("key",))
+    start = time.perf_counter()
+    index = SearchIndex.decode(data, ("key",))
+    loaded = time.perf_counter() - start
+
+    timings = {}
+    for pattern in ["gtk-doc12345", "tools-perl1", "^qt5-dev"]:
+        query = regex_query(pattern)
+        start = time.perf_counter()
+        result = search_index.search_index(index, packages, query)
+        timings[pattern] = time.perf_counter() - start
+        assert sorted(map(id, result)) == sorted(
+            id(p) for p in packages if query.match(p)
+        )
+    query = regex_query("tools-perl1")
+    start = time.perf_counter()
+    scanned = [p for p in packages if query.match(p)]
+    scan = time.perf_counter() - start
+    logger.info(
+        f"search index, {count} packages: built in {built * 1000:.0f}ms, "
+        f"{len(data) / 1024 / 1024:.1f}MB loaded in {loaded * 1000:.0f}ms, "
+        + ", ".join(f"{p!r} {t * 1000:.2f}ms" for p, t in timings.items())
+        + f", full scan {scan * 1000:.0f}ms for {len(scanned)} packages"
+    )
+    assert all(t < scan for t in timings.values())
+
+
+def test_benchmark_search_table():
+    def make_table(count):
+        packages = [
+            make_package(f"pkg{i}", f"package number {i}") for i in range(count)
+        ]
+        packages += [make_package(f"needle{i}", "a rare package") for i in range(20)]
+        return PackageTable.from_packages(ManagerType.pacman, packages)
+
+    def measure(table):
+        index = SearchIndex.build(table, descriptions=False)
+        query = regex_query("needle")
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            result = search_index.search_index(index, table, query)
+            timings.append(time.perf_counter() - start)
+        assert len(result) == 20
+        return min(timings)
+
+    small = measure(make_table(5000))
+    table = make_table(80000)
+    large = measure(table)
+    start = time.perf_counter()
+    table.to_packages()
+    build = time.perf_counter() - start
+    logger.info(
+        f"search of a table, 20 matches: {small * 1000:.2f}ms in 5000 packages, "
+        f"{large * 1000:.2f}ms in 80000 packages, building them all "
+        f"{build * 1000:.0f}ms"
+    )
+    # only the matches are built, not the 16 times more packages
+    assert large < 4 * small + 0.002
+    assert large * 10 < build
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+import pytest
+from tinyget.common_utils import logger, setup_logger
+
+setup_logger(debug=True)
+
+# modules only the commands using them import: the gRPC server, the TUI, the AI helper
+LAZY_MODULES = ["grpc", "google.protobuf", "trogon", "textual", "requests"]
+# microseconds, `import tinyget.main` took 480ms with the modules above
+STARTUP_BUDGET = 400000
+
+
+def get_import_times(module: str):
+    """Imports a module in a new interpreter, returns the cumulative import times"""
+    env = dict(os.environ, LANG=os.environ.get("LANG", "C.UTF-8"))
+    p = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env,
+        check=True,
+    )
+    times = {}
+    for line in p.stderr.decode().splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_startup_imports():
+    times = get_import_times("tinyget.main")
+    imported = [
+        name
+        for name in times
+        for lazy in LAZY_MODULES
+        if name == lazy or name.startswith(f"{lazy}.")
+    ]
+    assert imported == []
+    logger.info(f"import tinyget.main: {times['tinyget.main'] / 1000:.0f}ms")
+    assert times["tinyget.main"] < STARTUP_BUDGET
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,120 @@
+import threading
+import time
+import pytest
+from tinyget.common_utils import setup_logger
+from tinyget.globals import global_configs
+from tinyget.package import ManagerType, Package, PackageTable
+from tinyget.repos import third_party
+from tinyget.repos.third_party import ThirdPartySofts, get_third_party_packages
+
+setup_logger(debug=True)
+
+
+def make_softs(name: str, get_package):
+    """A third party software, not registered as a subclass of ThirdPartySofts"""
+    return type(
+        f"_{name}",
+        (),
+        {
+            "__module__": "tinyget@test:package:test",
+            "PKG_NAME": name,
+            "calls": 0,
+            "get_package": get_package,
+        },
+    )
+
+
+def sleeping(seconds: float):
+    def get_package(self, wrapper_softs=None):
+        type(self).calls += 1
+        time.sleep(seconds)
+        installed = any(
+            p.package_name == self.PKG_NAME and p.installed for p in wrapper_softs
+        )
+        return Package(
+            package_type=ManagerType.apt,
+            package_name=self.PKG_NAME,
+            version="1.0",
+            installed=installed,
+        )
+
+    return get_package
+
+
+def failing(self, wrapper_softs=None):
+    raise ConnectionError("unreachable")
+
+
+@pytest.fixture
+def softs(monkeypatch):
+    softs = []
+    monkeypatch.setattr(third_party, "imported", True)
+    monkeypatch.setattr(third_party, "get_third_party_softs", lambda: softs)
+    monkeypatch.setattr(third_party, "_resolved", {})
+    monkeypatch.setitem(global_configs, "third_party_timeout", 0.5)
+    return softs
+
+
+def test_concurrent(softs):
+    softs.extend(make_softs(f"soft{i}", sleeping(0.3)) for i in range(4))
+    start = time.monotonic()
+    packages = get_third_party_packages(wrapper_softs=[])
+    assert time.monotonic() - start < 0.6
+    assert [p.package_name for p in packages] == ["soft0", "soft1", "soft2", "soft3"]
+    assert packages[0].remain["repo"] == ["tinyget@test"]
+    assert [p.package_name for p in get_third_party_packages("soft[12]", [])] == [
+        "soft1",
+        "soft2",
+    ]
+
+
+def test_isolation(softs):
+    resume = threading.Event()
+    hanging = make_softs("hanging", sleeping(0))
+    hanging.get_package = lambda self, wrapper_softs=None: resume.wait(5) and Package(
+        package_type=ManagerType.apt, package_name="hanging"
+    )
+    softs.extend(
+        [make_softs("broken", failing), hanging, make_softs("fine", sleeping(0))]
+    )
+    start = time.monotonic()
+    packages = get_third_party_packages(wrapper_softs=[])
+    assert time.monotonic() - start < 1
+    assert [p.package_name for p in packages] == ["fine"]
+    # the late package is listed once it arrived
+    resume.set()
+    time.sleep(0.1)
+    packages = get_third_party_packages(wrapper_softs=[])
+    assert [p.package_name for p in packages] == ["hanging", "fine"]
+
+
+def test_cached(softs):
+    soft = make_softs("soft", sleeping(0))
+    softs.append(soft)
+    table = PackageTable(ManagerType.apt)
+    table.append("vim", "amd64", "", "9.0", None, [], True, False, False)
+    assert get_third_party_packages(wrapper_softs=table)[0].installed is False
+    packages = get_third_party_packages(wrapper_softs=table)
+    assert packages[0].installed is False
+    assert soft.calls == 1
+    # the packages returned are the callers' own
+    packages[0].remain["repo"].append("other")
+    assert get_third_party_packages(wrapper_softs=table)[0].remain["repo"] == [
+        "tinyget@test"
+    ]
+    # resolved again once the software is installed
+    table.append("soft", "amd64", "", "1.0", None, [], True, False, False)
+    assert get_third_party_packages(wrapper_softs=table)[0].installed is True
+    assert soft.calls == 2
+
+
+def test_builtin_softs():
+    assert all(
+        issubclass(cls, ThirdPartySofts) for cls in third_party.get_third_party_softs()
+    )
+    for p in get_third_party_packages(wrapper_softs=[]):
+        assert p.remain["repo"] == ["tinyget@builtin"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,440 @@
+"""
+Persistent package index, rebuilt only when the package manager's state changes
+"""
+
+import functools
+import glob
+import hashlib
+import os
+import struct
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from tinyget.__about__ import __version__
+from tinyget.common_utils import logger
+from tinyget.globals import global_configs
+from tinyget.package import (
+    FLAG_AUTOMATICALLY_INSTALLED,
+    FLAG_AVAILABLE_VERSION,
+    FLAG_INSTALLED,
+    FLAG_UPGRADABLE,
+    ManagerType,
+    Package,
+    PackageTable,
+)
+
+# bumped when the file layout changes
+CACHE_FORMAT_VERSION = 1
+CACHE_MAGIC = b"TGPC"
+# magic, format version, sha256 of the state key
+CACHE_HEADER = struct.Struct("<4sH32s")
+
+# files changed by the package manager whenever the package lists may change, as
+# glob patterns. Directories count for the entries added, removed or renamed in them
+STATE_PATHS = {
+    ManagerType.apt.name: [
+        "/var/lib/dpkg/status",
+        "/var/lib/apt/extended_states",
+        "/var/lib/apt/lists",
+        "/var/lib/apt/lists/*_Packages*",
+    ],
+    ManagerType.pacman.name: [
+        "/var/lib/pacman/local",
+        "/var/lib/pacman/sync/*.db",
+    ],
+    ManagerType.dnf.name: [
+        "/var/lib/rpm",
+        "/var/lib/rpm/*",
+        "/var/lib/dnf/*.sqlite",
+        "/var/cache/dnf/*/repodata",
+        "/var/cache/libdnf5/*/repodata",
+        "/etc/yum.repos.d/*.repo",
+        "/etc/distro.repos.d/*.repo",
+    ],
+}
+
+# separators of the package rows and their fields, never part of the package data
+ROW_SEPARATOR = "\x1e"
+FIELD_SEPARATOR = "\x1f"
+LIST_SEPARATOR = "\x1d"
+SEPARATORS = (ROW_SEPARATOR, FIELD_SEPARATOR, LIST_SEPARATOR)
+
+
+def get_cache_dir() -> str:
+    """
+    Gets the cache directory, `$XDG_CACHE_HOME/tinyget` or `~/.cache/tinyget` of the
+    effective user.
+
+    Returns:
+        str: The cache directory.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "tinyget")
+
+
+def get_cache_path(manager: ManagerType) -> str:
+    """
+    Gets the package index file of a package manager.
+
+    Parameters:
+        manager (ManagerType): The package manager.
+
+    Returns:
+        str: The index file path.
+    """
+    return os.path.join(get_cache_dir(), f"packages-{manager.name}.bin")
+
+
+def get_index_path(manager: ManagerType) -> str:
+    """
+    Gets the search index file of a package manager, see tinyget.search_index.
+
+    Parameters:
+        manager (ManagerType): The package manager.
+
+    Returns:
+        str: The search index file path.
+    """
+    return os.path.join(get_cache_dir(), f"search-{manager.name}.bin")
+
+
+def is_cache_enabled() -> bool:
+    return bool(global_configs.get("cache", True))
+
+
+def get_state_key(manager: ManagerType, backend: str) -> Tuple:
+    """
+    Builds the key of the package index, changing whenever the state files of the
+    package manager change.
+
+    Parameters:
+        manager (ManagerType): The package manager.
+        backend (str): The backend building the index.
+
+    Returns:
+        Tuple: The mtime, inode and size of every state file, the backend, the locale
+            (the CLI backend parses localized output) and the tinyget version.
+    """
+    states = []
+    for pattern in STATE_PATHS[manager.name]:
+        for path in sorted(glob.glob(pattern)):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            states.append((path, st.st_mtime_ns, st.st_ino, st.st_size))
+    locale = tuple(
+        os.environ.get(name, "") for name in ("LC_ALL", "LC_MESSAGES", "LANG")
+    )
+    return (__version__, manager.name, backend, locale, tuple(states))
+
+
+def get_key_digest(key: Tuple) -> bytes:
+    return hashlib.sha256(repr(key).encode()).digest()
+
+
+def encode_packages(packages: List[Package]) -> Optional[bytes]:
+    """
+    Encodes packages as separated UTF-8 fields, safe to load whoever wrote the file.
+
+    Parameters:
+        packages (List[Package]): The packages.
+
+    Returns:
+        Optional[bytes]: The encoded packages, None if they hold data which can't be
+            encoded (remain other than repo, separator characters).
+    """
+    rows = []
+    for p in packages:
+        if set(p.remain) - {"repo"}:
+            return None
+        flags = (
+            (FLAG_INSTALLED if p.installed else 0)
+            | (FLAG_AUTOMATICALLY_INSTALLED if p.automatically_installed else 0)
+            | (FLAG_UPGRADABLE if p.upgradable else 0)
+            | (FLAG_AVAILABLE_VERSION if p.available_version is not None else 0)
+        )
+        repo = p.remain.get("repo", [])
+        fields = [
+            p.package_name,
+            p.architecture,
+            p.description,
+            p.version,
+            p.available_version or "",
+            *repo,
+        ]
+        if any(sep in field for field in fields for sep in SEPARATORS):
+            return None
+        rows.append(
+            FIELD_SEPARATOR.join([*fields[:5], LIST_SEPARATOR.join(repo), str(flags)])
+        )
+    return ROW_SEPARATOR.join(rows).encode()
+
+
+def decode_table(manager: ManagerType, data: bytes) -> PackageTable:
+    """
+    Decodes the packages encoded by encode_packages into a table, without building
+    the packages.
+
+    Parameters:
+        manager (ManagerType): The package manager of the packages.
+        data (bytes): The encoded packages.
+
+    Returns:
+        PackageTable: The packages.
+    """
+    table = PackageTable(manager)
+    if data == b"":
+        return table
+    repos: Dict[str, Tuple[str, ...]] = {}
+    for row in data.decode().split(ROW_SEPARATOR):
+        name, arch, description, version, available, repo, flags = row.split(
+            FIELD_SEPARATOR
+        )
+        repo_names = repos.get(repo)
+        if repo_names is None:
+            repo_names = tuple(repo.split(LIST_SEPARATOR)) if repo != "" else ()
+            repos[repo] = repo_names
+        table.append_row(
+            name, arch, description, version, available, repo_names, int(flags)
+        )
+    return table
+
+
+def decode_packages(manager: ManagerType, data: bytes) -> List[Package]:
+    """
+    Decodes the packages encoded by encode_packages.
+
+    Parameters:
+        manager (ManagerType): The package manager of the packages.
+        data (bytes): The encoded packages.
+
+    Returns:
+        List[Package]: The packages.
+    """
+    return decode_table(manager, data).to_packages()
+
+
+def load_table(manager: ManagerType, key: Tuple) -> Optional[PackageTable]:
+    """
+    Loads the package index if it was built for the given key.
+
+    Parameters:
+        manager (ManagerType): The package manager.
+        key (Tuple): The key, see get_state_key.
+
+    Returns:
+        Optional[PackageTable]: The packages, None if missing, stale or broken.
+    """
+    try:
+        with open(get_cache_path(manager), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < CACHE_HEADER.size:
+        return None
+    magic, version, digest = CACHE_HEADER.unpack_from(data)
+    if (
+        magic != CACHE_MAGIC
+        or version != CACHE_FORMAT_VERSION
+        or digest != get_key_digest(key)
+    ):
+        return None
+    try:
+        return decode_table(manager, data[CACHE_HEADER.size :])
+    except (UnicodeDecodeError, ValueError) as e:
+        logger.debug(f"Broken package cache: {e}")
+        return None
+
+
+def load_packages(manager: ManagerType, key: Tuple) -> Optional[List[Package]]:
+    """
+    Loads the package index if it was built for the given key, see load_table.
+    """
+    table = load_table(manager, key)
+    return table.to_packages() if table is not None else None
+
+
+def store_packages(manager: ManagerType, key: Tuple, packages: List[Package]):
+    """
+    Stores the package index, failures are only logged.
+
+    Parameters:
+        manager (ManagerType): The package manager.
+        key (Tuple): The key, see get_state_key.
+        packages (List[Package]): The packages.
+    """
+    data = encode_packages(packages)
+    if data is None:
+        logger.debug("Packages can't be cached")
+        return
+    path = get_cache_path(manager)
+    # the daemon may store from several threads
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(
+                CACHE_HEADER.pack(
+                    CACHE_MAGIC, CACHE_FORMAT_VERSION, get_key_digest(key)
+                )
+            )
+            f.write(data)
+        # readers never see a partial file
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.debug(f"Can't write package cache {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def invalidate(manager: Optional[ManagerType] = None):
+    """
+    Removes the package index and its search index.
+
+    Parameters:
+        manager (ManagerType, optional): The package manager. Defaults to all.
+    """
+    managers = [manager] if manager is not None else list(ManagerType)
+    for m in managers:
+        for path in (get_cache_path(m), get_index_path(m)):
+            try:
+                os.remove(path)
+                logger.debug(f"Package cache {path} invalidated")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.debug(f"Can't remove package cache {path}: {e}")
+
+
+def cached_table(
+    manager: ManagerType,
+    backend: str,
+    load: Callable[[], List[Package]],
+    key: Optional[Tuple] = None,
+) -> PackageTable:
+    """
+    Gets the packages from the index, or loads and stores them when the index is
+    missing or stale.
+
+    Parameters:
+        manager (ManagerType): The package manager.
+        backend (str): The backend `load` uses, part of the key.
+        load (Callable[[], List[Package]]): Builds the package list.
+        key (Tuple, optional): The state key if already built, see get_state_key.
+
+    Returns:
+        PackageTable: The packages.
+    """
+    if not is_cache_enabled():
+        return PackageTable.from_packages(manager, load())
+    start = time.perf_counter()
+    if key is None:
+        key = get_state_key(manager, backend)
+    table = load_table(manager, key)
+    if table is not None:
+        logger.debug(
+            f"Package cache hit (warm), {len(table)} packages in "
+            f"{(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+        return table
+    packages = load()
+    loaded = time.perf_counter()
+    store_packages(manager, key, packages)
+    logger.debug(
+        f"Package cache miss (cold), {len(packages)} packages loaded in "
+        f"{(loaded - start) * 1000:.1f}ms, stored in "
+        f"{(time.perf_counter() - loaded) * 1000:.1f}ms"
+    )
+    return PackageTable.from_packages(manager, packages)
+
+
+def cached_packages(
+    manager: ManagerType,
+    backend: str,
+    load: Callable[[], List[Package]],
+    key: Optional[Tuple] = None,
+) -> List[Package]:
+    """
+    Gets the packages from the index, see cached_table.
+
+    Returns:
+        List[Package]: The packages.
+    """
+    if not is_cache_enabled():
+        return load()
+    loaded: List[Package] = []
+
+    def load_() -> List[Package]:
+        # on a miss the loaded packages are returned as they are
+        loaded.extend(load())
+        return loaded
+
+    table = cached_table(manager, backend, load_, key)
+    return loaded if loaded else table.to_packages()
+
+
+def iter_cached_packages(
+    manager: ManagerType,
+    backend: str,
+    iterate: Callable[[], Iterable[Package]],
+    key: Optional[Tuple] = None,
+) -> Iterator[Package]:
+    """
+    Yields the packages from the index, or as `iterate` yields them when the index is
+    missing or stale: they are stored once all of them were read, an iteration left
+    before its end stores nothing.
+
+    Parameters:
+        manager (ManagerType): The package manager.
+        backend (str): The backend `iterate` uses, part of the key.
+        iterate (Callable[[], Iterable[Package]]): Yields the packages as they are
+            parsed.
+        key (Tuple, optional): The state key if already built, see get_state_key.
+
+    Yields:
+        Package: The packages.
+    """
+    if not is_cache_enabled():
+        yield from iterate()
+        return
+    start = time.perf_counter()
+    if key is None:
+        key = get_state_key(manager, backend)
+    table = load_table(manager, key)
+    if table is not None:
+        logger.debug(
+            f"Package cache hit (warm), {len(table)} packages in "
+            f"{(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+        yield from table.to_packages()
+        return
+    packages: List[Package] = []
+    for package in iterate():
+        packages.append(package)
+        yield package
+    loaded = time.perf_counter()
+    store_packages(manager, key, packages)
+    logger.debug(
+        f"Package cache miss (cold), {len(packages)} packages streamed in "
+        f"{(loaded - start) * 1000:.1f}ms, stored in "
+        f"{(time.perf_counter() - loaded) * 1000:.1f}ms"
+    )
+
+
+def invalidates_cache(func: Callable) -> Callable:
+    """
+    Decorates the package manager operations which change the installed or available
+    packages, the index is dropped once they finished, even if they failed.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            invalidate()
+
+    return wrapper
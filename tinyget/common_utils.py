@@ -7,7 +7,12 @@ import os
 import logging
 from contextlib import contextmanager
 
-from .globals import global_configs
+from .globals import (
+    global_configs,
+    DEFAULT_BACKEND,
+    DEFAULT_MAX_OUTPUT_SIZE,
+    PACKAGE_BACKENDS,
+)
 
 
 def get_os_package_manager(possible_package_manager_names: List[str]):
@@ -267,18 +272,58 @@ def get_configuration_with_environ(
         val = os.environ.get(environ_name)
         if val is not None:
             result[key] = val
-            break
+            continue
 
         val = global_configs.get(key)
         if val is not None:
             result[key] = val
-            break
+            continue
 
         result[key] = configs.get(key)
 
     return result
 
 
+def get_max_output_size() -> int:
+    """
+    Gets the bytes of live output kept per stream, falls back to the default when the
+    configured value (from config file or command line) is not a positive integer.
+
+    Returns:
+        int: The max output size.
+    """
+    value = global_configs.get("max_output_size")
+    try:
+        size = int(value)  # type: ignore
+    except (TypeError, ValueError):
+        size = 0
+    if size <= 0 or isinstance(value, bool):
+        logger.warning(
+            f"Invalid max_output_size {value!r}, use default {DEFAULT_MAX_OUTPUT_SIZE}"
+        )
+        global_configs["max_output_size"] = DEFAULT_MAX_OUTPUT_SIZE
+        return DEFAULT_MAX_OUTPUT_SIZE
+    return size
+
+
+def get_backend(backend: Optional[str] = None) -> str:
+    """
+    Gets the package list backend, falls back to the default when the configured value
+    is unknown.
+
+    Parameters:
+        backend (str, optional): Overrides the configured backend.
+
+    Returns:
+        str: One of PACKAGE_BACKENDS.
+    """
+    value = backend if backend is not None else global_configs.get("backend")
+    if value not in PACKAGE_BACKENDS:
+        logger.warning(f"Invalid backend {value!r}, use default {DEFAULT_BACKEND}")
+        return DEFAULT_BACKEND
+    return value  # type: ignore
+
+
 def strip_str_lines(orig: str) -> str:
     origs = orig.split("\n")
     return "\n".join([x.strip() for x in origs])
@@ -0,0 +1,286 @@
+"""
+Local tinyget daemon: the GUI gRPC service listening on a Unix socket, which keeps
+the package lists and search indexes warm for the CLI commands reading them
+"""
+
+import os
+import socket
+import stat
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, TypeVar
+from tinyget.cache import get_cache_dir
+from tinyget.common_utils import logger
+from tinyget.globals import global_configs
+from tinyget.package import History, Package
+
+T = TypeVar("T")
+
+SOCKET_NAME = "tinyget.sock"
+# seconds waited for a daemon to accept the connection before running in-process
+DAEMON_CONNECT_TIMEOUT = 0.5
+
+
+def get_socket_path() -> str:
+    """
+    Gets the socket of the daemon of the current user: `$XDG_RUNTIME_DIR/tinyget.sock`
+    or, without a runtime directory, in the tinyget cache directory.
+
+    Returns:
+        str: The socket path.
+    """
+    socket_path = global_configs.get("daemon_socket")
+    if socket_path:
+        return str(socket_path)
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, SOCKET_NAME)
+    return os.path.join(get_cache_dir(), SOCKET_NAME)
+
+
+class DaemonClient:
+    """Calls the daemon listening on a Unix socket, see connect"""
+
+    def __init__(self, channel):
+        import tinyget.gui.tinyget_pb2 as tinygetlib
+        import tinyget.gui.tinyget_pb2_grpc as tinygetgrpc
+
+        self._lib = tinygetlib
+        self._channel = channel
+        self._stub = tinygetgrpc.TinygetGRPCStub(channel)
+
+    def __enter__(self) -> "DaemonClient":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._channel.close()
+
+    def _to_package(self, package) -> Package:
+        from tinyget.wrappers import MANAGER
+
+        return Package(
+            package_type=MANAGER,
+            package_name=package.package_name,
+            architecture=package.architecture,
+            description=package.description,
+            version=package.version,
+            installed=package.installed,
+            automatically_installed=package.automatically_installed,
+            upgradable=package.upgradable,
+            available_version=(
+                package.available_version
+                if package.HasField("available_version")
+                else None
+            ),
+            remain={"repo": list(package.repo)},
+        )
+
+    def _request(
+        self,
+        only_installed: bool = False,
+        only_upgradable: bool = False,
+        pkgs: str = "",
+        architecture: Optional[str] = None,
+        repo: Optional[str] = None,
+        count: bool = False,
+    ):
+        return self._lib.SoftsResquest(
+            pkgs=pkgs,
+            only_installed=only_installed,
+            only_upgradable=only_upgradable,
+            arch=architecture,
+            repo=repo,
+            count=count,
+        )
+
+    def get_softs(
+        self,
+        only_installed: bool = False,
+        only_upgradable: bool = False,
+        pkgs: str = "",
+    ) -> List[Package]:
+        response = self._stub.SoftsGet(
+            self._request(only_installed, only_upgradable, pkgs)
+        )
+        return [self._to_package(package) for package in response.softs]
+
+    def list_packages(
+        self,
+        only_installed: bool = False,
+        only_upgradable: bool = False,
+        architecture: Optional[str] = None,
+        repo: Optional[str] = None,
+    ) -> List[Package]:
+        """
+        Lists the packages as PackageManagerBase.list_packages does, filtered by the
+        service.
+        """
+        return list(
+            self.iter_packages(only_installed, only_upgradable, architecture, repo)
+        )
+
+    def iter_packages(
+        self,
+        only_installed: bool = False,
+        only_upgradable: bool = False,
+        architecture: Optional[str] = None,
+        repo: Optional[str] = None,
+    ) -> Iterator[Package]:
+        """
+        Yields the packages as the service sends them, in batches while it parses
+        the listing, see list_packages.
+        """
+        batches = self._stub.SoftsGetStream(
+            self._request(
+                only_installed, only_upgradable, architecture=architecture, repo=repo
+            )
+        )
+        for batch in batches:
+            for package in batch.packages:
+                yield self._to_package(package)
+
+    def count_packages(
+        self,
+        only_installed: bool = False,
+        only_upgradable: bool = False,
+        architecture: Optional[str] = None,
+        repo: Optional[str] = None,
+    ) -> int:
+        """
+        Counts the packages as PackageManagerBase.count_packages does, no package is
+        sent.
+        """
+        response = self._stub.SoftsGet(
+            self._request(
+                only_installed,
+                only_upgradable,
+                architecture=architecture,
+                repo=repo,
+                count=True,
+            )
+        )
+        return response.count
+
+    def search(self, pattern: str) -> List[Package]:
+        return self.get_softs(pkgs=pattern)
+
+    def history(self) -> List[History]:
+        response = self._stub.SysHistory(self._lib.SysHistoryRequest())
+        histories = []
+        for his in response.histories:
+            try:
+                date = datetime.fromisoformat(his.date)
+            except ValueError:
+                logger.debug(f"Unknown history date {his.date}")
+                date = datetime.fromtimestamp(0)
+            histories.append(
+                History(
+                    id=his.id,
+                    command=his.command,
+                    date=date,
+                    operations=list(his.operations),
+                )
+            )
+        return histories
+
+
+def connect(
+    socket_path: Optional[str] = None, timeout: float = DAEMON_CONNECT_TIMEOUT
+) -> Optional[DaemonClient]:
+    """
+    Connects to the daemon, grpc is only imported when its socket exists.
+
+    Parameters:
+        socket_path (str, optional): The socket. Defaults to get_socket_path.
+        timeout (float): Seconds to wait for the daemon to accept the connection.
+
+    Returns:
+        Optional[DaemonClient]: The client, None if no daemon is running.
+    """
+    socket_path = socket_path or get_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+    # the socket of a daemon which died refuses at once, grpc would retry until the
+    # timeout
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            probe.settimeout(timeout)
+            probe.connect(socket_path)
+    except OSError as e:
+        logger.debug(f"No tinyget daemon on {socket_path}: {e}")
+        return None
+    import grpc
+
+    channel = grpc.insecure_channel(f"unix:{socket_path}")
+    try:
+        grpc.channel_ready_future(channel).result(timeout=timeout)
+    except grpc.FutureTimeoutError:
+        logger.debug(f"No tinyget daemon answering on {socket_path}")
+        channel.close()
+        return None
+    return DaemonClient(channel)
+
+
+def call_daemon(
+    call: Callable[[DaemonClient], T], socket_path: Optional[str] = None
+) -> Optional[T]:
+    """
+    Runs a call on the daemon if one is running and forwarding is enabled (the
+    `--daemon/--no-daemon` option).
+
+    Parameters:
+        call (Callable[[DaemonClient], T]): The call.
+        socket_path (str, optional): The socket. Defaults to get_socket_path.
+
+    Returns:
+        Optional[T]: The result, None if the command has to run in-process: no
+            daemon, or the daemon failed.
+    """
+    if not global_configs.get("daemon", True):
+        return None
+    client = connect(socket_path)
+    if client is None:
+        return None
+    import grpc
+
+    try:
+        with client:
+            return call(client)
+    except grpc.RpcError as e:
+        logger.warning(f"tinyget daemon failed, running in-process: {e}")
+        return None
+
+
+def prepare_socket(socket_path: str):
+    """
+    Prepares the socket path before the daemon binds it: creates its directory
+    (only accessible by the user), checks nobody else can replace the socket and
+    removes the socket of a daemon which died.
+
+    Parameters:
+        socket_path (str): The socket.
+
+    Raises:
+        RuntimeError: Another daemon is listening on the socket, or the socket
+            directory is not owned by the user or is writable by others.
+    """
+    socket_dir = os.path.dirname(socket_path)
+    os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+    st = os.stat(socket_dir)
+    if st.st_uid != os.getuid():
+        raise RuntimeError(
+            f"The socket directory {socket_dir} is not owned by the current user"
+        )
+    if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise RuntimeError(
+            f"The socket directory {socket_dir} is writable by other users"
+        )
+    if not os.path.exists(socket_path):
+        return
+    client = connect(socket_path)
+    if client is not None:
+        client.close()
+        raise RuntimeError(f"A tinyget daemon is already listening on {socket_path}")
+    os.remove(socket_path)
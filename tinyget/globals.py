@@ -6,11 +6,49 @@ import platform
 
 DEFAULT_LOCALE_DIR = os.path.join(os.path.dirname(__file__), "locale")
 DEFAULT_LIVE_OUTPUT = True
+# bytes of stdout / stderr kept per stream when streaming install / upgrade output
+DEFAULT_MAX_OUTPUT_SIZE = 4 * 1024 * 1024
+# where package lists come from: "cli" parses the package manager's output, "native"
+# reads its database files directly
+PACKAGE_BACKENDS = ["cli", "native"]
+DEFAULT_BACKEND = "cli"
+# keep the package lists in ~/.cache/tinyget until the package manager's state changes
+DEFAULT_CACHE = True
+# forward list / search / history to the tinyget daemon when one is running
+DEFAULT_DAEMON = True
+# seconds waited for each AI helper request, a slow endpoint never stalls a command
+DEFAULT_AI_TIMEOUT = 10.0
+# seconds the AI helper health checked by a tinyget command is reused by the next ones
+DEFAULT_AI_HEALTH_TTL = 3600
+# tokens the prompt asking the AI helper may take, the command output is condensed
+DEFAULT_AI_PROMPT_BUDGET = 3000
+# reuse the AI helper advice given for the same failure, up to this many advices kept
+# this many seconds
+DEFAULT_ADVICE_CACHE = True
+DEFAULT_ADVICE_CACHE_SIZE = 256
+DEFAULT_ADVICE_CACHE_TTL = 30 * 24 * 3600
+# seconds waited for the third party softwares, resolved concurrently, the slower ones
+# are left out of the list
+DEFAULT_THIRD_PARTY_TIMEOUT = 5.0
+# seconds the third party packages resolved are reused while the installed versions
+# don't change
+DEFAULT_THIRD_PARTY_TTL = 300
 
-global_configs: Dict[str, Union[str, List[str], bool]] = {
+global_configs: Dict[str, Union[str, List[str], bool, int]] = {
     "repo_path": [BUILTIN_REPO],
     "LOCALE_DIR": DEFAULT_LOCALE_DIR,
     "live_output": DEFAULT_LIVE_OUTPUT,
+    "max_output_size": DEFAULT_MAX_OUTPUT_SIZE,
+    "backend": DEFAULT_BACKEND,
+    "cache": DEFAULT_CACHE,
+    "daemon": DEFAULT_DAEMON,
+    "ai_timeout": DEFAULT_AI_TIMEOUT,
+    "ai_health_ttl": DEFAULT_AI_HEALTH_TTL,
+    "ai_prompt_budget": DEFAULT_AI_PROMPT_BUDGET,
+    "advice_cache": DEFAULT_ADVICE_CACHE,
+    "advice_cache_size": DEFAULT_ADVICE_CACHE_SIZE,
+    "advice_cache_ttl": DEFAULT_ADVICE_CACHE_TTL,
+    "third_party_timeout": DEFAULT_THIRD_PARTY_TIMEOUT,
 }
 
 
@@ -2,7 +2,7 @@
 # Generated by the protocol buffer compiler.  DO NOT EDIT!
 # NO CHECKED-IN PROTOBUF GENCODE
 # source: tinyget.proto
-# Protobuf Python Version: 5.27.2
+# Protobuf Python Version: 7.35.1
 """Generated protocol buffer code."""
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import descriptor_pool as _descriptor_pool
@@ -11,9 +11,9 @@ from google.protobuf import symbol_database as _symbol_database
 from google.protobuf.internal import builder as _builder
 _runtime_version.ValidateProtobufRuntimeVersion(
     _runtime_version.Domain.PUBLIC,
-    5,
-    27,
-    2,
+    7,
+    35,
+    1,
     '',
     'tinyget.proto'
 )
@@ -24,37 +24,41 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rtinyget.proto\x12\x0ctinyget_grpc\"\\\n\rSoftsResquest\x12\x11\n\x04pkgs\x18\x01 \x01(\tH\x00\x88\x01\x01\x12\x16\n\x0eonly_installed\x18\x02 \x01(\x08\x12\x17\n\x0fonly_upgradable\x18\x03 \x01(\x08\x42\x07\n\x05_pkgs\"$\n\x14SoftsInstallRequests\x12\x0c\n\x04pkgs\x18\x01 \x03(\t\"&\n\x16SoftsUninstallRequests\x12\x0c\n\x04pkgs\x18\x01 \x03(\t\"#\n\x10SysUpdateRequest\x12\x0f\n\x07upgrade\x18\x01 \x01(\x08\"\x13\n\x11SysHistoryRequest\"\xe7\x01\n\x07Package\x12\x14\n\x0cpackage_name\x18\x01 \x01(\t\x12\x14\n\x0c\x61rchitecture\x18\x02 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x03 \x01(\t\x12\x0f\n\x07version\x18\x04 \x01(\t\x12\x11\n\tinstalled\x18\x05 \x01(\x08\x12\x1f\n\x17\x61utomatically_installed\x18\x06 \x01(\x08\x12\x12\n\nupgradable\x18\x07 \x01(\x08\x12\x1e\n\x11\x61vailable_version\x18\x08 \x01(\tH\x00\x88\x01\x01\x12\x0c\n\x04repo\x18\t \x03(\tB\x14\n\x12_available_version\"H\n\x07History\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0f\n\x07\x63ommand\x18\x02 \x01(\t\x12\x0c\n\x04\x64\x61te\x18\x03 \x01(\t\x12\x12\n\noperations\x18\x04 \x03(\t\"1\n\tSoftsResp\x12$\n\x05softs\x18\x01 \x03(\x0b\x32\x15.tinyget_grpc.Package\":\n\x0eSysHistoryResp\x12(\n\thistories\x18\x01 \x03(\x0b\x32\x15.tinyget_grpc.History\"c\n\x10SoftsInstallResp\x12\x0f\n\x07retcode\x18\x01 \x01(\r\x12\x13\n\x06stdout\x18\x02 \x01(\tH\x00\x88\x01\x01\x12\x13\n\x06stderr\x18\x03 \x01(\tH\x01\x88\x01\x01\x42\t\n\x07_stdoutB\t\n\x07_stderr\"e\n\x12SoftsUninstallResp\x12\x0f\n\x07retcode\x18\x01 \x01(\r\x12\x13\n\x06stdout\x18\x02 \x01(\tH\x00\x88\x01\x01\x12\x13\n\x06stderr\x18\x03 \x01(\tH\x01\x88\x01\x01\x42\t\n\x07_stdoutB\t\n\x07_stderr\"`\n\rSysUpdateResp\x12\x0f\n\x07retcode\x18\x01 \x01(\r\x12\x13\n\x06stdout\x18\x02 \x01(\tH\x00\x88\x01\x01\x12\x13\n\x06stderr\x18\x03 \x01(\tH\x01\x88\x01\x01\x42\t\n\x07_stdoutB\t\n\x07_stderr2\xfe\t\n\x0bTinygetGRPC\x12@\n\x08SoftsGet\x12\x1b.tinyget_grpc.SoftsResquest\x1a\x17.tinyget_grpc.SoftsResp\x12\x46\n\x0eSoftsGetStream\x12\x1b.tinyget_grpc.SoftsResquest\x1a\x15.tinyget_grpc.Package0\x01\x12L\n\x12SoftsGetBidiStream\x12\x1b.tinyget_grpc.SoftsResquest\x1a\x15.tinyget_grpc.Package(\x01\x30\x01\x12R\n\x0cSoftsInstall\x12\".tinyget_grpc.SoftsInstallRequests\x1a\x1e.tinyget_grpc.SoftsInstallResp\x12Z\n\x12SoftsInstallStream\x12\".tinyget_grpc.SoftsInstallRequests\x1a\x1e.tinyget_grpc.SoftsInstallResp0\x01\x12`\n\x16SoftsInstallBidiStream\x12\".tinyget_grpc.SoftsInstallRequests\x1a\x1e.tinyget_grpc.SoftsInstallResp(\x01\x30\x01\x12X\n\x0eSoftsUninstall\x12$.tinyget_grpc.SoftsUninstallRequests\x1a .tinyget_grpc.SoftsUninstallResp\x12`\n\x14SoftsUninstallStream\x12$.tinyget_grpc.SoftsUninstallRequests\x1a .tinyget_grpc.SoftsUninstallResp0\x01\x12\x66\n\x18SoftsUninstallBidiStream\x12$.tinyget_grpc.SoftsUninstallRequests\x1a .tinyget_grpc.SoftsUninstallResp(\x01\x30\x01\x12H\n\tSysUpdate\x12\x1e.tinyget_grpc.SysUpdateRequest\x1a\x1b.tinyget_grpc.SysUpdateResp\x12P\n\x0fSysUpdateStream\x12\x1e.tinyget_grpc.SysUpdateRequest\x1a\x1b.tinyget_grpc.SysUpdateResp0\x01\x12V\n\x13SysUpdateBidiStream\x12\x1e.tinyget_grpc.SysUpdateRequest\x1a\x1b.tinyget_grpc.SysUpdateResp(\x01\x30\x01\x12K\n\nSysHistory\x12\x1f.tinyget_grpc.SysHistoryRequest\x1a\x1c.tinyget_grpc.SysHistoryResp\x12L\n\x10SysHistoryStream\x12\x1f.tinyget_grpc.SysHistoryRequest\x1a\x15.tinyget_grpc.History0\x01\x12R\n\x14SysHistoryBidiStream\x12\x1f.tinyget_grpc.SysHistoryRequest\x1a\x15.tinyget_grpc.History(\x01\x30\x01\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rtinyget.proto\x12\x0ctinyget_grpc\"\xa3\x01\n\rSoftsResquest\x12\x11\n\x04pkgs\x18\x01 \x01(\tH\x00\x88\x01\x01\x12\x16\n\x0eonly_installed\x18\x02 \x01(\x08\x12\x17\n\x0fonly_upgradable\x18\x03 \x01(\x08\x12\x11\n\x04\x61rch\x18\x04 \x01(\tH\x01\x88\x01\x01\x12\x11\n\x04repo\x18\x05 \x01(\tH\x02\x88\x01\x01\x12\r\n\x05\x63ount\x18\x06 \x01(\x08\x42\x07\n\x05_pkgsB\x07\n\x05_archB\x07\n\x05_repo\"$\n\x14SoftsInstallRequests\x12\x0c\n\x04pkgs\x18\x01 \x03(\t\"&\n\x16SoftsUninstallRequests\x12\x0c\n\x04pkgs\x18\x01 \x03(\t\"#\n\x10SysUpdateRequest\x12\x0f\n\x07upgrade\x18\x01 \x01(\x08\"\x13\n\x11SysHistoryRequest\"\xe7\x01\n\x07Package\x12\x14\n\x0cpackage_name\x18\x01 \x01(\t\x12\x14\n\x0c\x61rchitecture\x18\x02 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x03 \x01(\t\x12\x0f\n\x07version\x18\x04 \x01(\t\x12\x11\n\tinstalled\x18\x05 \x01(\x08\x12\x1f\n\x17\x61utomatically_installed\x18\x06 \x01(\x08\x12\x12\n\nupgradable\x18\x07 \x01(\x08\x12\x1e\n\x11\x61vailable_version\x18\x08 \x01(\tH\x00\x88\x01\x01\x12\x0c\n\x04repo\x18\t \x03(\tB\x14\n\x12_available_version\"H\n\x07History\x12\n\n\x02id\x18\x01 \x01(\t\x12\x0f\n\x07\x63ommand\x18\x02 \x01(\t\x12\x0c\n\x04\x64\x61te\x18\x03 \x01(\t\x12\x12\n\noperations\x18\x04 \x03(\t\"7\n\x0cPackageBatch\x12\'\n\x08packages\x18\x01 \x03(\x0b\x32\x15.tinyget_grpc.Package\"O\n\tSoftsResp\x12$\n\x05softs\x18\x01 \x03(\x0b\x32\x15.tinyget_grpc.Package\x12\x12\n\x05\x63ount\x18\x02 \x01(\rH\x00\x88\x01\x01\x42\x08\n\x06_count\":\n\x0eSysHistoryResp\x12(\n\thistories\x18\x01 \x03(\x0b\x32\x15.tinyget_grpc.History\"L\n\x08Progress\x12\r\n\x05stage\x18\x01 \x01(\t\x12\x0f\n\x07package\x18\x02 \x01(\t\x12\x14\n\x07percent\x18\x03 \x01(\rH\x00\x88\x01\x01\x42\n\n\x08_percent\"\x9f\x01\n\x10SoftsInstallResp\x12\x0f\n\x07retcode\x18\x01 \x01(\r\x12\x13\n\x06stdout\x18\x02 \x01(\tH\x00\x88\x01\x01\x12\x13\n\x06stderr\x18\x03 \x01(\tH\x01\x88\x01\x01\x12-\n\x08progress\x18\x04 \x01(\x0b\x32\x16.tinyget_grpc.ProgressH\x02\x88\x01\x01\x42\t\n\x07_stdoutB\t\n\x07_stderrB\x0b\n\t_progress\"\xa1\x01\n\x12SoftsUninstallResp\x12\x0f\n\x07retcode\x18\x01 \x01(\r\x12\x13\n\x06stdout\x18\x02 \x01(\tH\x00\x88\x01\x01\x12\x13\n\x06stderr\x18\x03 \x01(\tH\x01\x88\x01\x01\x12-\n\x08progress\x18\x04 \x01(\x0b\x32\x16.tinyget_grpc.ProgressH\x02\x88\x01\x01\x42\t\n\x07_stdoutB\t\n\x07_stderrB\x0b\n\t_progress\"\x9c\x01\n\rSysUpdateResp\x12\x0f\n\x07retcode\x18\x01 \x01(\r\x12\x13\n\x06stdout\x18\x02 \x01(\tH\x00\x88\x01\x01\x12\x13\n\x06stderr\x18\x03 \x01(\tH\x01\x88\x01\x01\x12-\n\x08progress\x18\x04 \x01(\x0b\x32\x16.tinyget_grpc.ProgressH\x02\x88\x01\x01\x42\t\n\x07_stdoutB\t\n\x07_stderrB\x0b\n\t_progress2\x88\n\n\x0bTinygetGRPC\x12@\n\x08SoftsGet\x12\x1b.tinyget_grpc.SoftsResquest\x1a\x17.tinyget_grpc.SoftsResp\x12K\n\x0eSoftsGetStream\x12\x1b.tinyget_grpc.SoftsResquest\x1a\x1a.tinyget_grpc.PackageBatch0\x01\x12Q\n\x12SoftsGetBidiStream\x12\x1b.tinyget_grpc.SoftsResquest\x1a\x1a.tinyget_grpc.PackageBatch(\x01\x30\x01\x12R\n\x0cSoftsInstall\x12\".tinyget_grpc.SoftsInstallRequests\x1a\x1e.tinyget_grpc.SoftsInstallResp\x12Z\n\x12SoftsInstallStream\x12\".tinyget_grpc.SoftsInstallRequests\x1a\x1e.tinyget_grpc.SoftsInstallResp0\x01\x12`\n\x16SoftsInstallBidiStream\x12\".tinyget_grpc.SoftsInstallRequests\x1a\x1e.tinyget_grpc.SoftsInstallResp(\x01\x30\x01\x12X\n\x0eSoftsUninstall\x12$.tinyget_grpc.SoftsUninstallRequests\x1a .tinyget_grpc.SoftsUninstallResp\x12`\n\x14SoftsUninstallStream\x12$.tinyget_grpc.SoftsUninstallRequests\x1a .tinyget_grpc.SoftsUninstallResp0\x01\x12\x66\n\x18SoftsUninstallBidiStream\x12$.tinyget_grpc.SoftsUninstallRequests\x1a .tinyget_grpc.SoftsUninstallResp(\x01\x30\x01\x12H\n\tSysUpdate\x12\x1e.tinyget_grpc.SysUpdateRequest\x1a\x1b.tinyget_grpc.SysUpdateResp\x12P\n\x0fSysUpdateStream\x12\x1e.tinyget_grpc.SysUpdateRequest\x1a\x1b.tinyget_grpc.SysUpdateResp0\x01\x12V\n\x13SysUpdateBidiStream\x12\x1e.tinyget_grpc.SysUpdateRequest\x1a\x1b.tinyget_grpc.SysUpdateResp(\x01\x30\x01\x12K\n\nSysHistory\x12\x1f.tinyget_grpc.SysHistoryRequest\x1a\x1c.tinyget_grpc.SysHistoryResp\x12L\n\x10SysHistoryStream\x12\x1f.tinyget_grpc.SysHistoryRequest\x1a\x15.tinyget_grpc.History0\x01\x12R\n\x14SysHistoryBidiStream\x12\x1f.tinyget_grpc.SysHistoryRequest\x1a\x15.tinyget_grpc.History(\x01\x30\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'tinyget_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_SOFTSRESQUEST']._serialized_start=31
-  _globals['_SOFTSRESQUEST']._serialized_end=123
-  _globals['_SOFTSINSTALLREQUESTS']._serialized_start=125
-  _globals['_SOFTSINSTALLREQUESTS']._serialized_end=161
-  _globals['_SOFTSUNINSTALLREQUESTS']._serialized_start=163
-  _globals['_SOFTSUNINSTALLREQUESTS']._serialized_end=201
-  _globals['_SYSUPDATEREQUEST']._serialized_start=203
-  _globals['_SYSUPDATEREQUEST']._serialized_end=238
-  _globals['_SYSHISTORYREQUEST']._serialized_start=240
-  _globals['_SYSHISTORYREQUEST']._serialized_end=259
-  _globals['_PACKAGE']._serialized_start=262
-  _globals['_PACKAGE']._serialized_end=493
-  _globals['_HISTORY']._serialized_start=495
-  _globals['_HISTORY']._serialized_end=567
-  _globals['_SOFTSRESP']._serialized_start=569
-  _globals['_SOFTSRESP']._serialized_end=618
-  _globals['_SYSHISTORYRESP']._serialized_start=620
-  _globals['_SYSHISTORYRESP']._serialized_end=678
-  _globals['_SOFTSINSTALLRESP']._serialized_start=680
-  _globals['_SOFTSINSTALLRESP']._serialized_end=779
-  _globals['_SOFTSUNINSTALLRESP']._serialized_start=781
-  _globals['_SOFTSUNINSTALLRESP']._serialized_end=882
-  _globals['_SYSUPDATERESP']._serialized_start=884
-  _globals['_SYSUPDATERESP']._serialized_end=980
-  _globals['_TINYGETGRPC']._serialized_start=983
-  _globals['_TINYGETGRPC']._serialized_end=2261
+  _globals['_SOFTSRESQUEST']._serialized_start=32
+  _globals['_SOFTSRESQUEST']._serialized_end=195
+  _globals['_SOFTSINSTALLREQUESTS']._serialized_start=197
+  _globals['_SOFTSINSTALLREQUESTS']._serialized_end=233
+  _globals['_SOFTSUNINSTALLREQUESTS']._serialized_start=235
+  _globals['_SOFTSUNINSTALLREQUESTS']._serialized_end=273
+  _globals['_SYSUPDATEREQUEST']._serialized_start=275
+  _globals['_SYSUPDATEREQUEST']._serialized_end=310
+  _globals['_SYSHISTORYREQUEST']._serialized_start=312
+  _globals['_SYSHISTORYREQUEST']._serialized_end=331
+  _globals['_PACKAGE']._serialized_start=334
+  _globals['_PACKAGE']._serialized_end=565
+  _globals['_HISTORY']._serialized_start=567
+  _globals['_HISTORY']._serialized_end=639
+  _globals['_PACKAGEBATCH']._serialized_start=641
+  _globals['_PACKAGEBATCH']._serialized_end=696
+  _globals['_SOFTSRESP']._serialized_start=698
+  _globals['_SOFTSRESP']._serialized_end=777
+  _globals['_SYSHISTORYRESP']._serialized_start=779
+  _globals['_SYSHISTORYRESP']._serialized_end=837
+  _globals['_PROGRESS']._serialized_start=839
+  _globals['_PROGRESS']._serialized_end=915
+  _globals['_SOFTSINSTALLRESP']._serialized_start=918
+  _globals['_SOFTSINSTALLRESP']._serialized_end=1077
+  _globals['_SOFTSUNINSTALLRESP']._serialized_start=1080
+  _globals['_SOFTSUNINSTALLRESP']._serialized_end=1241
+  _globals['_SYSUPDATERESP']._serialized_start=1244
+  _globals['_SYSUPDATERESP']._serialized_end=1400
+  _globals['_TINYGETGRPC']._serialized_start=1403
+  _globals['_TINYGETGRPC']._serialized_end=2691
 # @@protoc_insertion_point(module_scope)
@@ -1,19 +1,26 @@
 from google.protobuf.internal import containers as _containers
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import message as _message
-from typing import ClassVar as _ClassVar, Iterable as _Iterable, Mapping as _Mapping, Optional as _Optional, Union as _Union
+from collections.abc import Iterable as _Iterable, Mapping as _Mapping
+from typing import ClassVar as _ClassVar, Optional as _Optional, Union as _Union
 
 DESCRIPTOR: _descriptor.FileDescriptor
 
 class SoftsResquest(_message.Message):
-    __slots__ = ("pkgs", "only_installed", "only_upgradable")
+    __slots__ = ("pkgs", "only_installed", "only_upgradable", "arch", "repo", "count")
     PKGS_FIELD_NUMBER: _ClassVar[int]
     ONLY_INSTALLED_FIELD_NUMBER: _ClassVar[int]
     ONLY_UPGRADABLE_FIELD_NUMBER: _ClassVar[int]
+    ARCH_FIELD_NUMBER: _ClassVar[int]
+    REPO_FIELD_NUMBER: _ClassVar[int]
+    COUNT_FIELD_NUMBER: _ClassVar[int]
     pkgs: str
     only_installed: bool
     only_upgradable: bool
-    def __init__(self, pkgs: _Optional[str] = ..., only_installed: bool = ..., only_upgradable: bool = ...) -> None: ...
+    arch: str
+    repo: str
+    count: bool
+    def __init__(self, pkgs: _Optional[str] = ..., only_installed: _Optional[bool] = ..., only_upgradable: _Optional[bool] = ..., arch: _Optional[str] = ..., repo: _Optional[str] = ..., count: _Optional[bool] = ...) -> None: ...
 
 class SoftsInstallRequests(_message.Message):
     __slots__ = ("pkgs",)
@@ -31,7 +38,7 @@ class SysUpdateRequest(_message.Message):
     __slots__ = ("upgrade",)
     UPGRADE_FIELD_NUMBER: _ClassVar[int]
     upgrade: bool
-    def __init__(self, upgrade: bool = ...) -> None: ...
+    def __init__(self, upgrade: _Optional[bool] = ...) -> None: ...
 
 class SysHistoryRequest(_message.Message):
     __slots__ = ()
@@ -57,7 +64,7 @@ class Package(_message.Message):
     upgradable: bool
     available_version: str
     repo: _containers.RepeatedScalarFieldContainer[str]
-    def __init__(self, package_name: _Optional[str] = ..., architecture: _Optional[str] = ..., description: _Optional[str] = ..., version: _Optional[str] = ..., installed: bool = ..., automatically_installed: bool = ..., upgradable: bool = ..., available_version: _Optional[str] = ..., repo: _Optional[_Iterable[str]] = ...) -> None: ...
+    def __init__(self, package_name: _Optional[str] = ..., architecture: _Optional[str] = ..., description: _Optional[str] = ..., version: _Optional[str] = ..., installed: _Optional[bool] = ..., automatically_installed: _Optional[bool] = ..., upgradable: _Optional[bool] = ..., available_version: _Optional[str] = ..., repo: _Optional[_Iterable[str]] = ...) -> None: ...
 
 class History(_message.Message):
     __slots__ = ("id", "command", "date", "operations")
@@ -71,11 +78,19 @@ class History(_message.Message):
     operations: _containers.RepeatedScalarFieldContainer[str]
     def __init__(self, id: _Optional[str] = ..., command: _Optional[str] = ..., date: _Optional[str] = ..., operations: _Optional[_Iterable[str]] = ...) -> None: ...
 
+class PackageBatch(_message.Message):
+    __slots__ = ("packages",)
+    PACKAGES_FIELD_NUMBER: _ClassVar[int]
+    packages: _containers.RepeatedCompositeFieldContainer[Package]
+    def __init__(self, packages: _Optional[_Iterable[_Union[Package, _Mapping]]] = ...) -> None: ...
+
 class SoftsResp(_message.Message):
-    __slots__ = ("softs",)
+    __slots__ = ("softs", "count")
     SOFTS_FIELD_NUMBER: _ClassVar[int]
+    COUNT_FIELD_NUMBER: _ClassVar[int]
     softs: _containers.RepeatedCompositeFieldContainer[Package]
-    def __init__(self, softs: _Optional[_Iterable[_Union[Package, _Mapping]]] = ...) -> None: ...
+    count: int
+    def __init__(self, softs: _Optional[_Iterable[_Union[Package, _Mapping]]] = ..., count: _Optional[int] = ...) -> None: ...
 
 class SysHistoryResp(_message.Message):
     __slots__ = ("histories",)
@@ -83,32 +98,48 @@ class SysHistoryResp(_message.Message):
     histories: _containers.RepeatedCompositeFieldContainer[History]
     def __init__(self, histories: _Optional[_Iterable[_Union[History, _Mapping]]] = ...) -> None: ...
 
+class Progress(_message.Message):
+    __slots__ = ("stage", "package", "percent")
+    STAGE_FIELD_NUMBER: _ClassVar[int]
+    PACKAGE_FIELD_NUMBER: _ClassVar[int]
+    PERCENT_FIELD_NUMBER: _ClassVar[int]
+    stage: str
+    package: str
+    percent: int
+    def __init__(self, stage: _Optional[str] = ..., package: _Optional[str] = ..., percent: _Optional[int] = ...) -> None: ...
+
 class SoftsInstallResp(_message.Message):
-    __slots__ = ("retcode", "stdout", "stderr")
+    __slots__ = ("retcode", "stdout", "stderr", "progress")
     RETCODE_FIELD_NUMBER: _ClassVar[int]
     STDOUT_FIELD_NUMBER: _ClassVar[int]
     STDERR_FIELD_NUMBER: _ClassVar[int]
+    PROGRESS_FIELD_NUMBER: _ClassVar[int]
     retcode: int
     stdout: str
     stderr: str
-    def __init__(self, retcode: _Optional[int] = ..., stdout: _Optional[str] = ..., stderr: _Optional[str] = ...) -> None: ...
+    progress: Progress
+    def __init__(self, retcode: _Optional[int] = ..., stdout: _Optional[str] = ..., stderr: _Optional[str] = ..., progress: _Optional[_Union[Progress, _Mapping]] = ...) -> None: ...
 
 class SoftsUninstallResp(_message.Message):
-    __slots__ = ("retcode", "stdout", "stderr")
+    __slots__ = ("retcode", "stdout", "stderr", "progress")
     RETCODE_FIELD_NUMBER: _ClassVar[int]
     STDOUT_FIELD_NUMBER: _ClassVar[int]
     STDERR_FIELD_NUMBER: _ClassVar[int]
+    PROGRESS_FIELD_NUMBER: _ClassVar[int]
     retcode: int
     stdout: str
     stderr: str
-    def __init__(self, retcode: _Optional[int] = ..., stdout: _Optional[str] = ..., stderr: _Optional[str] = ...) -> None: ...
+    progress: Progress
+    def __init__(self, retcode: _Optional[int] = ..., stdout: _Optional[str] = ..., stderr: _Optional[str] = ..., progress: _Optional[_Union[Progress, _Mapping]] = ...) -> None: ...
 
 class SysUpdateResp(_message.Message):
-    __slots__ = ("retcode", "stdout", "stderr")
+    __slots__ = ("retcode", "stdout", "stderr", "progress")
     RETCODE_FIELD_NUMBER: _ClassVar[int]
     STDOUT_FIELD_NUMBER: _ClassVar[int]
     STDERR_FIELD_NUMBER: _ClassVar[int]
+    PROGRESS_FIELD_NUMBER: _ClassVar[int]
     retcode: int
     stdout: str
     stderr: str
-    def __init__(self, retcode: _Optional[int] = ..., stdout: _Optional[str] = ..., stderr: _Optional[str] = ...) -> None: ...
+    progress: Progress
+    def __init__(self, retcode: _Optional[int] = ..., stdout: _Optional[str] = ..., stderr: _Optional[str] = ..., progress: _Optional[_Union[Progress, _Mapping]] = ...) -> None: ...
@@ -5,7 +5,7 @@ import warnings
 
 import tinyget.gui.tinyget_pb2 as tinyget__pb2
 
-GRPC_GENERATED_VERSION = '1.66.1'
+GRPC_GENERATED_VERSION = '1.84.0'
 GRPC_VERSION = grpc.__version__
 _version_not_supported = False
 
@@ -18,14 +18,14 @@ except ImportError:
 if _version_not_supported:
     raise RuntimeError(
         f'The grpc package installed is at version {GRPC_VERSION},'
-        + f' but the generated code in tinyget_pb2_grpc.py depends on'
+        + ' but the generated code in tinyget_pb2_grpc.py depends on'
         + f' grpcio>={GRPC_GENERATED_VERSION}.'
         + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
         + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
     )
 
 
-class TinygetGRPCStub(object):
+class TinygetGRPCStub:
     """Missing associated documentation comment in .proto file."""
 
     def __init__(self, channel):
@@ -42,12 +42,12 @@ class TinygetGRPCStub(object):
         self.SoftsGetStream = channel.unary_stream(
                 '/tinyget_grpc.TinygetGRPC/SoftsGetStream',
                 request_serializer=tinyget__pb2.SoftsResquest.SerializeToString,
-                response_deserializer=tinyget__pb2.Package.FromString,
+                response_deserializer=tinyget__pb2.PackageBatch.FromString,
                 _registered_method=True)
         self.SoftsGetBidiStream = channel.stream_stream(
                 '/tinyget_grpc.TinygetGRPC/SoftsGetBidiStream',
                 request_serializer=tinyget__pb2.SoftsResquest.SerializeToString,
-                response_deserializer=tinyget__pb2.Package.FromString,
+                response_deserializer=tinyget__pb2.PackageBatch.FromString,
                 _registered_method=True)
         self.SoftsInstall = channel.unary_unary(
                 '/tinyget_grpc.TinygetGRPC/SoftsInstall',
@@ -111,7 +111,7 @@ class TinygetGRPCStub(object):
                 _registered_method=True)
 
 
-class TinygetGRPCServicer(object):
+class TinygetGRPCServicer:
     """Missing associated documentation comment in .proto file."""
 
     def SoftsGet(self, request, context):
@@ -215,12 +215,12 @@ def add_TinygetGRPCServicer_to_server(servicer, server):
             'SoftsGetStream': grpc.unary_stream_rpc_method_handler(
                     servicer.SoftsGetStream,
                     request_deserializer=tinyget__pb2.SoftsResquest.FromString,
-                    response_serializer=tinyget__pb2.Package.SerializeToString,
+                    response_serializer=tinyget__pb2.PackageBatch.SerializeToString,
             ),
             'SoftsGetBidiStream': grpc.stream_stream_rpc_method_handler(
                     servicer.SoftsGetBidiStream,
                     request_deserializer=tinyget__pb2.SoftsResquest.FromString,
-                    response_serializer=tinyget__pb2.Package.SerializeToString,
+                    response_serializer=tinyget__pb2.PackageBatch.SerializeToString,
             ),
             'SoftsInstall': grpc.unary_unary_rpc_method_handler(
                     servicer.SoftsInstall,
@@ -290,7 +290,7 @@ def add_TinygetGRPCServicer_to_server(servicer, server):
 
 
  # This class is part of an EXPERIMENTAL API.
-class TinygetGRPC(object):
+class TinygetGRPC:
     """Missing associated documentation comment in .proto file."""
 
     @staticmethod
@@ -336,7 +336,7 @@ class TinygetGRPC(object):
             target,
             '/tinyget_grpc.TinygetGRPC/SoftsGetStream',
             tinyget__pb2.SoftsResquest.SerializeToString,
-            tinyget__pb2.Package.FromString,
+            tinyget__pb2.PackageBatch.FromString,
             options,
             channel_credentials,
             insecure,
@@ -363,7 +363,7 @@ class TinygetGRPC(object):
             target,
             '/tinyget_grpc.TinygetGRPC/SoftsGetBidiStream',
             tinyget__pb2.SoftsResquest.SerializeToString,
-            tinyget__pb2.Package.FromString,
+            tinyget__pb2.PackageBatch.FromString,
             options,
             channel_credentials,
             insecure,
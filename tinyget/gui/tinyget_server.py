@@ -1,64 +1,598 @@
-from typing import Optional
-from tinyget.common_utils import logger
+from collections import OrderedDict, deque
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+from tinyget.cache import get_state_key
+from tinyget.common_utils import get_backend, logger
 from concurrent import futures
-from tinyget.wrappers import PackageManager
+from tinyget.daemon import prepare_socket
+from tinyget.interact import CancelScope, OutputScope
+from tinyget.interact.progress import ProgressParser
+from tinyget.package import History, Package, PackageTable, package_matches
+from tinyget.wrappers import MANAGER, PackageManager
+from tinyget.wrappers.pkg_manager import get_filters
 import asyncio
+import contextlib
+import functools
+import os
+import time
 import click
 import tinyget.gui.tinyget_pb2 as tinygetlib
 import tinyget.gui.tinyget_pb2_grpc as tinygetgrpc
 import grpc
 
+T = TypeVar("T")
+
+# threads running the package manager calls, the event loop only serves the clients
+SERVICE_WORKERS = 4
+# listings / searches kept by the service, for this many seconds at most: the changes
+# the package manager state files don't show (third party packages) are seen too
+CACHE_SIZE = 32
+CACHE_TTL = 300
+
+# the key of the full listing in SoftsCache, the filtered listings are derived from it
+LISTING = ("list",)
+
+# packages handed over from the scanning thread to the clients at once, or the ones
+# parsed for this many seconds: the first package is handed over alone. The streams
+# send them in messages of this many packages at most
+STREAM_BATCH = 256
+STREAM_INTERVAL = 0.05
+# output chunks of an install / uninstall / update waiting for the client, past them
+# the oldest ones are dropped: the command never waits for the client
+OUTPUT_BUFFER = 64
+
+
+def package_message(package: Package) -> tinygetlib.Package:
+    return tinygetlib.Package(
+        package_name=package.package_name,
+        architecture=package.architecture,
+        description=package.description,
+        version=package.version,
+        installed=package.installed,
+        automatically_installed=package.automatically_installed,
+        upgradable=package.upgradable,
+        available_version=package.available_version,
+        repo=package.remain["repo"],
+    )
+
+
+def batch_messages(packages: List[Package]) -> Iterator[tinygetlib.PackageBatch]:
+    """Splits packages into the messages of a stream, STREAM_BATCH per message"""
+    for i in range(0, len(packages), STREAM_BATCH):
+        yield tinygetlib.PackageBatch(
+            packages=[package_message(p) for p in packages[i : i + STREAM_BATCH]]
+        )
+
+
+def history_message(history: History) -> tinygetlib.History:
+    return tinygetlib.History(
+        id=history.id,
+        command=history.command,
+        date=str(history.date),
+        operations=history.operations,
+    )
+
+
+def request_filters(request: tinygetlib.SoftsResquest) -> Dict[str, Any]:
+    """Builds the PackageTable.mask filters of a softs request, see get_filters"""
+    return get_filters(
+        request.only_installed,
+        request.only_upgradable,
+        architecture=request.arch if request.HasField("arch") else None,
+        repo=request.repo if request.HasField("repo") else None,
+    )
+
+
+def is_filtered(filters: Dict[str, Any]) -> bool:
+    return any(value is not None for value in filters.values())
+
+
+def filter_listing(packages: List[Package], filters: Dict[str, Any]) -> List[Package]:
+    """Filters the packages of a listing streamed, see request_filters"""
+    if not is_filtered(filters):
+        return packages
+    return [p for p in packages if package_matches(p, **filters)]
+
+
+def output_message(resp: Callable[..., T], kind: str, value: Any) -> T:
+    """Builds a response of an install / uninstall / update stream
+
+    Args:
+        resp (Callable[..., T]): The response message type.
+        kind (str): "stdout" or "stderr" with an output chunk, "progress" with a
+            ProgressEvent, "result" with the result of the call.
+        value (Any): The chunk, event or result.
+
+    Returns:
+        T: The response.
+    """
+    if kind == "progress":
+        return resp(
+            progress=tinygetlib.Progress(
+                stage=value.stage, package=value.package, percent=value.percent
+            )
+        )
+    if kind == "result":
+        # the output was streamed already
+        _, _, retcode = value
+        click.echo(f"Retcode: {retcode}")
+        return resp(retcode=retcode)
+    return resp(**{kind: value})
+
+
+def hand_over(
+    loop: asyncio.AbstractEventLoop,
+    items: Iterable[T],
+    extend: Callable[[List[T]], None],
+) -> None:
+    """Hands the items over to the event loop in batches while the iteration yields
+    them, runs in the service executor
+
+    Args:
+        loop (asyncio.AbstractEventLoop): The event loop of the service.
+        items (Iterable[T]): The iteration, parsing the package manager output.
+        extend (Callable[[List[T]], None]): Called in the event loop with each batch.
+    """
+    batch: List[T] = []
+    handed = 0.0
+    for item in items:
+        batch.append(item)
+        if len(batch) >= STREAM_BATCH or time.monotonic() - handed >= STREAM_INTERVAL:
+            loop.call_soon_threadsafe(extend, batch)
+            batch = []
+            handed = time.monotonic()
+    if batch:
+        loop.call_soon_threadsafe(extend, batch)
+
+
+class ReadWriteLock:
+    """asyncio lock letting the reads run together while a write runs alone
+
+    The writes waiting go before the reads arriving after them, a stream of
+    listings doesn't starve an install.
+    """
+
+    def __init__(self) -> None:
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+        self._condition = asyncio.Condition()
+
+    @contextlib.asynccontextmanager
+    async def read(self) -> AsyncIterator[None]:
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: not self._writing and self._writers_waiting == 0
+            )
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._readers -= 1
+                self._condition.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def write(self) -> AsyncIterator[None]:
+        async with self._condition:
+            self._writers_waiting += 1
+            try:
+                await self._condition.wait_for(
+                    lambda: not self._writing and self._readers == 0
+                )
+            finally:
+                self._writers_waiting -= 1
+                # the reads held back by a write which gave up can go on
+                self._condition.notify_all()
+            self._writing = True
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class SoftsCache:
+    """Listings and searches of the service, the least recently used dropped first
+
+    The entries belong to a state of the package manager (see get_state_key), all of
+    them are dropped once it changed: memory stays flat however long the service runs
+    and however many patterns the clients search.
+    """
+
+    def __init__(self, size: int = CACHE_SIZE, ttl: float = CACHE_TTL) -> None:
+        self.size = size
+        self.ttl = ttl
+        self._state: Optional[Tuple] = None
+        self._entries: "OrderedDict[Tuple, Tuple[float, List[Package]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _check_state(self, state: Tuple):
+        if state != self._state:
+            if self._entries:
+                logger.debug("Package manager state changed, service cache cleared")
+            self._entries.clear()
+            self._state = state
+
+    def get(self, state: Tuple, key: Tuple) -> Optional[List[Package]]:
+        """Gets the packages cached, None if not cached, expired or of another state"""
+        self._check_state(state)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] >= self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, state: Tuple, key: Tuple, packages: List[Package]):
+        self._check_state(state)
+        self._entries[key] = (time.monotonic(), packages)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class ScanProgress(Generic[T]):
+    """What a scan parsed so far, streamed to the clients before the scan ended
+
+    The scan goes on at its pace, each client at its own: a slow client is only held
+    back by the gRPC flow control of its stream, the items it wasn't sent yet wait
+    in the list the scan builds anyway.
+    """
+
+    def __init__(self) -> None:
+        self.items: List[T] = []
+        self._grown: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+
+    def extend(self, items: List[T]):
+        self.items.extend(items)
+        self._grown.set_result(None)
+        self._grown = asyncio.get_running_loop().create_future()
+
+    async def follow(self, scan: "asyncio.Future[List[T]]") -> AsyncIterator[List[T]]:
+        """Yields the items as the scan parses them, then the ones it returned
+
+        Args:
+            scan (asyncio.Future[List[T]]): The scan, returning all the items. Not
+                cancelled when the client goes away.
+
+        Yields:
+            List[T]: The items not yielded yet.
+        """
+        sent = 0
+        while not scan.done():
+            if sent < len(self.items):
+                items = self.items[sent:]
+                sent += len(items)
+                yield items
+            else:
+                await asyncio.wait(
+                    [self._grown, scan], return_when=asyncio.FIRST_COMPLETED
+                )
+        # the items of a scan answered from the cache were never handed over
+        items = scan.result()[sent:]
+        if items:
+            yield items
+
+
+class OutputRelay:
+    """Output of the commands a call runs, handed from the threads reading them to
+    the event loop
+
+    At most `size` chunks (OUTPUT_BUFFER) wait for the client, past them the oldest
+    ones are dropped: a client which stopped reading neither holds the command nor
+    the lock the operation runs under.
+    """
+
+    def __init__(self, size: Optional[int] = None) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._chunks: Deque[Tuple[str, str]] = deque(
+            maxlen=OUTPUT_BUFFER if size is None else size
+        )
+        self._ended = False
+        self._ready = asyncio.Event()
+        # chunks the client was too slow to be sent
+        self.dropped = 0
+
+    def put(self, kind: str, text: str):
+        """Hands over an output chunk, from the reading thread"""
+        self._loop.call_soon_threadsafe(self._push, kind, text)
+
+    def _push(self, kind: str, text: str):
+        if len(self._chunks) == self._chunks.maxlen:
+            self.dropped += 1
+        self._chunks.append((kind, text))
+        self._ready.set()
+
+    def end(self):
+        """Hands over the end of the call, from its thread"""
+        self._loop.call_soon_threadsafe(self._end)
+
+    def _end(self):
+        self._ended = True
+        self._ready.set()
+
+    async def get(self) -> Optional[Tuple[str, str]]:
+        """Gets the next output chunk, None once the call ended"""
+        while not self._chunks:
+            if self._ended:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        return self._chunks.popleft()
+
 
 class TinygetServer:
     class TinygetService(tinygetgrpc.TinygetGRPCServicer):
         def __init__(self, outer: "TinygetServer") -> None:
             self._outer = outer
-            self._cached_list_softwares = {}
-            self._lock = asyncio.Lock()
+            self._cached_list_softwares = SoftsCache()
+            # the table of the last listing filtered, see _get_table
+            self._table: Optional[Tuple[List[Package], PackageTable]] = None
+            # listings and histories read, installs and updates write
+            self._lock = ReadWriteLock()
+            # the scans running, the identical requests wait for the same one
+            self._scans: Dict[tuple, "asyncio.Future[list]"] = {}
+            # the requests waiting for each scan, see _waiting
+            self._waiters: Dict[tuple, int] = {}
+            # what the listings running parsed so far, see SoftsGetStream
+            self._progress: Dict[tuple, ScanProgress[Package]] = {}
             self._pkg_manager = PackageManager()
+            self._executor = futures.ThreadPoolExecutor(
+                max_workers=SERVICE_WORKERS, thread_name_prefix="tinyget-service"
+            )
             super().__init__()
 
+        async def _call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+            """Runs a blocking package manager call in the service executor
+
+            The event loop keeps serving the other clients meanwhile. When the request
+            is cancelled (the client went away or its deadline passed), the commands
+            the call spawned are terminated and the call is waited for before the
+            cancellation goes on, so the lock is only released once they exited.
+
+            Args:
+                fn (Callable[..., T]): The blocking call.
+
+            Returns:
+                T: What the call returned.
+            """
+            loop = asyncio.get_running_loop()
+            scope = CancelScope()
+            future = loop.run_in_executor(
+                self._executor, functools.partial(scope.run, fn, *args, **kwargs)
+            )
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                logger.info(f"Request cancelled, stopping {fn.__name__}")
+                scope.cancel()
+                await asyncio.wait([future])
+                raise
+
+        async def _stream_call(
+            self, fn: Callable[..., T], *args
+        ) -> AsyncIterator[Tuple[str, Any]]:
+            """Runs a package manager operation as _call does, holding the write lock,
+            yields its output and progress while the commands it runs write them
+
+            The operation and the lock don't wait for the client: they are released
+            once the commands exited, the output the client wasn't sent yet dropped
+            past OUTPUT_BUFFER chunks, see OutputRelay.
+
+            Yields:
+                Tuple[str, Any]: ("stdout", chunk) and ("stderr", chunk), the
+                    ("progress", ProgressEvent) parsed from stdout, the
+                    ("result", what the call returned) last.
+            """
+            relay = OutputRelay()
+            parser = ProgressParser()
+
+            @functools.wraps(fn)
+            def run():
+                try:
+                    return OutputScope(relay.put).run(fn, *args)
+                finally:
+                    relay.end()
+
+            async def operate():
+                async with self._lock.write():
+                    try:
+                        return await self._call(run)
+                    finally:
+                        self._cached_list_softwares.clear()
+
+            call = asyncio.ensure_future(operate())
+            try:
+                while True:
+                    item = await relay.get()
+                    if item is None:
+                        break
+                    kind, text = item
+                    yield kind, text
+                    if kind == "stdout":
+                        for event in parser.feed(text):
+                            yield "progress", event
+                for event in parser.flush():
+                    yield "progress", event
+                if relay.dropped:
+                    logger.warning(
+                        f"Client too slow, {relay.dropped} output chunks dropped"
+                    )
+                yield "result", await call
+            finally:
+                if not call.done():
+                    # the client went away, the operation is stopped
+                    call.cancel()
+                    await asyncio.wait([call])
+
+        def _get_cached_softs(self, state: Tuple, key: Tuple) -> Optional[list]:
+            sh = self._cached_list_softwares.get(state, key)
+            if sh is not None:
+                click.echo(f"Get {len(sh)} softwares")
+            return sh
+
+        async def _get_listing(self, pkgs: Optional[str] = None) -> List[Package]:
+            """Tinyget Service get / search softs
+
+            Args:
+                pkgs (Optional[str], optional): search packages pattern. Defaults to None.
+
+            Returns:
+                List[Package]: list of packages
+            """
+            click.echo(f"Start get softwares: {pkgs if pkgs else ''}")
+            # the package manager may have been run outside of tinyget
+            state = get_state_key(MANAGER, get_backend())
+            # one full listing, the filtered ones are derived from it
+            key = ("search", pkgs) if pkgs else LISTING
+            # listed already, no need to wait for the install / update running
+            packages = self._get_cached_softs(state, key)
+            if packages is None:
+                scan = self._get_scan(state, key)
+                with self._waiting((state, key), scan):
+                    # a client going away doesn't cancel the scan the others wait for
+                    packages = await asyncio.shield(scan)
+            return packages
+
+        def _get_table(self, packages: List[Package]) -> PackageTable:
+            """Gets the table of a listing, filtered and counted on its columns
+
+            The table of the last listing is kept, the clients mostly ask for the
+            full listing with various filters.
+            """
+            if self._table is None or self._table[0] is not packages:
+                self._table = (packages, PackageTable.from_packages(MANAGER, packages))
+            return self._table[1]
+
         async def _get_softs(
+            self, filters: Dict[str, Any], pkgs: Optional[str] = None
+        ) -> List[Package]:
+            """Tinyget Service get / search softs, filtered
+
+            Args:
+                filters (Dict[str, Any]): The filters, see request_filters.
+                pkgs (Optional[str], optional): search packages pattern. Defaults to None.
+
+            Returns:
+                List[Package]: list of packages
+            """
+            packages = await self._get_listing(pkgs)
+            if not is_filtered(filters):
+                return packages
+            table = self._get_table(packages)
+            return [packages[i] for i in table.select(**filters)]
+
+        async def _count_softs(
+            self, filters: Dict[str, Any], pkgs: Optional[str] = None
+        ) -> int:
+            """Tinyget Service count softs, see _get_softs
+
+            Returns:
+                int: The count of the packages, none of them sent
+            """
+            packages = await self._get_listing(pkgs)
+            if not is_filtered(filters):
+                return len(packages)
+            return self._get_table(packages).count(**filters)
+
+        def _get_scan(self, state: Tuple, key: Tuple) -> "asyncio.Future[list]":
+            """Starts a scan, or gets the same one running"""
+            h = (state, key)
+            scan = self._scans.get(h)
+            if scan is not None:
+                click.echo("Waiting for the same scan running")
+                return scan
+            progress = None
+            if key == LISTING:
+                progress = self._progress[h] = ScanProgress()
+            scan = asyncio.ensure_future(self._scan_softs(state, key, progress))
+            self._scans[h] = scan
+            scan.add_done_callback(functools.partial(self._forget_scan, h))
+            return scan
+
+        async def _scan_softs(
             self,
-            only_installed: bool,
-            only_upgradable: bool,
-            pkgs: Optional[str] = None,
+            state: Tuple,
+            key: Tuple,
+            progress: Optional[ScanProgress[Package]] = None,
         ):
-            """Tinyget Service get / search softs
+            """Tinyget Service list / search softs, see _get_listing
 
             Args:
-                only_installed (bool): Only list installed
-                only_upgradable (bool): Only list upgradable
-                pkgs (Optional[str], optional): search packages pattern. Defaults to None.
+                progress (Optional[ScanProgress[Package]], optional): Extended with
+                    the packages of a listing as they are parsed. Defaults to None.
 
             Returns:
                 List[Package]: list of packages
             """
-            await self._lock.acquire()
-            try:
-                click.echo(f"Start get softwares: {pkgs if pkgs else ''}")
-                h = (only_installed, only_upgradable, pkgs)
-                if h in self._cached_list_softwares:
-                    sh = self._cached_list_softwares[h]
-                    click.echo(f"Get {len(sh)} softwares")
+            async with self._lock.read():
+                sh = self._get_cached_softs(state, key)
+                if sh is not None:
                     return sh
-                if pkgs is not None and pkgs != "":
-                    # search for certain packages
-                    packages = self._pkg_manager.search(pkgs)
-                else:
-                    # list all packages
-                    packages = self._pkg_manager.list_packages(
-                        only_installed=only_installed,
-                        only_upgradable=only_upgradable,
+                if progress is not None:
+                    # list all packages, streamed to the clients while parsed
+                    await self._call(
+                        hand_over,
+                        asyncio.get_running_loop(),
+                        self._pkg_manager.iter_packages(),
+                        progress.extend,
                     )
+                    packages = progress.items
+                elif key == LISTING:
+                    # list all packages
+                    packages = await self._call(self._pkg_manager.list_packages)
+                else:
+                    # search for certain packages
+                    packages = await self._call(self._pkg_manager.search, key[1])
                 click.echo(f"Get {len(packages)} softwares")
-                self._cached_list_softwares[h] = packages
-            finally:
-                self._lock.release()
+                self._cached_list_softwares.put(state, key, packages)
             return packages
 
+        @contextlib.contextmanager
+        def _waiting(self, h: tuple, scan: "asyncio.Future[list]"):
+            """Counts a request waiting for a scan: once none waits for it any more,
+            the scan is cancelled and the commands it runs terminated, see _call"""
+            self._waiters[h] = self._waiters.get(h, 0) + 1
+            try:
+                yield
+            finally:
+                self._waiters[h] -= 1
+                if self._waiters[h] == 0:
+                    del self._waiters[h]
+                    if not scan.done():
+                        logger.info("No request waits for the scan, stopping it")
+                        scan.cancel()
+
+        def _forget_scan(self, h: tuple, scan: "asyncio.Future[list]"):
+            self._scans.pop(h, None)
+            self._progress.pop(h, None)
+            if not scan.cancelled():
+                # retrieved, even when all the clients waiting for it went away
+                scan.exception()
+
         async def SoftsGet(self, request: tinygetlib.SoftsResquest, context):
-            """Tinyget Service get softs
+            """Tinyget Service get softs, or only their count
 
             Args:
                 request (tinygetlib.SoftsResquest): gRPC softs request
@@ -67,51 +601,124 @@ class TinygetServer:
             Returns:
                 List[tinygetlib.SoftsResp]: list of gRPC softs response
             """
-            pkgs = []
-            packages = await self._get_softs(
-                request.only_installed, request.only_upgradable, request.pkgs
-            )
-            for package in packages:
-                pkgs.append(
-                    tinygetlib.Package(
-                        package_name=package.package_name,
-                        architecture=package.architecture,
-                        description=package.description,
-                        version=package.version,
-                        installed=package.installed,
-                        automatically_installed=package.automatically_installed,
-                        upgradable=package.upgradable,
-                        available_version=package.available_version,
-                        repo=package.remain["repo"],
-                    )
-                )
+            filters = request_filters(request)
+            if request.count:
+                count = await self._count_softs(filters, request.pkgs)
+                return tinygetlib.SoftsResp(count=count)
+            packages = await self._get_softs(filters, request.pkgs)
+            pkgs = [package_message(package) for package in packages]
             return tinygetlib.SoftsResp(softs=pkgs)
 
         async def SoftsGetStream(self, request: tinygetlib.SoftsResquest, context):
             """Tinyget Service get softs in stream
 
+            The packages of a listing are sent while the package manager output is
+            parsed, the clients asking for the same listing meanwhile follow the same
+            scan.
+
             Args:
                 request (tinygetlib.SoftsResquest): gRPC softs request
                 context: gRPC context
 
             Returns:
-                List[tinygetlib.SoftsResp]: list of gRPC softs response
+                List[tinygetlib.PackageBatch]: the packages, in batches of
+                    STREAM_BATCH at most
+            """
+            state = get_state_key(MANAGER, get_backend())
+            filters = request_filters(request)
+            if request.pkgs or self._get_cached_softs(state, LISTING) is not None:
+                # searches use the package index, they don't take long
+                packages = await self._get_softs(filters, request.pkgs)
+                for batch in batch_messages(packages):
+                    yield batch
+                return
+            click.echo("Start get softwares in stream")
+            scan = self._get_scan(state, LISTING)
+            progress = self._progress.get((state, LISTING))
+            if progress is None:
+                # the scan ended meanwhile
+                progress = ScanProgress()
+            with self._waiting((state, LISTING), scan):
+                async for packages in progress.follow(scan):
+                    for batch in batch_messages(filter_listing(packages, filters)):
+                        yield batch
+
+        async def SoftsGetBidiStream(self, request_iterator, context):
+            """Tinyget Service get softs of each request, see SoftsGetStream
+
+            Each request is queried in a task of its own: a new request cancels the
+            query of the previous one if still running, the scan it waited for is
+            stopped unless another request waits for it. The batches of a cancelled
+            query not sent yet are dropped.
+
+            Args:
+                request_iterator (AsyncIterator[tinygetlib.SoftsResquest]): gRPC softs
+                    requests
+                context: gRPC context
+
+            Returns:
+                List[tinygetlib.PackageBatch]: the packages of the requests, in order
             """
-            packages = await self._get_softs(
-                request.only_installed, request.only_upgradable, request.pkgs
+
+            async def query(request, batches: asyncio.Queue):
+                async for batch in self.SoftsGetStream(request, context):
+                    await batches.put(batch)
+                await batches.put(None)
+
+            requests = request_iterator.__aiter__()
+            next_request: Optional[asyncio.Future] = asyncio.ensure_future(
+                requests.__anext__()
             )
-            for package in packages:
-                yield tinygetlib.Package(
-                    package_name=package.package_name,
-                    architecture=package.architecture,
-                    description=package.description,
-                    version=package.version,
-                    installed=package.installed,
-                    automatically_installed=package.automatically_installed,
-                    upgradable=package.upgradable,
-                    available_version=package.available_version,
-                    repo=package.remain["repo"],
-                )
+            running: Optional[asyncio.Future] = None
+            batches: "asyncio.Queue[Optional[tinygetlib.PackageBatch]]" = asyncio.Queue(
+                maxsize=1
+            )
+            next_batch: Optional[asyncio.Future] = None
+
+            async def cancel(task: Optional[asyncio.Future]):
+                if task is not None and not task.done():
+                    task.cancel()
+                    await asyncio.wait([task])
+
+            try:
+                while next_request is not None or running is not None:
+                    if running is not None and next_batch is None:
+                        next_batch = asyncio.ensure_future(batches.get())
+                    waits = [
+                        f for f in (next_request, next_batch, running) if f is not None
+                    ]
+                    await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+                    if next_request is not None and next_request.done():
+                        try:
+                            request = next_request.result()
+                        except StopAsyncIteration:
+                            next_request = None
+                            continue
+                        next_request = asyncio.ensure_future(requests.__anext__())
+                        if running is not None:
+                            click.echo("New request, previous query cancelled")
+                        await cancel(next_batch)
+                        await cancel(running)
+                        next_batch = None
+                        batches = asyncio.Queue(maxsize=1)
+                        running = asyncio.ensure_future(query(request, batches))
+                    elif next_batch is not None and next_batch.done():
+                        batch = next_batch.result()
+                        next_batch = None
+                        if batch is None:
+                            # the query finished, its errors raised
+                            await running
+                            running = None
+                        else:
+                            yield batch
+                    elif running is not None and running.done():
+                        # failed before its end
+                        running.result()
+                        running = None
+            finally:
+                await cancel(next_batch)
+                await cancel(running)
+                await cancel(next_request)
 
         async def SoftsInstall(self, request: tinygetlib.SoftsInstallRequests, context):
             """Tinyget Service install softs
@@ -126,14 +733,11 @@ class TinygetServer:
             pkgs = []
             for pkg in request.pkgs:
                 pkgs.append(pkg)
-            await self._lock.acquire()
-            try:
+            async with self._lock.write():
                 click.echo(f"Start install softwares: {pkgs if len(pkgs) > 0 else ''}")
-                out, err, retcode = self._pkg_manager.install(pkgs)
+                out, err, retcode = await self._call(self._pkg_manager.install, pkgs)
                 self._cached_list_softwares.clear()
                 click.echo(f"Output: {out}\nErr: {err}\nRetcode: {retcode}")
-            finally:
-                self._lock.release()
             return tinygetlib.SoftsInstallResp(retcode=retcode, stdout=out, stderr=err)
 
         async def SoftsUninstall(
@@ -151,20 +755,89 @@ class TinygetServer:
             pkgs = []
             for pkg in request.pkgs:
                 pkgs.append(pkg)
-            await self._lock.acquire()
-            try:
+            async with self._lock.write():
                 click.echo(
                     f"Start uninstall softwares: {pkgs if len(pkgs) > 0 else ''}"
                 )
-                out, err, retcode = self._pkg_manager.uninstall(pkgs)
+                out, err, retcode = await self._call(self._pkg_manager.uninstall, pkgs)
                 self._cached_list_softwares.clear()
                 click.echo(f"Output: {out}\nErr: {err}\nRetcode: {retcode}")
-            finally:
-                self._lock.release()
             return tinygetlib.SoftsUninstallResp(
                 retcode=retcode, stdout=out, stderr=err
             )
 
+        async def SoftsInstallStream(
+            self, request: tinygetlib.SoftsInstallRequests, context
+        ):
+            """Tinyget Service install softs, the output and progress streamed
+
+            Args:
+                request (tinygetlib.SoftsInstallResquest): gRPC softs install request
+                context: gRPC context
+
+            Returns:
+                List[tinygetlib.SoftsInstallResp]: the output chunks and progress, the
+                    retcode last
+            """
+            pkgs = list(request.pkgs)
+            click.echo(f"Start install softwares: {pkgs if len(pkgs) > 0 else ''}")
+            async for kind, value in self._stream_call(self._pkg_manager.install, pkgs):
+                yield output_message(tinygetlib.SoftsInstallResp, kind, value)
+
+        async def SoftsInstallBidiStream(self, request_iterator, context):
+            """Tinyget Service install softs of each request in turn, see
+            SoftsInstallStream
+
+            Args:
+                request_iterator (AsyncIterator[tinygetlib.SoftsInstallRequests]): gRPC
+                    softs install requests
+                context: gRPC context
+
+            Returns:
+                List[tinygetlib.SoftsInstallResp]: the output chunks and progress of
+                    each request, its retcode last
+            """
+            async for request in request_iterator:
+                async for resp in self.SoftsInstallStream(request, context):
+                    yield resp
+
+        async def SoftsUninstallStream(
+            self, request: tinygetlib.SoftsUninstallRequests, context
+        ):
+            """Tinyget Service uninstall softs, the output and progress streamed
+
+            Args:
+                request (tinygetlib.SoftsUninstallResquest): gRPC softs uninstall request
+                context: gRPC context
+
+            Returns:
+                List[tinygetlib.SoftsUninstallResp]: the output chunks and progress,
+                    the retcode last
+            """
+            pkgs = list(request.pkgs)
+            click.echo(f"Start uninstall softwares: {pkgs if len(pkgs) > 0 else ''}")
+            async for kind, value in self._stream_call(
+                self._pkg_manager.uninstall, pkgs
+            ):
+                yield output_message(tinygetlib.SoftsUninstallResp, kind, value)
+
+        async def SoftsUninstallBidiStream(self, request_iterator, context):
+            """Tinyget Service uninstall softs of each request in turn, see
+            SoftsUninstallStream
+
+            Args:
+                request_iterator (AsyncIterator[tinygetlib.SoftsUninstallRequests]):
+                    gRPC softs uninstall requests
+                context: gRPC context
+
+            Returns:
+                List[tinygetlib.SoftsUninstallResp]: the output chunks and progress of
+                    each request, its retcode last
+            """
+            async for request in request_iterator:
+                async for resp in self.SoftsUninstallStream(request, context):
+                    yield resp
+
         async def SysUpdate(self, request: tinygetlib.SysUpdateRequest, context):
             """Tinyget system update
 
@@ -175,20 +848,53 @@ class TinygetServer:
             Returns:
                 List[tinygetlib.SysUpdateResp]: list of gRPC sys update response
             """
-            await self._lock.acquire()
-            try:
+            async with self._lock.write():
                 if request.upgrade:
                     click.echo("Start system upgrade")
-                    out, err, retcode = self._pkg_manager.upgrade()
+                    out, err, retcode = await self._call(self._pkg_manager.upgrade)
                 else:
                     click.echo("Start system update")
-                    out, err, retcode = self._pkg_manager.update()
+                    out, err, retcode = await self._call(self._pkg_manager.update)
                 self._cached_list_softwares.clear()
                 click.echo(f"Output: {out}\nErr: {err}\nRetcode: {retcode}")
-            finally:
-                self._lock.release()
             return tinygetlib.SysUpdateResp(retcode=retcode, stdout=out, stderr=err)
 
+        async def SysUpdateStream(self, request: tinygetlib.SysUpdateRequest, context):
+            """Tinyget system update, the output and progress streamed
+
+            Args:
+                request (tinygetlib.SysUpdateRequest): gRPC sys update request
+                context: gRPC context
+
+            Returns:
+                List[tinygetlib.SysUpdateResp]: the output chunks and progress, the
+                    retcode last
+            """
+            if request.upgrade:
+                click.echo("Start system upgrade")
+                operation = self._pkg_manager.upgrade
+            else:
+                click.echo("Start system update")
+                operation = self._pkg_manager.update
+            async for kind, value in self._stream_call(operation):
+                yield output_message(tinygetlib.SysUpdateResp, kind, value)
+
+        async def SysUpdateBidiStream(self, request_iterator, context):
+            """Tinyget system update of each request in turn, see SysUpdateStream
+
+            Args:
+                request_iterator (AsyncIterator[tinygetlib.SysUpdateRequest]): gRPC
+                    sys update requests
+                context: gRPC context
+
+            Returns:
+                List[tinygetlib.SysUpdateResp]: the output chunks and progress of each
+                    request, its retcode last
+            """
+            async for request in request_iterator:
+                async for resp in self.SysUpdateStream(request, context):
+                    yield resp
+
         async def SysHistory(self, request: tinygetlib.SysHistoryRequest, context):
             """Tinyget system history get
 
@@ -199,29 +905,17 @@ class TinygetServer:
             Returns:
                 List[tinygetlib.SysHistoryResp]: list of gRPC sys history response
             """
-            await self._lock.acquire()
-            try:
+            async with self._lock.read():
                 click.echo("Get system pkg manage histories")
-                histories = self._pkg_manager.history()
+                histories = await self._call(self._pkg_manager.history)
                 click.echo(f"Collected {len(histories)} histories")
-            finally:
-                self._lock.release()
-            hists = []
-            for his in histories:
-                hists.append(
-                    tinygetlib.History(
-                        id=his.id,
-                        command=his.command,
-                        date=str(his.date),
-                        operations=his.operations,
-                    )
-                )
+            hists = [history_message(his) for his in histories]
             return tinygetlib.SysHistoryResp(histories=hists)
 
         async def SysHistoryStream(
             self, request: tinygetlib.SysHistoryRequest, context
         ):
-            """Tinyget system history get in stream
+            """Tinyget system history get in stream, sent while the history is read
 
             Args:
                 request (tinygetlib.SysHistoryRequest): gRPC sys history request
@@ -230,41 +924,103 @@ class TinygetServer:
             Returns:
                 List[tinygetlib.SysHistoryResp]: list of gRPC sys history response
             """
-            await self._lock.acquire()
+            progress: ScanProgress[History] = ScanProgress()
+
+            async def read() -> List[History]:
+                async with self._lock.read():
+                    click.echo("Get system pkg manage histories")
+                    await self._call(
+                        hand_over,
+                        asyncio.get_running_loop(),
+                        self._pkg_manager.iter_history(),
+                        progress.extend,
+                    )
+                    click.echo(f"Collected {len(progress.items)} histories")
+                return progress.items
+
+            scan = asyncio.ensure_future(read())
             try:
-                click.echo("Get system pkg manage histories")
-                histories = self._pkg_manager.history()
-                click.echo(f"Collected {len(histories)} histories")
+                async for histories in progress.follow(scan):
+                    for his in histories:
+                        yield history_message(his)
             finally:
-                self._lock.release()
-            for his in histories:
-                yield tinygetlib.History(
-                    id=his.id,
-                    command=his.command,
-                    date=str(his.date),
-                    operations=his.operations,
-                )
+                # only this client reads it
+                if not scan.done():
+                    scan.cancel()
+                    await asyncio.wait([scan])
+
+        async def SysHistoryBidiStream(self, request_iterator, context):
+            """Tinyget system history get of each request in turn, see SysHistoryStream
+
+            Args:
+                request_iterator (AsyncIterator[tinygetlib.SysHistoryRequest]): gRPC
+                    sys history requests
+                context: gRPC context
+
+            Returns:
+                List[tinygetlib.History]: the histories of the requests, in order
+            """
+            async for request in request_iterator:
+                async for his in self.SysHistoryStream(request, context):
+                    yield his
 
     def __init__(
         self,
         port: Optional[int] = 5051,
         address: Optional[str] = "[::]",
+        socket_path: Optional[str] = None,
     ) -> None:
+        """
+        Args:
+            port (Optional[int]): TCP port. Defaults to 5051.
+            address (Optional[str]): TCP address. Defaults to all.
+            socket_path (Optional[str]): Listen on this Unix socket instead of TCP, as
+                the tinyget daemon does. Defaults to None.
+        """
         self._port = port
         self._address = address
+        self._socket_path = socket_path
+        self._server = None
+        self._service = None
 
     async def serve(self) -> None:
         """Start tinyget server"""
-        binding = f"{self._address}:{self._port}"
+        if self._socket_path is not None:
+            prepare_socket(self._socket_path)
+            binding = f"unix:{self._socket_path}"
+        else:
+            binding = f"{self._address}:{self._port}"
         server = grpc.aio.server(futures.ThreadPoolExecutor(max_workers=3))
         tinyget_service = self.TinygetService(self)
         tinygetgrpc.add_TinygetGRPCServicer_to_server(tinyget_service, server)
-        server.add_insecure_port(binding)
+        self._service = tinyget_service
+        if self._socket_path is not None:
+            # the socket is bound here: only the user running the daemon may talk
+            # to it, from its creation on
+            umask = os.umask(0o077)
+            try:
+                server.add_insecure_port(binding)
+            finally:
+                os.umask(umask)
+        else:
+            server.add_insecure_port(binding)
         await server.start()
+        self._server = server
         logger.info(f"Server started, listening on {binding}")
 
         try:
             await server.wait_for_termination()
-        except KeyboardInterrupt as e:
+        except (KeyboardInterrupt, asyncio.CancelledError) as e:
             logger.info("Server stop")
             await server.stop(5)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            tinyget_service._executor.shutdown(wait=False)
+            if self._socket_path is not None and os.path.exists(self._socket_path):
+                os.remove(self._socket_path)
+
+    async def stop(self, grace: Optional[float] = None) -> None:
+        """Stop tinyget server started by serve"""
+        if self._server is not None:
+            await self._server.stop(grace)
@@ -1,13 +1,17 @@
 from .process import execute_command as _execute_command
+from .process import CancelScope, CommandStream, OutputScope
 from .process import just_execute
+from .queries import is_quiet, run_queries
 from .ai_helper import (
     AIHelper,
     AIHelperHostError,
     AIHelperKeyError,
+    get_advice,
+    print_advice,
     try_to_get_ai_helper,
 )
 from typing import Optional, Union, List
-from ..common_utils import logger
+from ..common_utils import get_max_output_size, logger
 from tinyget.globals import global_configs
 
 
@@ -16,10 +20,28 @@ def execute_command(
     envp: dict = {},
     timeout: Optional[float] = None,
     cwd: Optional[str] = None,
+    bounded: bool = False,
 ):
     logger.debug(f"Execute command: {args}. Env params: {envp}")
-    live_output = global_configs["live_output"]
+    live_output = global_configs["live_output"] and not is_quiet()
+    # Only the output of commands which are not parsed can be truncated
+    max_output_size = get_max_output_size() if bounded else None
     result = _execute_command(
-        args, envp, timeout, cwd, realtime_output=bool(live_output)
+        args,
+        envp,
+        timeout,
+        cwd,
+        realtime_output=bool(live_output),
+        max_output_size=max_output_size,
     )
     return result
+
+
+def stream_command(
+    args: Union[List[str], str],
+    envp: dict = {},
+    cwd: Optional[str] = None,
+) -> CommandStream:
+    logger.debug(f"Stream command: {args}. Env params: {envp}")
+    live_output = global_configs["live_output"] and not is_quiet()
+    return CommandStream(args, envp, cwd, realtime_output=bool(live_output))
@@ -0,0 +1,286 @@
+"""
+Cache of the AI helper advice, keyed on the failed command and its error messages
+once versions, paths, timestamps and numbers are stripped: the same failure is
+answered at once, even offline
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional, Union
+from tinyget.cache import get_cache_dir
+from tinyget.common_utils import logger
+from tinyget.globals import (
+    DEFAULT_ADVICE_CACHE_SIZE,
+    DEFAULT_ADVICE_CACHE_TTL,
+    global_configs,
+)
+
+ADVICE_FILE = "advice.json"
+# bumped when the normalization changes, the advice cached before is dropped
+ADVICE_FORMAT_VERSION = 1
+
+# error lines of apt, dnf and pacman, the signature of a failure
+_error_line_regex = re.compile(
+    r"^\s*(?:E:|error|fatal|failed|\[Errno|Error:|Problem|Unable|cannot|could not)"
+    r"|\b(?:not found|no match|conflict|unable to|failed to|nothing provides)\b",
+    re.IGNORECASE,
+)
+# lines of the output kept when no error line is found
+SIGNATURE_TAIL = 5
+SIGNATURE_LINES = 20
+
+# replaced in order, the later patterns would match parts of the former ones
+_normalizations = [
+    (re.compile(r"\b[a-z][a-z0-9+.-]*://\S+", re.IGNORECASE), "<url>"),
+    (
+        re.compile(
+            r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2})?(?:\.\d+)?)?"
+            r"(?:Z|[+-]\d{2}:?\d{2})?"
+        ),
+        "<time>",
+    ),
+    (re.compile(r"\b\d{1,2}:\d{2}:\d{2}\b"), "<time>"),
+    (re.compile(r"(?<![\w.<>-])(?:~|\.{1,2})?/[^\s'\"(),:;]+"), "<path>"),
+    (re.compile(r"(?<![\w.])\d+:\d[\w.+~-]*"), "<version>"),
+    (re.compile(r"(?<![\w.])v?\d+(?:\.\d+)+[\w.+~-]*"), "<version>"),
+    (re.compile(r"\b[0-9a-f]{8,}\b", re.IGNORECASE), "<hex>"),
+    (re.compile(r"(?<![\w.])\d+\b"), "<n>"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def is_error_line(line: str) -> bool:
+    return _error_line_regex.search(line) is not None
+
+
+def normalize(text: str) -> str:
+    """
+    Strips the parts of a command or error message which change from a failure to
+    the next: URLs, timestamps, paths, versions, hashes and numbers.
+
+    Parameters:
+        text (str): The text.
+
+    Returns:
+        str: The normalized text.
+    """
+    for regex, replacement in _normalizations:
+        text = regex.sub(replacement, text)
+    return text.strip()
+
+
+def get_error_signature(stdout: Optional[str], stderr: Optional[str]) -> List[str]:
+    """
+    Gets the normalized error lines of a failed command, or its last lines when it
+    printed no error line.
+
+    Parameters:
+        stdout (str, optional): The stdout of the command.
+        stderr (str, optional): The stderr of the command.
+
+    Returns:
+        List[str]: The normalized lines, without duplicates.
+    """
+    lines = [
+        line
+        for output in (stderr, stdout)
+        for line in (output or "").splitlines()
+        if line.strip()
+    ]
+    errors = [line for line in lines if is_error_line(line)]
+    if not errors:
+        errors = lines[-SIGNATURE_TAIL:]
+    signature: Dict[str, None] = {}
+    for line in errors:
+        signature[normalize(line)] = None
+    return list(signature)[:SIGNATURE_LINES]
+
+
+def get_advice_key(
+    command: Union[List[str], str],
+    stdout: Optional[str] = None,
+    stderr: Optional[str] = None,
+) -> str:
+    """
+    Builds the key of the advice about a failed command.
+
+    Parameters:
+        command (Union[List[str], str]): The command.
+        stdout (str, optional): The stdout of the command.
+        stderr (str, optional): The stderr of the command.
+
+    Returns:
+        str: The sha256 of the normalized command and error signature.
+    """
+    if isinstance(command, list):
+        command = " ".join(command)
+    signature = [normalize(command), *get_error_signature(stdout, stderr)]
+    return hashlib.sha256("\n".join(signature).encode()).hexdigest()
+
+
+def is_advice_cache_enabled() -> bool:
+    return str(global_configs.get("advice_cache", True)).lower() not in (
+        "false",
+        "0",
+        "no",
+        "off",
+    )
+
+
+def get_advice_cache_size() -> int:
+    try:
+        size = int(global_configs.get("advice_cache_size", DEFAULT_ADVICE_CACHE_SIZE))
+    except (TypeError, ValueError):
+        return DEFAULT_ADVICE_CACHE_SIZE
+    return size if size > 0 else DEFAULT_ADVICE_CACHE_SIZE
+
+
+def get_advice_cache_ttl() -> float:
+    try:
+        ttl = float(global_configs.get("advice_cache_ttl", DEFAULT_ADVICE_CACHE_TTL))
+    except (TypeError, ValueError):
+        return DEFAULT_ADVICE_CACHE_TTL
+    return ttl if ttl > 0 else DEFAULT_ADVICE_CACHE_TTL
+
+
+def get_advice_path() -> str:
+    return os.path.join(get_cache_dir(), ADVICE_FILE)
+
+
+def load_advices() -> Dict[str, Any]:
+    """
+    Loads the advice cache.
+
+    Returns:
+        Dict[str, Any]: The advice by key (the advice, when it was stored and last
+            used) and the hit / miss counters. Empty if missing or broken.
+    """
+    empty = {"version": ADVICE_FORMAT_VERSION, "entries": {}, "hits": 0, "misses": 0}
+    try:
+        with open(get_advice_path(), "r") as f:
+            advices = json.load(f)
+    except (OSError, ValueError):
+        return empty
+    if (
+        not isinstance(advices, dict)
+        or advices.get("version") != ADVICE_FORMAT_VERSION
+        or not isinstance(advices.get("entries"), dict)
+    ):
+        return empty
+    return advices
+
+
+def store_advices(advices: Dict[str, Any]):
+    """
+    Stores the advice cache, expired and least recently used advice evicted first.
+    Failures are only logged.
+
+    Parameters:
+        advices (Dict[str, Any]): The advice cache, see load_advices.
+    """
+    now = time.time()
+    ttl = get_advice_cache_ttl()
+    entries = [
+        (key, entry)
+        for key, entry in advices["entries"].items()
+        if now - entry.get("created", 0) < ttl
+    ]
+    entries.sort(key=lambda item: item[1].get("used", 0), reverse=True)
+    advices["entries"] = dict(entries[: get_advice_cache_size()])
+    path = get_advice_path()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump(advices, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.debug(f"Can't write advice cache {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def lookup_advice(key: str) -> Optional[str]:
+    """
+    Gets the advice cached for a failure, counted as a hit or a miss.
+
+    Parameters:
+        key (str): The key, see get_advice_key.
+
+    Returns:
+        Optional[str]: The advice, None if not cached or expired.
+    """
+    advices = load_advices()
+    entry = advices["entries"].get(key)
+    now = time.time()
+    if entry is not None and now - entry.get("created", 0) < get_advice_cache_ttl():
+        entry["used"] = now
+        advices["hits"] = advices.get("hits", 0) + 1
+    else:
+        entry = None
+        advices["misses"] = advices.get("misses", 0) + 1
+    store_advices(advices)
+    logger.debug(
+        f"Advice cache {'hit' if entry is not None else 'miss'} {key[:12]}, "
+        f"{advices['hits']} hits / {advices['misses']} misses"
+    )
+    return entry["advice"] if entry is not None else None
+
+
+def store_advice(key: str, advice: str):
+    """
+    Caches the advice about a failure.
+
+    Parameters:
+        key (str): The key, see get_advice_key.
+        advice (str): The advice.
+    """
+    advices = load_advices()
+    now = time.time()
+    advices["entries"][key] = {"advice": advice, "created": now, "used": now}
+    store_advices(advices)
+
+
+def cache_advice(key: str, advice: Iterator[str]) -> Iterator[str]:
+    """
+    Caches the advice streamed once all of it arrived.
+
+    Parameters:
+        key (str): The key, see get_advice_key.
+        advice (Iterator[str]): The parts of the advice.
+
+    Yields:
+        str: The parts of the advice.
+    """
+    parts = []
+    for part in advice:
+        parts.append(part)
+        yield part
+    if parts:
+        store_advice(key, "".join(parts))
+
+
+def get_advice_stats() -> Dict[str, int]:
+    """
+    Gets the advice cache metrics.
+
+    Returns:
+        Dict[str, int]: The advice cached (`entries`), the `hits` and `misses`.
+    """
+    advices = load_advices()
+    return {
+        "entries": len(advices["entries"]),
+        "hits": int(advices.get("hits", 0)),
+        "misses": int(advices.get("misses", 0)),
+    }
+
+
+def clear_advices():
+    """Removes the advice cache, metrics included"""
+    try:
+        os.remove(get_advice_path())
+    except FileNotFoundError:
+        pass
@@ -1,10 +1,34 @@
+import hashlib
 import json
-import requests
-from typing import List, Dict, Any, Optional, Union
+import os
+import time
+from typing import Iterator, List, Dict, Any, Optional, Tuple, Union
 from urllib.parse import urljoin, urlparse
 
+from ..cache import get_cache_dir
+from .advice_cache import (
+    cache_advice,
+    get_advice_key,
+    is_advice_cache_enabled,
+    lookup_advice,
+)
+from .condense import condense_output, estimate_tokens
 from ..common_utils import get_configuration_with_environ, logger
-from ..globals import global_configs
+from ..globals import (
+    DEFAULT_AI_HEALTH_TTL,
+    DEFAULT_AI_PROMPT_BUDGET,
+    DEFAULT_AI_TIMEOUT,
+    global_configs,
+)
+
+# retries of the requests which failed to connect or were answered by these statuses,
+# waiting 0, 2 * AI_RETRY_BACKOFF, 4 * AI_RETRY_BACKOFF... seconds. Reads which timed
+# out are not retried: a hung endpoint costs one timeout
+AI_RETRIES = 3
+AI_RETRY_BACKOFF = 0.5
+AI_RETRY_STATUSES = (429, 500, 502, 503, 504)
+# connections kept alive to the API
+AI_POOL_SIZE = 4
 
 SYSTEM_PROMPT = """
 你是一个熟练的Linux专家，精通各类发行版中的包管理器，也能熟练运用各类软件包管理器的命令。
@@ -64,6 +88,80 @@ class AIHelperKeyError(Exception):
         self.response = response
 
 
+_session = None
+
+
+def get_size(text: Optional[str]) -> int:
+    return len(text.encode()) if text is not None else 0
+
+
+def get_prompt_budget() -> int:
+    """
+    Gets the tokens the prompt asking the AI helper may take (`ai_prompt_budget`), the
+    command output is condensed to fit.
+
+    Returns:
+        int: The budget.
+    """
+    try:
+        budget = int(global_configs.get("ai_prompt_budget", DEFAULT_AI_PROMPT_BUDGET))
+    except (TypeError, ValueError):
+        return DEFAULT_AI_PROMPT_BUDGET
+    return budget if budget > 0 else DEFAULT_AI_PROMPT_BUDGET
+
+
+def log_completion(
+    content: Dict[str, Any], received: int, usage: Optional[Dict] = None
+):
+    """
+    Logs the bytes and tokens of a completion.
+
+    Parameters:
+        content (Dict[str, Any]): The completion request.
+        received (int): The bytes of the answer.
+        usage (Dict, optional): The tokens counted by the API.
+    """
+    messages = "".join(m["content"] for m in content["messages"])
+    logger.debug(
+        f"AI completion: {len(json.dumps(content).encode())} bytes sent, about "
+        f"{estimate_tokens(messages)} prompt tokens, {received} bytes received"
+        + (f", usage {usage}" if usage else "")
+    )
+
+
+def get_session():
+    """
+    Gets the HTTP session shared by the AI helper requests, which keeps the connections
+    to the API alive and retries the failed requests (see AI_RETRIES).
+
+    Returns:
+        requests.Session: The session.
+    """
+    global _session
+    if _session is None:
+        # requests is only imported once the AI helper is called
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=AI_RETRIES,
+            read=0,
+            backoff_factor=AI_RETRY_BACKOFF,
+            status_forcelist=AI_RETRY_STATUSES,
+            allowed_methods=frozenset(["GET", "POST"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=AI_POOL_SIZE, max_retries=retry
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _session = session
+    return _session
+
+
 def do_completion(
     host: str,
     model: str,
@@ -71,6 +169,7 @@ def do_completion(
     temperature: float,
     messages: List[Dict[str, str]],
     max_tokens: int,
+    timeout: Optional[float] = None,
 ) -> Dict:
     """
     Perform completion using the OpenAI GPT-3 model.
@@ -82,6 +181,7 @@ def do_completion(
         temperature (float): The temperature parameter for controlling the randomness of the completion.
         messages (List[Dict[str, str]]): A list of messages containing user and assistant inputs.
         max_tokens (int): The maximum number of tokens in the completion response.
+        timeout (float, optional): Seconds to wait for the API. Defaults to no timeout.
 
     Returns:
         str: The completion response from the API.
@@ -100,11 +200,91 @@ def do_completion(
         "max_tokens": max_tokens,
         "temperature": temperature,
     }
-    response = requests.post(headers=headers, url=url, json=content)
+    response = get_session().post(
+        headers=headers, url=url, json=content, timeout=timeout
+    )
     res = json.loads(response.content.decode())
+    log_completion(content, len(response.content), res.get("usage"))
     return res
 
 
+def stream_completion(
+    host: str,
+    model: str,
+    api_key: str,
+    temperature: float,
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    timeout: Optional[float] = None,
+) -> Iterator[str]:
+    """
+    Perform completion as do_completion, the answer is streamed by the API as server-sent
+    events.
+
+    Args:
+        host (str): The host URL where the completion API is located.
+        model (str): The name or ID of the model to be used for completion.
+        api_key (str): The API key for authentication.
+        temperature (float): The temperature parameter for controlling the randomness of the completion.
+        messages (List[Dict[str, str]]): A list of messages containing user and assistant inputs.
+        max_tokens (int): The maximum number of tokens in the completion response.
+        timeout (float, optional): Seconds to wait for the API, between two events once
+            streaming. Defaults to no timeout.
+
+    Yields:
+        str: The parts of the answer, as they arrive.
+
+    Raises:
+        ModelException: If the API answered with an error.
+    """
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}",
+        "Accept": "text/event-stream",
+    }
+    url = urljoin(host, "v1/chat/completions")
+    content = {
+        "model": model,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "stream": True,
+    }
+    with get_session().post(
+        headers=headers, url=url, json=content, timeout=timeout, stream=True
+    ) as response:
+        content_type = response.headers.get("Content-Type", "")
+        if response.status_code != 200 or not content_type.startswith(
+            "text/event-stream"
+        ):
+            # not streamed, an error or an API without streaming
+            try:
+                res = json.loads(response.content.decode())
+                yield res["choices"][0]["message"]["content"]
+            except (ValueError, KeyError, IndexError, TypeError):
+                raise ModelException(
+                    "Model returned an unexpected response", model, response.text
+                )
+            return
+        received = 0
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                # keep-alive comments, event names
+                continue
+            data = line[len("data:") :].strip()
+            if data == "[DONE]":
+                log_completion(content, received)
+                return
+            try:
+                delta = json.loads(data)["choices"][0].get("delta", {})
+            except (ValueError, KeyError, IndexError, AttributeError):
+                logger.debug(f"Unknown completion event {data}")
+                continue
+            if delta.get("content"):
+                received += len(delta["content"].encode())
+                yield delta["content"]
+
+
 class AIHelper:
     def __init__(
         self,
@@ -112,6 +292,7 @@ class AIHelper:
         api_key: str,
         model: Optional[str] = None,
         max_tokens: int = 1024,
+        timeout: Optional[float] = None,
     ):
         """
         Initializes the class instance with the provided parameters.
@@ -121,6 +302,7 @@ class AIHelper:
             api_key (str): The API key for authentication.
             model (str, optional): The model to be used for processing. Defaults to None.
             max_tokens (int, optional): The maximum number of tokens to be generated. Defaults to 1024.
+            timeout (float, optional): Seconds to wait for each API request. Defaults to no timeout.
 
         Returns:
             None
@@ -132,6 +314,7 @@ class AIHelper:
         self.api_key = api_key
         self.model = model
         self.max_tokens = max_tokens
+        self.timeout = timeout
 
     def config(self) -> Dict[str, Any]:
         return {
@@ -151,7 +334,7 @@ class AIHelper:
             "Authorization": f"Bearer {self.api_key}",
         }
         url = urljoin(self.host, "v1/models")
-        response = requests.get(headers=headers, url=url)
+        response = get_session().get(headers=headers, url=url, timeout=self.timeout)
         res = json.loads(response.content.decode())["data"]
         return res
 
@@ -173,7 +356,7 @@ class AIHelper:
         }
         url = urljoin(self.host, "v1/models")
         try:
-            response = requests.get(headers=headers, url=url)
+            response = get_session().get(headers=headers, url=url, timeout=self.timeout)
         except Exception:
             raise AIHelperHostError("Invalid host", self.host)
         try:
@@ -206,6 +389,7 @@ class AIHelper:
             temperature=0.0,
             max_tokens=2,
             messages=messages,
+            timeout=self.timeout,
         )
         if "error" in result:
             return False
@@ -250,26 +434,56 @@ class AIHelper:
             temperature=0.0,
             max_tokens=self.max_tokens,
             messages=messages,
+            timeout=self.timeout,
         )
         answer = result["choices"][0]["message"]["content"]
         return answer
 
-    def fix_command(
+    def ask_stream(self, query: str) -> Iterator[str]:
+        """
+        Asks a question as ask does, the answer is streamed as it is generated.
+
+        Args:
+            query (str): The question or query to be asked.
+
+        Yields:
+            str: The parts of the answer, as they arrive.
+
+        Raises:
+            Exception: If no model name is specified before asking a question.
+        """
+        if self.model is None:
+            raise Exception("Please specify a model name before asking a question.")
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": query},
+        ]
+        yield from stream_completion(
+            host=self.host,
+            model=self.model,
+            api_key=self.api_key,
+            temperature=0.0,
+            max_tokens=self.max_tokens,
+            messages=messages,
+            timeout=self.timeout,
+        )
+
+    def get_fix_question(
         self,
         command: Union[List[str], str],
         stdout: Optional[str] = None,
         stderr: Optional[str] = None,
     ) -> str:
         """
-        Executes a command and returns the answer obtained from asking a question based on the command, stdout, and stderr.
+        Builds the question asked to fix a command from the command, stdout, and stderr.
 
         Parameters:
-            command (Union[List[str], str]): The command to be executed. It can be passed as a list of strings or as a single string.
+            command (Union[List[str], str]): The command which failed. It can be passed as a list of strings or as a single string.
             stdout (str): The standard output obtained from executing the command (default is None).
             stderr (str): The standard error obtained from executing the command (default is None).
 
         Returns:
-            str: The answer obtained from asking a question based on the command, stdout, and stderr.
+            str: The question.
         """
         if isinstance(command, list):
             command = " ".join(command)
@@ -280,6 +494,22 @@ class AIHelper:
         {command}
         ```"""
 
+        # the outputs share the tokens the prompt leaves, stderr first
+        budget = get_prompt_budget()
+        left = budget - estimate_tokens(SYSTEM_PROMPT + question)
+        condensed_stderr = condense_output(
+            stderr, left if stdout is None else left * 2 // 3
+        )
+        condensed_stdout = condense_output(
+            stdout, left - estimate_tokens(condensed_stderr or "")
+        )
+        logger.debug(
+            f"AI helper output condensed: stdout {get_size(stdout)} -> "
+            f"{get_size(condensed_stdout)} bytes, stderr {get_size(stderr)} -> "
+            f"{get_size(condensed_stderr)} bytes"
+        )
+        stdout, stderr = condensed_stdout, condensed_stderr
+
         if stdout is not None:
             question += f"""
             我得到的stdout是：
@@ -293,11 +523,213 @@ class AIHelper:
             ```
             {stderr}
             ```"""
-        answer = self.ask(question)
+        logger.debug(
+            f"AI helper prompt: about {estimate_tokens(SYSTEM_PROMPT + question)} "
+            f"tokens, budget {budget}"
+        )
+        return question
+
+    def fix_command(
+        self,
+        command: Union[List[str], str],
+        stdout: Optional[str] = None,
+        stderr: Optional[str] = None,
+    ) -> str:
+        """
+        Executes a command and returns the answer obtained from asking a question based on the command, stdout, and stderr.
+
+        Parameters:
+            command (Union[List[str], str]): The command to be executed. It can be passed as a list of strings or as a single string.
+            stdout (str): The standard output obtained from executing the command (default is None).
+            stderr (str): The standard error obtained from executing the command (default is None).
+
+        Returns:
+            str: The answer obtained from asking a question based on the command, stdout, and stderr.
+        """
+        answer = self.ask(self.get_fix_question(command, stdout, stderr))
         return answer
 
+    def fix_command_stream(
+        self,
+        command: Union[List[str], str],
+        stdout: Optional[str] = None,
+        stderr: Optional[str] = None,
+    ) -> Iterator[str]:
+        """
+        Asks how to fix a command as fix_command does, the answer is streamed.
+
+        Yields:
+            str: The parts of the answer, as they arrive.
+        """
+        return self.ask_stream(self.get_fix_question(command, stdout, stderr))
+
+
+def print_advice(console, advice: Iterator[str], status: str, title: str) -> str:
+    """
+    Prints the advice of the AI helper in a panel as it arrives, with a spinner until
+    its first part arrives.
+
+    Args:
+        console (rich.console.Console): The console.
+        advice (Iterator[str]): The parts of the advice, see AIHelper.fix_command_stream.
+        status (str): The text shown next to the spinner.
+        title (str): The title of the panel.
+
+    Returns:
+        str: The advice, as much of it as arrived if the AI helper failed.
+    """
+    from rich.live import Live
+    from rich.panel import Panel
+
+    answer = ""
+    try:
+        with console.status(f"[bold green] {status}", spinner="bouncingBar"):
+            answer = next(advice, "")
+        with Live(
+            Panel(answer, border_style="green", title=title), console=console
+        ) as live:
+            for part in advice:
+                answer += part
+                live.update(Panel(answer, border_style="green", title=title))
+    except Exception as e:
+        # a failed AI helper doesn't hide the error of the command
+        logger.warning(f"AI helper failed: {e}")
+    return answer
+
+
+HEALTH_FILE = "ai-health.json"
+
+# AI helpers of the process by configuration, None when not configured or unhealthy
+_helpers: Dict[Tuple, Optional[AIHelper]] = {}
 
-def try_to_get_ai_helper():
+
+def get_ai_timeout() -> float:
+    """
+    Gets the seconds to wait for each AI helper request, falls back to the default when
+    the configured value (`ai_timeout`) is not a positive number.
+
+    Returns:
+        float: The timeout.
+    """
+    try:
+        timeout = float(global_configs.get("ai_timeout", DEFAULT_AI_TIMEOUT))
+    except (TypeError, ValueError):
+        return DEFAULT_AI_TIMEOUT
+    return timeout if timeout > 0 else DEFAULT_AI_TIMEOUT
+
+
+def get_health_ttl() -> float:
+    """
+    Gets the seconds the health of an AI helper is trusted, see `ai_health_ttl`.
+
+    Returns:
+        float: The TTL, 0 checks the AI helper every time it is needed.
+    """
+    try:
+        return max(float(global_configs.get("ai_health_ttl", DEFAULT_AI_HEALTH_TTL)), 0)
+    except (TypeError, ValueError):
+        return DEFAULT_AI_HEALTH_TTL
+
+
+def get_health_key(ai_helper: AIHelper) -> str:
+    # the API key is not written to disk
+    config = (ai_helper.host, ai_helper.api_key, ai_helper.model)
+    return hashlib.sha256(repr(config).encode()).hexdigest()
+
+
+def load_health(ai_helper: AIHelper) -> Optional[bool]:
+    """
+    Loads the health of an AI helper checked by another tinyget process.
+
+    Parameters:
+        ai_helper (AIHelper): The AI helper.
+
+    Returns:
+        Optional[bool]: Whether it answered, None if not checked within the TTL.
+    """
+    try:
+        with open(os.path.join(get_cache_dir(), HEALTH_FILE), "r") as f:
+            health = json.load(f)[get_health_key(ai_helper)]
+        ok, checked = bool(health["ok"]), float(health["checked"])
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+    if not 0 <= time.time() - checked < get_health_ttl():
+        return None
+    return ok
+
+
+def store_health(ai_helper: AIHelper, ok: bool):
+    """
+    Stores the health of an AI helper, failures are only logged.
+
+    Parameters:
+        ai_helper (AIHelper): The AI helper.
+        ok (bool): Whether it answered.
+    """
+    path = os.path.join(get_cache_dir(), HEALTH_FILE)
+    try:
+        with open(path, "r") as f:
+            healths = json.load(f)
+        if not isinstance(healths, dict):
+            healths = {}
+    except (OSError, ValueError):
+        healths = {}
+    now = time.time()
+    ttl = get_health_ttl()
+    healths = {
+        k: v
+        for k, v in healths.items()
+        if isinstance(v, dict) and now - v.get("checked", 0) < ttl
+    }
+    healths[get_health_key(ai_helper)] = {"ok": ok, "checked": now}
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump(healths, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.debug(f"Can't write AI helper health {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def check_health(ai_helper: AIHelper) -> bool:
+    """
+    Checks the AI helper answers, unless another check within the TTL found out.
+
+    Parameters:
+        ai_helper (AIHelper): The AI helper.
+
+    Returns:
+        bool: Whether the AI helper can be asked.
+    """
+    ok = load_health(ai_helper)
+    if ok is not None:
+        logger.debug(f"AI helper health cached: {ok}")
+        return ok
+    start = time.perf_counter()
+    try:
+        ok = ai_helper.ok()
+    except Exception as e:
+        # a slow or broken endpoint never fails the package operation
+        logger.debug(f"AI helper check failed: {e}")
+        ok = False
+    logger.debug(
+        f"AI helper checked in {(time.perf_counter() - start) * 1000:.0f}ms: {ok}"
+    )
+    store_health(ai_helper, ok)
+    return ok
+
+
+def try_to_get_ai_helper() -> Optional[AIHelper]:
+    """
+    Gets the AI helper, built and checked the first time a command needs advice in the
+    process: importing tinyget never contacts the API.
+
+    Returns:
+        Optional[AIHelper]: The AI helper, None if not configured or not answering.
+    """
     configs = get_configuration_with_environ(
         path=global_configs.get("config_path"),  # type: ignore
         key_environ={
@@ -311,16 +743,49 @@ def try_to_get_ai_helper():
     if not all(val is not None for val in configs.values()):
         return None
 
+    key = tuple(configs.values())
+    if key in _helpers:
+        return _helpers[key]
     ai_helper = AIHelper(
         host=configs["host"],
         api_key=configs["api_key"],
         model=configs["model"],
         max_tokens=configs["max_tokens"],
+        timeout=get_ai_timeout(),
     )
-    if ai_helper.ok():
-        return ai_helper
-    else:
+    _helpers[key] = ai_helper if check_health(ai_helper) else None
+    return _helpers[key]
+
+
+def get_advice(
+    command: Union[List[str], str],
+    stdout: Optional[str] = None,
+    stderr: Optional[str] = None,
+) -> Optional[Iterator[str]]:
+    """
+    Gets the advice about a failed command: cached for the same failure (see
+    tinyget.interact.advice_cache), else asked to the AI helper and cached.
+
+    Parameters:
+        command (Union[List[str], str]): The command which failed.
+        stdout (str, optional): The stdout of the command.
+        stderr (str, optional): The stderr of the command.
+
+    Returns:
+        Optional[Iterator[str]]: The parts of the advice, None if not cached and the
+            AI helper is not configured or not answering.
+    """
+    key = None
+    if is_advice_cache_enabled():
+        key = get_advice_key(command, stdout, stderr)
+        advice = lookup_advice(key)
+        if advice is not None:
+            return iter([advice])
+    ai_helper = try_to_get_ai_helper()
+    if ai_helper is None:
         return None
+    stream = ai_helper.fix_command_stream(command, stdout, stderr)
+    return cache_advice(key, stream) if key is not None else stream
 
 
 if __name__ == "__main__":
@@ -1,3 +1,6 @@
+from typing import Optional
+
+
 class Buffer(object):
     def __init__(self):
         """
@@ -92,3 +95,67 @@ class Buffer(object):
         else:
             to_ret = self.data[:want]
             return to_ret
+
+
+class RingBuffer(object):
+    def __init__(self, capacity: Optional[int] = None):
+        """
+        Initializes a byte buffer keeping at most the last `capacity` bytes written.
+
+        Parameters:
+            capacity (int, optional): The maximum number of bytes kept. Defaults to
+                None, which keeps everything.
+        """
+        if capacity is not None and capacity <= 0:
+            raise ValueError("capacity must be a positive integer")
+        self.capacity = capacity
+        self.data = bytearray()
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        """
+        Returns the number of bytes currently kept.
+
+        :return: An integer representing the length of the object.
+        :rtype: int
+        """
+        return len(self.data)
+
+    def add(self, other: bytes):
+        """
+        Appends the given bytes, the oldest bytes are dropped once the capacity is
+        exceeded.
+
+        Parameters:
+            other (bytes): The data to be added to the buffer.
+
+        Returns:
+            None
+        """
+        self.data += other
+        if self.capacity is not None and len(self.data) > self.capacity:
+            overflow = len(self.data) - self.capacity
+            # deleting from the front of a bytearray only moves its start offset
+            del self.data[:overflow]
+            self.dropped += overflow
+
+    def get(self) -> bytes:
+        """
+        Retrieves the kept bytes.
+
+        Returns:
+            bytes: The last `capacity` bytes written to the buffer. Once bytes were
+                dropped, the kept tail starts at a line boundary (or at least at a
+                character boundary), never in the middle of a UTF-8 character or an
+                escape sequence left over from the dropped line.
+        """
+        start = 0
+        if self.dropped > 0:
+            newline = self.data.find(b"\n")
+            if 0 <= newline < len(self.data) - 1:
+                start = newline + 1
+            else:
+                # skip UTF-8 continuation bytes
+                while start < len(self.data) and self.data[start] & 0xC0 == 0x80:
+                    start += 1
+        return bytes(self.data[start:])
@@ -0,0 +1,144 @@
+"""
+Condensing of the command output sent to the AI helper: the error lines and their
+context, repeated lines once, within a token budget
+"""
+
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+from .advice_cache import is_error_line
+
+# lines kept before / after every error line
+CONTEXT_LINES = 2
+# last lines kept, the package managers end with a summary of the failure
+TAIL_LINES = 10
+SKIPPED_LINES = "[... {0} lines skipped ...]"
+REPEATED_LINE = "{0} [{1} similar lines]"
+
+# terminal escapes: colors, cursor moves
+_escape_regex = re.compile(r"\x1b\[[0-9;?]*[ -/]*[@-~]")
+_digits_regex = re.compile(r"\d+")
+
+# lines kept first, lower first
+PRIORITY_ERROR = 0
+PRIORITY_CONTEXT = 1
+PRIORITY_TAIL = 2
+PRIORITY_OTHER = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the tokens of a text: about 4 characters per token for ASCII, a token
+    per character for the others (CJK mostly, 3 bytes in UTF-8).
+
+    Parameters:
+        text (str): The text.
+
+    Returns:
+        int: The estimated tokens.
+    """
+    non_ascii = (len(text.encode("utf-8", "replace")) - len(text)) / 2
+    return math.ceil((len(text) - non_ascii) / 4 + non_ascii)
+
+
+def get_lines(text: str) -> List[Tuple[str, int]]:
+    """
+    Splits an output into lines as the terminal shows them: escapes dropped, only the
+    last state of the lines redrawn with carriage returns (progress bars), lines
+    only differing by their numbers once.
+
+    Parameters:
+        text (str): The output.
+
+    Returns:
+        List[Tuple[str, int]]: The lines and how many times each was printed.
+    """
+    lines: List[Tuple[str, int]] = []
+    seen: Dict[str, int] = {}
+    # not splitlines, a carriage return doesn't start a new line
+    for line in _escape_regex.sub("", text).split("\n"):
+        line = line.rstrip().rsplit("\r", 1)[-1]
+        if not line.strip():
+            continue
+        # the same line with other versions, sizes or counters is repeated too
+        key = _digits_regex.sub("0", line)
+        index = seen.get(key)
+        if index is not None:
+            lines[index] = (lines[index][0], lines[index][1] + 1)
+            continue
+        seen[key] = len(lines)
+        lines.append((line, 1))
+    return lines
+
+
+def condense_output(text: Optional[str], budget: int) -> Optional[str]:
+    """
+    Condenses an output to fit a token budget. The error lines are kept first, then
+    the lines around them, the last lines and the other ones. The lines skipped are
+    replaced by a marker.
+
+    Parameters:
+        text (str, optional): The output.
+        budget (int): The tokens the condensed output may take.
+
+    Returns:
+        Optional[str]: The condensed output, None if the output is None.
+    """
+    if text is None:
+        return None
+    if estimate_tokens(text) <= budget and "\x1b" not in text and "\r" not in text:
+        return text
+    lines = get_lines(text)
+    priorities = [PRIORITY_OTHER] * len(lines)
+    for i in range(max(len(lines) - TAIL_LINES, 0), len(lines)):
+        priorities[i] = PRIORITY_TAIL
+    for i, (line, _) in enumerate(lines):
+        if not is_error_line(line):
+            continue
+        for j in range(
+            max(i - CONTEXT_LINES, 0), min(i + CONTEXT_LINES + 1, len(lines))
+        ):
+            priorities[j] = min(priorities[j], PRIORITY_CONTEXT)
+        priorities[i] = PRIORITY_ERROR
+
+    rendered = [
+        REPEATED_LINE.format(line, count) if count > 1 else line
+        for line, count in lines
+    ]
+    added: List[int] = []
+    used = 0
+    # the last lines from the end, the ones closest to the failure kept first
+    order = sorted(
+        range(len(lines)),
+        key=lambda i: (priorities[i], -i if priorities[i] == PRIORITY_TAIL else i),
+    )
+    for i in order:
+        # the line and its newline
+        tokens = estimate_tokens(rendered[i]) + 1
+        if used + tokens > budget:
+            if priorities[i] == PRIORITY_ERROR:
+                # other error lines may be shorter
+                continue
+            break
+        added.append(i)
+        used += tokens
+    # the skipped lines markers take tokens too, the last lines added are dropped
+    while True:
+        condensed = render(rendered, sorted(added))
+        if estimate_tokens(condensed) <= budget or not added:
+            return condensed
+        added.pop()
+
+
+def render(lines: List[str], kept: List[int]) -> str:
+    """Joins the lines kept, the lines skipped replaced by a marker"""
+    condensed = []
+    previous = -1
+    for i in kept:
+        if i > previous + 1:
+            condensed.append(SKIPPED_LINES.format(i - previous - 1))
+        condensed.append(lines[i])
+        previous = i
+    if previous < len(lines) - 1:
+        condensed.append(SKIPPED_LINES.format(len(lines) - previous - 1))
+    return "\n".join(condensed)
@@ -1,63 +1,210 @@
+import codecs
+import errno
+import queue
 import re
 import termios
 import threading
-from typing import Callable, List, Optional, Union
-from tempfile import mktemp
+from typing import Any, Callable, Iterator, List, Optional, Set, Tuple, TypeVar, Union
 import click
 from tinyget.common_utils import logger
-from concurrent.futures import ThreadPoolExecutor
+from tinyget.interact.buffer import RingBuffer
 import subprocess
 import os
 import asyncio
 import sys
-import select
 
-# two workers: read_subprocess_output / read_input
-executor = ThreadPoolExecutor(max_workers=4)
+# read sizes of FdReader, grows up to MAX_READ_CHUNK_SIZE while the child is busy
+READ_CHUNK_SIZE = 1024
+MAX_READ_CHUNK_SIZE = 256 * 1024
+# seconds to keep reading after the child exited while its fds are still open
+DRAIN_TIMEOUT = 0.5
+# chunks of CommandStream waiting for the consumer
+STREAM_QUEUE_SIZE = 64
 
+T = TypeVar("T")
 
-def non_blocking_input(proc: subprocess.Popen, fd: Optional[int] = None):
-    while proc.poll() is None:
-        r, _, _ = select.select([sys.stdin if fd is None else fd], [], [], 0.1)
+# use regex to delete wrong escape sequences
+# https://stackoverflow.com/questions/15011478/ansi-questions-x1b25h-and-x1be
+ESCAPE_SEQUENCE_REGEX = re.compile(rb"\x1B\[[0-?]*[ -/]*[@-~]")
+# an escape sequence cut at the end of a chunk
+PARTIAL_ESCAPE_SEQUENCE_REGEX = re.compile(rb"\x1B(\[[0-?]*[ -/]*)?\Z")
 
-        if r:
-            k = sys.stdin.readline().strip()
-            return k
-    return ""
 
+def open_pty() -> Tuple[int, int]:
+    """
+    Opens a pseudo terminal for the child process to write its stdout to.
 
-async def read_subprocess_output(master_fd: int):
-    try:
-        return await asyncio.get_running_loop().run_in_executor(
-            executor=executor, func=lambda: os.read(master_fd, 1024).decode()
-        )
-    except Exception:
-        raise
+    Returns:
+        Tuple[int, int]: The (master_fd, slave_fd) pair.
+    """
+    master_fd, slave_fd = os.openpty()
+    attrs = termios.tcgetattr(slave_fd)
+    # disable auto translate breaklines (NL to CRNL or something else to match the current platform)
+    # https://stackoverflow.com/questions/1552749/difference-between-cr-lf-lf-and-cr-line-break-types
+    # NL stands for New Line, it's the abstraction of the new line character
+    # CR stands for Carriage Return
+    # LF stands for Line Feed
+    attrs[1] = attrs[1] & ~termios.ONLCR
+    termios.tcsetattr(slave_fd, termios.TCSANOW, attrs)
+    return master_fd, slave_fd
+
+
+class FdReader(object):
+    def __init__(
+        self,
+        fd: int,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+    ):
+        """
+        Reads a readable fd in batches sized to how busy the writer is.
 
+        The fd is switched to non-blocking mode, every call keeps reading until the
+        fd would block or the batch size is reached, so the 4 KiB a pty hands out per
+        read are batched up too. The batch size doubles every time a batch fills it
+        and halves when batches come back mostly empty: a chatty child is drained in
+        few large batches while a quiet one is delivered line by line.
 
-async def read_subprocess_err(errfd: int):
-    try:
-        return await asyncio.get_running_loop().run_in_executor(
-            executor=executor,
-            func=lambda: os.read(errfd, 1024).decode(),
-        )
-    except Exception:
-        raise
+        Parameters:
+            fd (int): The fd to read.
+            min_size (int, optional): The smallest batch size. Defaults to READ_CHUNK_SIZE.
+            max_size (int, optional): The largest batch size. Defaults to MAX_READ_CHUNK_SIZE.
+        """
+        self.fd = fd
+        self.min_size = READ_CHUNK_SIZE if min_size is None else min_size
+        self.max_size = MAX_READ_CHUNK_SIZE if max_size is None else max_size
+        self.size = self.min_size
+        os.set_blocking(fd, False)
+
+    def read(self) -> bytes:
+        """
+        Reads what is currently available from the fd, up to the batch size.
+
+        Returns:
+            bytes: The data read, empty bytes means EOF.
+        """
+        batch = bytearray()
+        while len(batch) < self.size:
+            try:
+                data = os.read(self.fd, self.size - len(batch))
+            except BlockingIOError:
+                break
+            except OSError as e:
+                # Reading a pty master whose slave ends are all closed raises EIO,
+                # the next call reports the EOF
+                if e.errno == errno.EIO:
+                    break
+                raise
+            if not data:
+                break
+            batch += data
+        if len(batch) >= self.size:
+            self.size = min(self.size * 2, self.max_size)
+        elif len(batch) < self.size // 4:
+            self.size = max(self.size // 2, self.min_size)
+        return bytes(batch)
+
+
+def watch_fd(
+    loop: asyncio.AbstractEventLoop, fd: int, sink: Callable[[bytes], None]
+) -> "asyncio.Future[None]":
+    """
+    Registers fd with the event loop, the sink is called with every chunk as soon as
+    it arrives.
 
+    Parameters:
+        loop (asyncio.AbstractEventLoop): The running event loop.
+        fd (int): The fd to watch.
+        sink (Callable[[bytes], None]): Consumer of the data read.
 
-async def read_input(proc: subprocess.Popen, master_fd: int):
-    while proc.poll() is None:
+    Returns:
+        asyncio.Future[None]: Resolved when fd reaches EOF.
+    """
+    done = loop.create_future()
+    reader = FdReader(fd)
+
+    def on_readable():
         try:
-            user_input = await asyncio.get_event_loop().run_in_executor(
-                executor=executor,
-                func=lambda: non_blocking_input(proc=proc),
-            )
+            data = reader.read()
+            if data:
+                sink(data)
+                return
         except Exception as e:
-            break
+            # Raising here would only reach the loop's exception handler
+            loop.remove_reader(fd)
+            done.set_exception(e)
+            return
+        loop.remove_reader(fd)
+        done.set_result(None)
+
+    loop.add_reader(fd, on_readable)
+    return done
+
+
+def wait_child(
+    loop: asyncio.AbstractEventLoop, proc: subprocess.Popen
+) -> "asyncio.Future[int]":
+    """
+    Waits for a child to exit in a thread of its own: a shared pool would queue the
+    wait behind the other long-running children.
+
+    Parameters:
+        loop (asyncio.AbstractEventLoop): The event loop to hand the return code to.
+        proc (subprocess.Popen): The child process.
+
+    Returns:
+        asyncio.Future[int]: The return code of the child.
+    """
+    exited: "asyncio.Future[int]" = loop.create_future()
+
+    def set_result(retcode: int):
+        if not exited.done():
+            exited.set_result(retcode)
+
+    def wait():
+        retcode = proc.wait()
         try:
-            os.write(master_fd, (user_input + "\n").encode())
-        except Exception as e:
-            break
+            loop.call_soon_threadsafe(set_result, retcode)
+        except RuntimeError:
+            # the loop gave up waiting and is closed
+            pass
+
+    threading.Thread(target=wait, name=f"wait-{proc.pid}", daemon=True).start()
+    return exited
+
+
+def forward_input(loop: asyncio.AbstractEventLoop, master_fd: int) -> Optional[int]:
+    """
+    Forwards user input from stdin to the child's pty, used to answer prompts.
+
+    Parameters:
+        loop (asyncio.AbstractEventLoop): The running event loop.
+        master_fd (int): The pty master the child reads its stdin from.
+
+    Returns:
+        Optional[int]: The stdin fd registered, None if stdin can't be watched
+            (closed, redirected from a regular file or /dev/null).
+    """
+    try:
+        stdin_fd = sys.stdin.fileno()
+    except Exception:
+        return None
+
+    def on_input():
+        try:
+            data = os.read(stdin_fd, READ_CHUNK_SIZE)
+            if data:
+                os.write(master_fd, data)
+                return
+        except OSError:
+            pass
+        loop.remove_reader(stdin_fd)
+
+    try:
+        loop.add_reader(stdin_fd, on_input)
+    except (OSError, ValueError):
+        return None
+    return stdin_fd
 
 
 class CommandExecutionError(Exception):
@@ -83,6 +230,88 @@ class CommandExecutionError(Exception):
         self.stderr = stderr
 
 
+# the CancelScope of the calls running in each thread
+_scopes = threading.local()
+
+
+class CancelScope(object):
+    def __init__(self):
+        """
+        Tracks the children spawned by a call to kill them when the call is cancelled,
+        as the gRPC service does when a client cancels its request. The call runs in
+        another thread, the package managers wrappers know nothing about it.
+        """
+        self.cancelled = False
+        self._procs: Set[subprocess.Popen] = set()
+        self._lock = threading.Lock()
+
+    def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Runs a call in the current thread, the children it spawns belong to the scope.
+        """
+        previous = getattr(_scopes, "scope", None)
+        _scopes.scope = self
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _scopes.scope = previous
+
+    def add(self, p: subprocess.Popen):
+        with self._lock:
+            self._procs = {proc for proc in self._procs if proc.poll() is None}
+            self._procs.add(p)
+            cancelled = self.cancelled
+        if cancelled:
+            self._terminate(p)
+
+    def cancel(self):
+        """
+        Terminates the children still running and the ones spawned from now on.
+        """
+        with self._lock:
+            self.cancelled = True
+            procs = list(self._procs)
+        for p in procs:
+            self._terminate(p)
+
+    def _terminate(self, p: subprocess.Popen):
+        # SIGTERM, the package managers release their locks before exiting
+        if p.poll() is None:
+            logger.debug(f"Cancelled, terminating {p.args}")
+            p.terminate()
+
+
+# the OutputScope of the calls running in each thread
+_outputs = threading.local()
+
+
+class OutputScope(object):
+    def __init__(self, on_output: Callable[[str, str], None]):
+        """
+        Gets the output of the commands a call runs while they write it, as the gRPC
+        service does to stream it to the GUI. The call runs in another thread, the
+        package managers wrappers know nothing about it.
+
+        Parameters:
+            on_output (Callable[[str, str], None]): Called from the thread reading the
+                command with "stdout" or "stderr" and each decoded chunk, stdout
+                without escape sequences. The reads wait while it blocks, and the
+                command on its writes once the pipes are full.
+        """
+        self.on_output = on_output
+
+    def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Runs a call in the current thread, the commands it executes are watched.
+        """
+        previous = getattr(_outputs, "scope", None)
+        _outputs.scope = self
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _outputs.scope = previous
+
+
 def spawn(
     args: Union[List[str], str],
     envp: dict = {},
@@ -110,7 +339,7 @@ def spawn(
     orig_envp = dict(os.environ)
     for k, v in envp.items():
         orig_envp[k] = v
-    return subprocess.Popen(
+    p = subprocess.Popen(
         args=args,
         stdout=subprocess.PIPE if stdoutfd is None else stdoutfd,
         stderr=subprocess.PIPE if stderrfd is None else stderrfd,
@@ -122,49 +351,304 @@ def spawn(
         shell=isinstance(args, str),
         text=text,
     )
+    scope: Optional[CancelScope] = getattr(_scopes, "scope", None)
+    if scope is not None:
+        scope.add(p)
+    return p
+
+
+def spawn_streamed(
+    args: Union[List[str], str],
+    envp: dict = {},
+    cwd: Optional[str] = None,
+    use_pty: bool = True,
+) -> Tuple[subprocess.Popen, int, int]:
+    """
+    Spawns a process whose output is read through the event loop.
+
+    Parameters:
+        args (Union[List[str], str]): The command to be executed.
+        envp (dict, optional): Additional environment variables. Defaults to {}.
+        cwd (str, optional): The working directory. Defaults to None.
+        use_pty (bool, optional): Connect stdout / stdin to a pty so the child behaves as
+            in a terminal (progress bars, prompts). Otherwise stdout is a pipe and stdin
+            is /dev/null. Defaults to True.
+
+    Returns:
+        Tuple[subprocess.Popen, int, int]: The child, the fd to read its stdout from and
+            the fd to read its stderr from. The caller closes both fds.
+    """
+    if use_pty:
+        out_read_fd, out_write_fd = open_pty()
+        stdinfd = out_write_fd
+    else:
+        out_read_fd, out_write_fd = os.pipe()
+        stdinfd = subprocess.DEVNULL
+    err_read_fd, err_write_fd = os.pipe()
+    try:
+        p = spawn(
+            args,
+            envp,
+            cwd,
+            text=True,
+            stdoutfd=out_write_fd,
+            stdinfd=stdinfd,
+            stderrfd=err_write_fd,
+        )
+    except Exception:
+        os.close(out_read_fd)
+        os.close(err_read_fd)
+        raise
+    finally:
+        # The child holds its own copies, close ours so EOF can be detected
+        os.close(out_write_fd)
+        os.close(err_write_fd)
+    return p, out_read_fd, err_read_fd
+
+
+class EscapeFilter(object):
+    def __init__(self):
+        """
+        Strips ANSI escape sequences from a byte stream as it arrives.
+
+        A sequence split between two chunks is held back until the rest of it arrives,
+        the text around it is released immediately.
+        """
+        self.pending = b""
+
+    def feed(self, data: bytes) -> bytes:
+        """
+        Filters the next chunk of the stream.
+
+        Parameters:
+            data (bytes): The chunk read from the child.
+
+        Returns:
+            bytes: The chunk without escape sequences, may be shorter than the input
+                when it ends in an incomplete sequence.
+        """
+        data = ESCAPE_SEQUENCE_REGEX.sub(b"", self.pending + data)
+        match = PARTIAL_ESCAPE_SEQUENCE_REGEX.search(data)
+        if match is None:
+            self.pending = b""
+            return data
+        self.pending = data[match.start() :]
+        return data[: match.start()]
+
+    def flush(self) -> bytes:
+        """
+        Releases what is held back at the end of the stream.
+
+        Returns:
+            bytes: The incomplete sequence, it was never terminated so is kept as text.
+        """
+        data = self.pending
+        self.pending = b""
+        return data
+
+
+class CommandStream(object):
+    def __init__(
+        self,
+        args: Union[List[str], str],
+        envp: dict = {},
+        cwd: Optional[str] = None,
+        realtime_output: bool = False,
+        max_output_size: Optional[int] = None,
+        queue_size: int = STREAM_QUEUE_SIZE,
+    ):
+        """
+        Runs a command and yields its stdout as clean text while the child writes it.
+
+        Iterating starts the command, each item is a decoded chunk of stdout with the
+        escape sequences removed. Once iteration finished, `returncode` and `stderr`
+        are available. The chunks go through a bounded queue: a consumer that falls
+        behind stops the reads and eventually blocks the child on its writes.
+
+        Parameters:
+            args (Union[List[str], str]): The command to be executed.
+            envp (dict, optional): Additional environment variables. Defaults to {}.
+            cwd (str, optional): The working directory. Defaults to None.
+            realtime_output (bool, optional): Run the child on a pty and echo its output to
+                the console too. Defaults to False.
+            max_output_size (int, optional): Only the last max_output_size bytes of stderr
+                are kept. Defaults to None, which keeps everything.
+            queue_size (int, optional): Chunks buffered for a slow consumer.
+        """
+        self.args = args
+        self.envp = envp
+        self.cwd = cwd
+        self.realtime_output = realtime_output
+        self.returncode: Optional[int] = None
+        self._err_buffer = RingBuffer(max_output_size)
+        self._queue: "queue.Queue[Tuple[str, Any]]" = queue.Queue(maxsize=queue_size)
+        self._closed = threading.Event()
+        self._proc: Optional[subprocess.Popen] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def stderr(self) -> str:
+        return self._err_buffer.get().decode(errors="replace")
+
+    def _put(self, kind: str, value: Any):
+        # Blocks the reads while the consumer is behind, gives up once closed
+        while not self._closed.is_set():
+            try:
+                self._queue.put((kind, value), timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _run(self, p: subprocess.Popen, out_fd: int, err_fd: int):
+        output_filter = EscapeFilter()
+        output_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        echo_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        err_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+        def on_output(data: bytes):
+            if self.realtime_output:
+                click.echo(echo_decoder.decode(data), nl=False)
+            text = output_decoder.decode(output_filter.feed(data))
+            if text:
+                self._put("out", text)
+
+        def on_error(data: bytes):
+            self._err_buffer.add(data)
+            if self.realtime_output:
+                click.echo(err_decoder.decode(data), nl=False)
+
+        try:
+            loop = asyncio.new_event_loop()
+            try:
+                retcode = loop.run_until_complete(
+                    async_execute_command(
+                        p,
+                        out_fd,
+                        err_fd,
+                        on_output,
+                        on_error,
+                        forward_stdin=self.realtime_output,
+                    )
+                )
+            finally:
+                loop.close()
+            text = output_decoder.decode(output_filter.flush(), final=True)
+            if text:
+                self._put("out", text)
+            self._put("exit", retcode)
+        except BaseException as e:
+            self._put("error", e)
+        finally:
+            os.close(out_fd)
+            os.close(err_fd)
+
+    def start(self):
+        """
+        Spawns the command, called by the first iteration.
+        """
+        if self._proc is not None:
+            return
+        p, out_fd, err_fd = spawn_streamed(
+            self.args, self.envp, self.cwd, use_pty=self.realtime_output
+        )
+        self._proc = p
+        self._thread = threading.Thread(
+            target=self._run, args=(p, out_fd, err_fd), daemon=True
+        )
+        self._thread.start()
+
+    def __iter__(self) -> Iterator[str]:
+        self.start()
+        try:
+            while True:
+                kind, value = self._queue.get()
+                if kind == "out":
+                    yield value
+                elif kind == "exit":
+                    self.returncode = value
+                    return
+                else:
+                    raise value
+        finally:
+            self.close()
+
+    def lines(self) -> Iterator[str]:
+        """
+        Yields stdout line by line (without the line breaks) while the child writes it.
+        """
+        pending = ""
+        for text in self:
+            pending += text
+            lines = pending.split("\n")
+            pending = lines.pop()
+            yield from lines
+        if pending:
+            yield pending
+
+    def close(self):
+        """
+        Stops the command if the consumer gave up before it finished.
+        """
+        self._closed.set()
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        if self.returncode is None and self._proc is not None:
+            self.returncode = self._proc.returncode
 
 
 async def async_execute_command(
     proc: subprocess.Popen,
     master_fd: int,
-    slave_fd: int,
     err_read_fd: int,
-    err_write_fd: int,
-    ret_values: List,
-):
-    output_list = []
-    err_list = []
-    read_task = asyncio.create_task(read_input(proc, master_fd))
-    while proc.poll() is None:
-        try:
-            disa = await asyncio.wait_for(read_subprocess_output(master_fd), timeout=1)
-        except Exception as e:
-            disa = None
-        try:
-            derr = await asyncio.wait_for(read_subprocess_err(err_read_fd), timeout=0.5)
-        except Exception as e:
-            derr = None
-        if disa:
-            output_list.append(disa)
-            click.echo(disa, nl=False)
-        if derr:
-            err_list.append(derr)
-            click.echo(derr, nl=False)
-
-    pstderr = "".join(err_list)
-    pretcode = proc.returncode
+    on_output: Callable[[bytes], None],
+    on_error: Callable[[bytes], None],
+    forward_stdin: bool = True,
+) -> int:
+    """
+    Multiplexes the child's pty and stderr pipe on the running event loop.
 
-    os.close(slave_fd)
-    os.close(master_fd)
-    os.close(err_write_fd)
-    os.close(err_read_fd)
+    Nothing polls: the loop only wakes up when one of the fds is readable, so every
+    chunk reaches its sink as soon as the child writes it.
 
-    proc.terminate()
-    read_task.cancel()
+    Parameters:
+        proc (subprocess.Popen): The child process.
+        master_fd (int): The pty master connected to the child's stdout / stdin.
+        err_read_fd (int): The read end of the child's stderr pipe.
+        on_output (Callable[[bytes], None]): Called with every stdout chunk.
+        on_error (Callable[[bytes], None]): Called with every stderr chunk.
+        forward_stdin (bool, optional): Forward user input to master_fd. Defaults to True,
+            disable it when master_fd is a pipe instead of a pty.
 
-    ret_values.append(output_list)
-    ret_values.append(pstderr)
-    ret_values.append(pretcode)
+    Returns:
+        int: The return code of the child.
+    """
+    loop = asyncio.get_running_loop()
+    stdin_fd = forward_input(loop, master_fd) if forward_stdin else None
+    streams = asyncio.gather(
+        watch_fd(loop, master_fd, on_output), watch_fd(loop, err_read_fd, on_error)
+    )
+    exited = wait_child(loop, proc)
+    try:
+        await asyncio.wait([streams, exited], return_when=asyncio.FIRST_COMPLETED)
+        if not streams.done():
+            # Child exited but something it spawned may still hold the pty / pipe,
+            # only drain what is left instead of waiting for EOF forever
+            try:
+                await asyncio.wait_for(asyncio.shield(streams), timeout=DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.debug("Output still open after the command exited, stop reading")
+        if streams.done():
+            # Surface read errors
+            streams.result()
+        return await exited
+    finally:
+        for fd in (master_fd, err_read_fd, stdin_fd):
+            if fd is not None:
+                loop.remove_reader(fd)
+        streams.cancel()
 
 
 def run_event_loop_in_thread(fn: Callable, *args, **kwargs):
@@ -188,6 +672,7 @@ def execute_command(
     timeout: Optional[float] = None,
     cwd: Optional[str] = None,
     realtime_output=False,
+    max_output_size: Optional[int] = None,
 ):
     """
     Execute a command and capture its stdout and stderr.
@@ -196,6 +681,8 @@ def execute_command(
         args (Union[List[str], str]): The command to be executed. It can be a list of arguments or a single string.
         envp (dict, optional): The environment variables to be passed to the command. Defaults to an empty dictionary.
         timeout (int, optional): The maximum number of seconds to wait for the command to complete. Defaults to None.
+        realtime_output (bool, optional): Stream the output to the console while capturing it. Defaults to False. Within an OutputScope, the output is streamed to it either way.
+        max_output_size (int, optional): With realtime or watched output, only the last max_output_size bytes of stdout and stderr are kept. Defaults to None, which keeps everything.
 
     Returns:
         Tuple[str, str]: A tuple containing the stdout and stderr of the executed command.
@@ -203,48 +690,88 @@ def execute_command(
     Raises:
         CommandExecutionError: If the command execution fails, an exception is raised with details about the command, environment variables, stdout, and stderr.
     """
-    if realtime_output:
-        master_fd, slave_fd = os.openpty()
-        attrs = termios.tcgetattr(slave_fd)
-        # disable auto translate breaklines (NL to CRNL or something else to match the current platform)
-        # https://stackoverflow.com/questions/1552749/difference-between-cr-lf-lf-and-cr-line-break-types
-        # NL stands for New Line, it's the abstraction of the new line character
-        # CR stands for Carriage Return
-        # LF stands for Line Feed
-        attrs[1] = attrs[1] & ~termios.ONLCR
-        termios.tcsetattr(slave_fd, termios.TCSANOW, attrs)
-        stderrf_str = mktemp()
-        logger.debug(f"stderr output file: {stderrf_str}")
-        stderr_fi = open(stderrf_str, "w+")
-        stderr_fd = stderr_fi.fileno()
-        stderr_read_fi = open(stderrf_str, "r")
-        stderr_read_fd = stderr_read_fi.fileno()
-        p = spawn(
-            args,
-            envp,
-            cwd,
-            text=True,
-            stdoutfd=slave_fd,
-            stdinfd=slave_fd,
-            stderrfd=stderr_fd,
+    # read in another thread, the scope of this one is passed on
+    output_scope: Optional[OutputScope] = getattr(_outputs, "scope", None)
+    if realtime_output or output_scope is not None:
+        # Fail on an invalid size before there is a child left unmonitored
+        output_buffer = RingBuffer(max_output_size)
+        err_buffer = RingBuffer(max_output_size)
+        # only a terminal answers the prompts of a watched command
+        p, master_fd, err_read_fd = spawn_streamed(
+            args, envp, cwd, use_pty=realtime_output
         )
+        output_filter = EscapeFilter()
+
+        # multi-byte characters may be split across reads
+        output_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        err_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        watched_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        watched_err_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+        def watch(kind: str, text: str):
+            if output_scope is not None and text:
+                output_scope.on_output(kind, text)
+
+        def on_output(data: bytes):
+            filtered = output_filter.feed(data)
+            output_buffer.add(filtered)
+            if realtime_output:
+                click.echo(output_decoder.decode(data), nl=False)
+            watch("stdout", watched_decoder.decode(filtered))
+
+        def on_error(data: bytes):
+            err_buffer.add(data)
+            if realtime_output:
+                click.echo(err_decoder.decode(data), nl=False)
+            watch("stderr", watched_err_decoder.decode(data))
+
         ret_values = []
-        run_event_loop_in_thread(
-            async_execute_command,
-            p,
-            master_fd,
-            slave_fd,
-            stderr_read_fd,
-            stderr_fd,
-            ret_values,
-        )
-        output_list = ret_values[0]
-        pstderr = ret_values[1]
-        pretcode = ret_values[2]
-        # use regex to delete wrong escape sequences
-        # https://stackoverflow.com/questions/15011478/ansi-questions-x1b25h-and-x1be
-        output_list = [re.sub(r"\x1B\[[0-?]*[ -/]*[@-~]", "", x) for x in output_list]
-        poutput = "".join(output_list)
+        errors = []
+
+        async def run():
+            # Exceptions would die with the event loop thread, hand them back
+            try:
+                ret_values.append(
+                    await async_execute_command(
+                        p,
+                        master_fd,
+                        err_read_fd,
+                        on_output,
+                        on_error,
+                        forward_stdin=realtime_output,
+                    )
+                )
+            except BaseException as e:
+                errors.append(e)
+
+        try:
+            run_event_loop_in_thread(run)
+        finally:
+            os.close(master_fd)
+            os.close(err_read_fd)
+        if len(ret_values) == 0:
+            p.kill()
+            p.wait()
+            if len(errors) > 0:
+                raise errors[0]
+            pretcode = p.returncode
+        else:
+            pretcode = ret_values[0]
+        rest = output_filter.flush()
+        output_buffer.add(rest)
+        if realtime_output:
+            click.echo(output_decoder.decode(b"", final=True), nl=False)
+            click.echo(err_decoder.decode(b"", final=True), nl=False)
+        watch("stdout", watched_decoder.decode(rest, final=True))
+        watch("stderr", watched_err_decoder.decode(b"", final=True))
+        if output_buffer.dropped or err_buffer.dropped:
+            logger.debug(
+                f"Output exceeded {max_output_size} bytes, dropped the first "
+                f"{output_buffer.dropped} bytes of stdout "
+                f"and {err_buffer.dropped} bytes of stderr"
+            )
+        poutput = output_buffer.get().decode(errors="replace")
+        pstderr = err_buffer.get().decode(errors="replace")
         return poutput, pstderr, pretcode
     else:
         p = spawn(args, envp, cwd)
@@ -0,0 +1,137 @@
+"""
+Progress of the installs, uninstalls and updates parsed from the package managers
+output while it is written: the downloads, the packages unpacked, configured and
+removed, the percentage done when the package manager tells
+"""
+
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+STAGE_DOWNLOAD = "download"
+STAGE_UNPACK = "unpack"
+STAGE_CONFIGURE = "configure"
+STAGE_REMOVE = "remove"
+# the whole operation, only a percentage
+STAGE_PROGRESS = "progress"
+
+# a line longer than this is only parsed from its end, binary output has no breaks
+MAX_LINE_LENGTH = 4096
+
+# apt / dpkg, the percentage only on a terminal
+_apt_regexes = [
+    # Get:1 http://deb.debian.org/debian bookworm/main amd64 vim amd64 2:9.0 [1.7 MB]
+    (STAGE_DOWNLOAD, re.compile(r"^Get:\d+\s+\S+\s+(?P<package>.+?)\s+\[[^\]]*\]$")),
+    (STAGE_UNPACK, re.compile(r"^Unpacking (?P<package>\S+)")),
+    (STAGE_CONFIGURE, re.compile(r"^Setting up (?P<package>\S+)")),
+    (STAGE_REMOVE, re.compile(r"^Removing (?P<package>\S+)")),
+    (STAGE_PROGRESS, re.compile(r"^Progress: \[\s*(?P<percent>\d+)%\]")),
+]
+# dnf, the steps counted at the end of the line
+_dnf_regexes = [
+    (
+        STAGE_DOWNLOAD,
+        re.compile(r"^\((?P<step>\d+)/(?P<steps>\d+)\): (?P<package>\S+)"),
+    ),
+    (
+        STAGE_UNPACK,
+        re.compile(
+            r"^\s*(?:Installing|Upgrading|Downgrading|Reinstalling)\s*: "
+            r"(?P<package>\S+)\s+(?P<step>\d+)/(?P<steps>\d+)$"
+        ),
+    ),
+    (
+        STAGE_CONFIGURE,
+        re.compile(
+            r"^\s*Verifying\s*: (?P<package>\S+)\s+(?P<step>\d+)/(?P<steps>\d+)$"
+        ),
+    ),
+    (
+        STAGE_REMOVE,
+        re.compile(
+            r"^\s*(?:Erasing|Removing)\s*: (?P<package>\S+)\s+"
+            r"(?P<step>\d+)/(?P<steps>\d+)$"
+        ),
+    ),
+]
+# pacman, the steps counted at the start of the line
+_pacman_regexes = [
+    (STAGE_DOWNLOAD, re.compile(r"^\s*(?P<package>\S+) downloading\.\.\.$")),
+    (
+        STAGE_UNPACK,
+        re.compile(
+            r"^\((?P<step>\d+)/(?P<steps>\d+)\) "
+            r"(?:installing|upgrading|downgrading|reinstalling) (?P<package>\S+)"
+        ),
+    ),
+    (
+        STAGE_REMOVE,
+        re.compile(r"^\((?P<step>\d+)/(?P<steps>\d+)\) removing (?P<package>\S+)"),
+    ),
+]
+_regexes = _apt_regexes + _dnf_regexes + _pacman_regexes
+
+
+@dataclass
+class ProgressEvent:
+    stage: str
+    package: str = ""
+    percent: Optional[int] = None
+
+
+def parse_progress(line: str) -> Optional[ProgressEvent]:
+    """
+    Parses a line of apt, dnf or pacman output.
+
+    Parameters:
+        line (str): The line, without escape sequences.
+
+    Returns:
+        Optional[ProgressEvent]: The step, None if the line tells nothing about the
+            progress.
+    """
+    for stage, regex in _regexes:
+        match = regex.search(line)
+        if match is None:
+            continue
+        groups = match.groupdict()
+        package = groups.get("package") or ""
+        if stage == STAGE_DOWNLOAD and package.count(" ") == 4:
+            # apt: the component, the architecture, the package, its architecture
+            # and version; the indexes downloaded by the updates are kept whole
+            package = package.split(" ")[2]
+        percent = None
+        if groups.get("percent") is not None:
+            percent = int(groups["percent"])
+        elif groups.get("steps") is not None and int(groups["steps"]) > 0:
+            percent = int(groups["step"]) * 100 // int(groups["steps"])
+        return ProgressEvent(stage=stage, package=package, percent=percent)
+    return None
+
+
+class ProgressParser:
+    """Parses the output chunks of a command as they come, see parse_progress"""
+
+    def __init__(self) -> None:
+        self._pending = ""
+
+    def feed(self, text: str) -> List[ProgressEvent]:
+        """
+        Parses the lines a chunk of output completes.
+
+        Parameters:
+            text (str): The chunk, the lines may be split across chunks.
+
+        Returns:
+            List[ProgressEvent]: The steps of the lines completed.
+        """
+        # the progress bars are redrawn with carriage returns
+        lines = (self._pending + text).replace("\r", "\n").split("\n")
+        self._pending = lines.pop()[-MAX_LINE_LENGTH:]
+        return [e for e in map(parse_progress, lines) if e is not None]
+
+    def flush(self) -> List[ProgressEvent]:
+        """Parses the last line, not followed by a line break"""
+        line, self._pending = self._pending, ""
+        event = parse_progress(line)
+        return [event] if event is not None else []
@@ -0,0 +1,65 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+from tinyget.common_utils import logger
+
+# queries are package manager processes, waiting for them holds no GIL
+QUERY_WORKERS = 4
+
+_local = threading.local()
+
+
+def is_quiet() -> bool:
+    """
+    Whether the current thread runs a query of run_queries, whose live output would
+    interleave with the other queries.
+
+    Returns:
+        bool: True in the workers of run_queries.
+    """
+    return getattr(_local, "quiet", False)
+
+
+def _run_query(name: str, query: Callable[[], Any]) -> Any:
+    _local.quiet = True
+    start = time.perf_counter()
+    try:
+        return query()
+    finally:
+        _local.quiet = False
+        logger.debug(f"Query {name} took {(time.perf_counter() - start) * 1000:.0f}ms")
+
+
+def run_queries(
+    queries: Dict[str, Callable[[], Any]], max_workers: int = QUERY_WORKERS
+) -> Dict[str, Any]:
+    """
+    Runs independent queries at the same time, the time taken is the one of the
+    slowest query instead of their sum.
+
+    The live output of the commands run by the queries is not shown, see is_quiet.
+
+    Parameters:
+        queries (Dict[str, Callable[[], Any]]): The queries keyed by their names, used
+            in the debug logs.
+        max_workers (int): The maximum number of queries running at the same time.
+
+    Returns:
+        Dict[str, Any]: The results keyed by the query names.
+
+    Raises:
+        Exception: The exception of the first failing query in the order of queries,
+            once all queries finished.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(queries)))) as pool:
+        futures = {
+            name: pool.submit(_run_query, name, query)
+            for name, query in queries.items()
+        }
+    results = {name: future.result() for name, future in futures.items()}
+    logger.debug(
+        f"Queries {', '.join(queries)} took {(time.perf_counter() - start) * 1000:.0f}ms"
+    )
+    return results
@@ -1,8 +1,7 @@
 #!/usr/bin/env python3
-from tinyget.gui.tinyget_server import TinygetServer
 from tinyget.interact.process import run_event_loop_in_thread
 from .wrappers import PackageManager
-from .interact import AIHelper, AIHelperHostError, AIHelperKeyError
+from .daemon import call_daemon, get_socket_path
 from .common_utils import (
     get_config_path,
     get_configuration,
@@ -10,13 +9,19 @@ from .common_utils import (
     setup_logger,
     logger,
 )
-from tinyget.globals import global_configs, DEFAULT_LIVE_OUTPUT
-from typing import List
-from trogon import tui
+from tinyget.globals import (
+    global_configs,
+    DEFAULT_LIVE_OUTPUT,
+    DEFAULT_MAX_OUTPUT_SIZE,
+    DEFAULT_BACKEND,
+    PACKAGE_BACKENDS,
+)
+from typing import List, Optional
+import asyncio
 import click
+import signal
 
 
-@tui(help="TinyGet Simple TUI")
 @click.group()
 @click.option(
     "--config-path",
@@ -29,6 +34,28 @@ import click
     default=DEFAULT_LIVE_OUTPUT,
     help="Real-time stream output",
 )
+@click.option(
+    "--max-output-size",
+    default=None,
+    type=click.IntRange(min=1),
+    help=f"Bytes of real-time output kept per stream for error reports, default is {DEFAULT_MAX_OUTPUT_SIZE}",
+)
+@click.option(
+    "--backend",
+    default=None,
+    type=click.Choice(PACKAGE_BACKENDS),
+    help=f"Read package lists from the package manager's output (cli) or its database files (native), default is {DEFAULT_BACKEND}",
+)
+@click.option(
+    "--cache/--no-cache",
+    default=None,
+    help="Reuse the package lists cached in ~/.cache/tinyget while the package manager's state is unchanged, enabled by default",
+)
+@click.option(
+    "--daemon/--no-daemon",
+    default=None,
+    help="Forward list, search and history to the tinyget daemon when it is running, enabled by default unless --backend or --cache is given",
+)
 @click.option("--host", default=None, help="OpenAI host.")
 @click.option("--api-key", default=None, help="OpenAI API key.")
 @click.option("--model", default=None, help="OpenAI model.")
@@ -37,6 +64,10 @@ def cli(
     config_path: str,
     debug: bool,
     live_output: bool,
+    max_output_size: int,
+    backend: str,
+    cache: bool,
+    daemon: bool,
     host: str,
     api_key: str,
     model: str,
@@ -49,6 +80,17 @@ def cli(
             global_configs[k] = v
     global_configs["live_output"] = live_output
     global_configs["config_path"] = config_path
+    if max_output_size is not None:
+        global_configs["max_output_size"] = max_output_size
+    if backend is not None:
+        global_configs["backend"] = backend
+    if cache is not None:
+        global_configs["cache"] = cache
+    if daemon is not None:
+        global_configs["daemon"] = daemon
+    elif backend is not None or cache is not None:
+        # the daemon reads the package lists with its own settings
+        global_configs["daemon"] = False
     if host is not None:
         global_configs["host"] = host
     if api_key is not None:
@@ -60,17 +102,64 @@ def cli(
     setup_logger(debug=debug)
 
 
+# grpc, textual and requests take longer to import than most commands take to run:
+# they are only imported by the commands using them
+
+
+@cli.command("tui", help="TinyGet Simple TUI")
+@click.pass_context
+def tui(ctx: click.Context):
+    from trogon import Trogon
+
+    Trogon(cli, command_name="tui", click_context=ctx).run()
+
+
 @cli.command("server", help="TinyGet Server for GUI")
 @click.option("--host", default="[::]", help="Set tinyget server host bindings.")
 @click.option("--port", default=5051, help="Set tinyget server port.")
 def server(host: str, port: int):
     logger.debug(f"Tinyget Server open in {host}:{port}")
+    from tinyget.gui.tinyget_server import TinygetServer
+
     global_configs["live_output"] = False
     server = TinygetServer(port=port, address=host)
     # start Tinyget Server
     run_event_loop_in_thread(server.serve)
 
 
+@cli.command(
+    "daemon",
+    help="Keep package lists warm on a Unix socket for other tinyget commands.",
+)
+@click.option(
+    "--socket",
+    "socket_path",
+    default=None,
+    help="Unix socket to listen on, default is $XDG_RUNTIME_DIR/tinyget.sock",
+)
+def daemon(socket_path: Optional[str]):
+    socket_path = socket_path or get_socket_path()
+    logger.debug(f"Tinyget daemon open in {socket_path}")
+    from tinyget.gui.tinyget_server import TinygetServer
+
+    global_configs["live_output"] = False
+    server = TinygetServer(socket_path=socket_path)
+
+    async def serve():
+        # served in the main thread, which gets the signals: SIGINT / SIGTERM stop
+        # the server, which removes its socket
+        task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, task.cancel)
+        try:
+            await server.serve()
+        except asyncio.CancelledError:
+            logger.info("Tinyget daemon stopped")
+
+    asyncio.run(serve())
+
+
 @cli.command("list", help="List packages.")
 @click.option(
     "--installed",
@@ -86,19 +175,54 @@ def server(host: str, port: int):
     default=False,
     help="Show only upgradable packages.",
 )
+@click.option("--arch", default=None, help="Show only packages of this architecture.")
+@click.option("--repo", default=None, help="Show only packages of this repository.")
 @click.option(
     "--count", "-C", is_flag=True, default=False, help="Show count of packages."
 )
-def list_packages(installed: bool, upgradable: bool, count: bool):
-    package_manager = PackageManager()
-    packages = package_manager.list_packages(
-        only_installed=installed, only_upgradable=upgradable
-    )
+def list_packages(
+    installed: bool,
+    upgradable: bool,
+    arch: Optional[str],
+    repo: Optional[str],
+    count: bool,
+):
     if count:
-        click.echo(f"{len(packages)} packages in total.")
-    else:
-        for package in packages:
-            click.echo(package)
+        # counted on the package table, no package is built or sent
+        total = call_daemon(
+            lambda daemon: daemon.count_packages(
+                only_installed=installed,
+                only_upgradable=upgradable,
+                architecture=arch,
+                repo=repo,
+            )
+        )
+        if total is None:
+            total = PackageManager().count_packages(
+                only_installed=installed,
+                only_upgradable=upgradable,
+                architecture=arch,
+                repo=repo,
+            )
+        click.echo(f"{total} packages in total.")
+        return
+    packages = call_daemon(
+        lambda daemon: daemon.list_packages(
+            only_installed=installed,
+            only_upgradable=upgradable,
+            architecture=arch,
+            repo=repo,
+        )
+    )
+    if packages is None:
+        packages = PackageManager().list_packages(
+            only_installed=installed,
+            only_upgradable=upgradable,
+            architecture=arch,
+            repo=repo,
+        )
+    for package in packages:
+        click.echo(package)
 
 
 @cli.command(help="Update the index of available packages.")
@@ -137,8 +261,10 @@ def uninstall(package_names: List[str]):
     "--count", "-C", is_flag=True, default=False, help="Show count of packages."
 )
 def search(package: str, count: bool):
-    package_manager = PackageManager()
-    packages = package_manager.search(package)
+    packages = call_daemon(lambda daemon: daemon.search(package))
+    if packages is None:
+        package_manager = PackageManager()
+        packages = package_manager.search(package)
     if count:
         click.echo(f"{len(packages)} packages in total.")
     else:
@@ -148,8 +274,10 @@ def search(package: str, count: bool):
 
 @cli.command("history", help="check history")
 def history():
-    package_manager = PackageManager()
-    histories = package_manager.history()
+    histories = call_daemon(lambda daemon: daemon.history())
+    if histories is None:
+        package_manager = PackageManager()
+        histories = package_manager.history()
     for his in histories:
         click.echo(his)
 
@@ -213,11 +341,26 @@ def repo_list():
 @click.option(
     "--repo-paths",
     "-R",
+    "repo_path",
     default=None,
     multiple=True,
     help="Specify third-party softwares repo paths, default will be softwares' repo/builtin dir. Can be specified multiple times",
 )
-def config(host: str, api_key: str, model: str, max_tokens: int, repo_path: List[str]):
+@click.option(
+    "--advice-cache/--no-advice-cache",
+    default=None,
+    help="Reuse the AI helper advice given for the same failure, even offline, enabled by default",
+)
+def config(
+    host: str,
+    api_key: str,
+    model: str,
+    max_tokens: int,
+    repo_path: List[str],
+    advice_cache: Optional[bool],
+):
+    from .interact.ai_helper import AIHelper, AIHelperHostError, AIHelperKeyError
+
     if all([v is not None for v in [host, api_key, model, max_tokens, repo_path]]):
         ai_helper = AIHelper(
             host=host, api_key=api_key, model=model, max_tokens=max_tokens
@@ -244,6 +387,8 @@ def config(host: str, api_key: str, model: str, max_tokens: int, repo_path: List
             )
         conf = ai_helper.config()
         conf["repo_path"] = repo_path
+        if advice_cache is not None:
+            conf["advice_cache"] = advice_cache
         set_configuration(path=global_configs["config_path"], conf=conf)  # type: ignore
     else:
         click.confirm(
@@ -254,4 +399,22 @@ def config(host: str, api_key: str, model: str, max_tokens: int, repo_path: List
         )
         conf = ai_helper.config()
         conf["repo_path"] = repo_path
+        if advice_cache is not None:
+            conf["advice_cache"] = advice_cache
         set_configuration(path=global_configs["config_path"], conf=conf)  # type: ignore
+
+
+@cli.command("advice", help="Show the AI helper advice cache metrics.")
+@click.option("--clear", is_flag=True, default=False, help="Remove the advice cached.")
+def advice(clear: bool):
+    from .interact.advice_cache import clear_advices, get_advice_stats
+
+    if clear:
+        clear_advices()
+    stats = get_advice_stats()
+    lookups = stats["hits"] + stats["misses"]
+    hit_rate = stats["hits"] / lookups * 100 if lookups else 0
+    click.echo(
+        f"{stats['entries']} advices cached, {stats['hits']} hits, "
+        f"{stats['misses']} misses ({hit_rate:.0f}% hit rate)."
+    )
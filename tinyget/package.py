@@ -1,9 +1,11 @@
-from dataclasses import dataclass, field
+import functools
+import re
+import sys
+from array import array
+from dataclasses import dataclass, field, fields
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
 from enum import Enum, unique
-from rich.table import Table
-from rich.console import Console
 
 
 @unique
@@ -34,6 +36,22 @@ class History:
         return f"{self.id} | {self.command} | {self.date} | {self.operations} |"
 
 
+def add_slots(cls: type) -> type:
+    """
+    Rebuilds a dataclass with `__slots__`, what `dataclass(slots=True)` does since
+    Python 3.10: no per-instance `__dict__`.
+    """
+    names = tuple(f.name for f in fields(cls))
+    cls_dict = dict(cls.__dict__)
+    cls_dict["__slots__"] = names
+    for name in names:
+        cls_dict.pop(name, None)
+    cls_dict.pop("__dict__", None)
+    cls_dict.pop("__weakref__", None)
+    return type(cls)(cls.__name__, cls.__bases__, cls_dict)
+
+
+@add_slots
 @dataclass
 class Package:
     package_type: ManagerType
@@ -62,6 +80,9 @@ class Package:
 
 
 def show_packages(packages: List[Package]):
+    from rich.console import Console
+    from rich.table import Table
+
     table = Table(show_header=True, header_style="bold magenta")
     table.add_column("package_type")
     table.add_column("package_name")
@@ -88,3 +109,285 @@ def show_packages(packages: List[Package]):
         )
     console = Console()
     console.print(table)
+
+
+FLAG_INSTALLED = 1
+FLAG_AUTOMATICALLY_INSTALLED = 2
+FLAG_UPGRADABLE = 4
+FLAG_AVAILABLE_VERSION = 8
+
+
+class PackageTable:
+    """
+    Packages of a package manager stored as parallel columns instead of one object
+    per package. The architectures and repository lists, shared by most packages, are
+    interned and stored as codes, the booleans as bit flags.
+
+    Rows are only turned into Package objects when read, filters work on the columns.
+    """
+
+    def __init__(self, manager: ManagerType):
+        self.manager = manager
+        self.names: List[str] = []
+        self.descriptions: List[str] = []
+        self.versions: List[str] = []
+        self.available_versions: List[str] = []
+        self.architectures = array("H")
+        self.repos = array("H")
+        self.flags = bytearray()
+        self.architecture_names: List[str] = []
+        self.repo_names: List[Tuple[str, ...]] = []
+        self._architecture_codes: Dict[str, int] = {}
+        self._repo_codes: Dict[Tuple[str, ...], int] = {}
+
+    @classmethod
+    def from_packages(
+        cls, manager: ManagerType, packages: Sequence[Package]
+    ) -> "PackageTable":
+        table = cls(manager)
+        for p in packages:
+            table.append(
+                p.package_name,
+                p.architecture,
+                p.description,
+                p.version,
+                p.available_version,
+                p.remain.get("repo", []),
+                installed=p.installed,
+                automatically_installed=p.automatically_installed,
+                upgradable=p.upgradable,
+            )
+        return table
+
+    def append(
+        self,
+        name: str,
+        architecture: str,
+        description: str,
+        version: str,
+        available_version: Optional[str],
+        repo: Sequence[str],
+        installed: bool,
+        automatically_installed: bool,
+        upgradable: bool,
+    ):
+        """Appends a package, see Package for the fields"""
+        self.append_row(
+            name,
+            architecture,
+            description,
+            version,
+            available_version or "",
+            tuple(repo),
+            (FLAG_INSTALLED if installed else 0)
+            | (FLAG_AUTOMATICALLY_INSTALLED if automatically_installed else 0)
+            | (FLAG_UPGRADABLE if upgradable else 0)
+            | (FLAG_AVAILABLE_VERSION if available_version is not None else 0),
+        )
+
+    def append_row(
+        self,
+        name: str,
+        architecture: str,
+        description: str,
+        version: str,
+        available_version: str,
+        repo: Tuple[str, ...],
+        flags: int,
+    ):
+        """Appends a package with its flags already packed, see FLAG_*"""
+        code = self._architecture_codes.get(architecture)
+        if code is None:
+            code = len(self.architecture_names)
+            self._architecture_codes[architecture] = code
+            self.architecture_names.append(sys.intern(architecture))
+        self.architectures.append(code)
+        code = self._repo_codes.get(repo)
+        if code is None:
+            code = len(self.repo_names)
+            self._repo_codes[repo] = code
+            self.repo_names.append(tuple(sys.intern(r) for r in repo))
+        self.repos.append(code)
+        self.names.append(name)
+        self.descriptions.append(description)
+        self.versions.append(version)
+        # most packages are up to date, share the version string
+        self.available_versions.append(
+            version if available_version == version else available_version
+        )
+        self.flags.append(flags)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, i: int) -> Package:
+        flags = self.flags[i]
+        return Package(
+            package_type=self.manager,
+            package_name=self.names[i],
+            architecture=self.architecture_names[self.architectures[i]],
+            description=self.descriptions[i],
+            version=self.versions[i],
+            installed=bool(flags & FLAG_INSTALLED),
+            automatically_installed=bool(flags & FLAG_AUTOMATICALLY_INSTALLED),
+            upgradable=bool(flags & FLAG_UPGRADABLE),
+            available_version=(
+                self.available_versions[i] if flags & FLAG_AVAILABLE_VERSION else None
+            ),
+            remain={"repo": list(self.repo_names[self.repos[i]])},
+        )
+
+    def __iter__(self) -> Iterator[Package]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_packages(self) -> List[Package]:
+        return list(self)
+
+    def mask(
+        self,
+        installed: Optional[bool] = None,
+        upgradable: Optional[bool] = None,
+        architecture: Optional[str] = None,
+        repo: Optional[str] = None,
+    ) -> bytes:
+        """
+        Computes which rows match the filters, a whole column at once: the flag
+        bytes are mapped to 0 / 1 by bytes.translate, the masks combined as big
+        integers, nothing runs per row in Python.
+
+        Parameters:
+            installed (bool, optional): Whether the packages are installed. Defaults to
+                any.
+            upgradable (bool, optional): Whether the packages are upgradable. Defaults
+                to any.
+            architecture (str, optional): The architecture. Defaults to any.
+            repo (str, optional): A repository holding the packages. Defaults to any.
+
+        Returns:
+            bytes: 1 for the matching rows, 0 otherwise.
+        """
+        masks = []
+        flag_mask = 0
+        flag_value = 0
+        if installed is not None:
+            flag_mask |= FLAG_INSTALLED
+            flag_value |= FLAG_INSTALLED if installed else 0
+        if upgradable is not None:
+            flag_mask |= FLAG_UPGRADABLE
+            flag_value |= FLAG_UPGRADABLE if upgradable else 0
+        if flag_mask != 0:
+            masks.append(self.flags.translate(_get_flag_table(flag_mask, flag_value)))
+        if architecture is not None:
+            code = self._architecture_codes.get(architecture)
+            masks.append(_code_mask(self.architectures, {code} - {None}))
+        if repo is not None:
+            codes = {i for i, repos in enumerate(self.repo_names) if repo in repos}
+            masks.append(_code_mask(self.repos, codes))
+        if not masks:
+            return b"\x01" * len(self)
+        return _and_masks(masks)
+
+    def count(self, **filters) -> int:
+        """Counts the rows matching the filters, see mask"""
+        if not filters or all(v is None for v in filters.values()):
+            return len(self)
+        return self.mask(**filters).count(1)
+
+    def select(self, **filters) -> List[int]:
+        """
+        Gets the rows matching the filters, without building the packages.
+
+        Parameters:
+            **filters: See mask.
+
+        Returns:
+            List[int]: The row numbers.
+        """
+        if not filters or all(v is None for v in filters.values()):
+            return list(range(len(self)))
+        return [m.start() for m in _set_bit_regex.finditer(self.mask(**filters))]
+
+    def take(self, rows: Sequence[int]) -> "PackageTable":
+        """
+        Builds the table of some rows, sharing the interned strings.
+
+        Parameters:
+            rows (Sequence[int]): The row numbers.
+
+        Returns:
+            PackageTable: The table of the rows, in the given order.
+        """
+        table = PackageTable(self.manager)
+        table.architecture_names = self.architecture_names
+        table.repo_names = self.repo_names
+        table._architecture_codes = self._architecture_codes
+        table._repo_codes = self._repo_codes
+        table.names = [self.names[i] for i in rows]
+        table.descriptions = [self.descriptions[i] for i in rows]
+        table.versions = [self.versions[i] for i in rows]
+        table.available_versions = [self.available_versions[i] for i in rows]
+        table.architectures = array("H", (self.architectures[i] for i in rows))
+        table.repos = array("H", (self.repos[i] for i in rows))
+        table.flags = bytearray(self.flags[i] for i in rows)
+        return table
+
+    def filter(self, **filters) -> "PackageTable":
+        """Builds the table of the rows matching the filters, see mask"""
+        return self.take(self.select(**filters))
+
+
+def package_matches(
+    package: Package,
+    installed: Optional[bool] = None,
+    upgradable: Optional[bool] = None,
+    architecture: Optional[str] = None,
+    repo: Optional[str] = None,
+) -> bool:
+    """Whether a package matches the filters of PackageTable.mask"""
+    return (
+        (installed is None or package.installed == installed)
+        and (upgradable is None or package.upgradable == upgradable)
+        and (architecture is None or package.architecture == architecture)
+        and (repo is None or repo in package.remain.get("repo", []))
+    )
+
+
+_set_bit_regex = re.compile(b"\x01")
+
+
+@functools.lru_cache(maxsize=None)
+def _get_flag_table(mask: int, value: int) -> bytes:
+    return bytes(1 if b & mask == value else 0 for b in range(256))
+
+
+@functools.lru_cache(maxsize=None)
+def _get_byte_table(value: int) -> bytes:
+    return bytes(1 if b == value else 0 for b in range(256))
+
+
+def _and_masks(masks: List[bytes]) -> bytes:
+    if len(masks) == 1:
+        return masks[0]
+    result = int.from_bytes(masks[0], "little")
+    for mask in masks[1:]:
+        result &= int.from_bytes(mask, "little")
+    return result.to_bytes(len(masks[0]), "little")
+
+
+def _code_mask(column: array, codes: Set[int]) -> bytes:
+    """
+    Computes which rows of an array("H") column hold one of the codes: the low and
+    high bytes are compared separately.
+    """
+    data = column.tobytes()
+    if sys.byteorder == "big":
+        high, low = data[0::2], data[1::2]
+    else:
+        low, high = data[0::2], data[1::2]
+    result = 0
+    for code in codes:
+        result |= int.from_bytes(
+            low.translate(_get_byte_table(code & 0xFF)), "little"
+        ) & int.from_bytes(high.translate(_get_byte_table(code >> 8)), "little")
+    return result.to_bytes(len(column), "little")
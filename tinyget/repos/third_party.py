@@ -4,17 +4,23 @@ Parse third-party softwares' configuration and provide information
 
 from abc import abstractmethod
 from collections import defaultdict
+import dataclasses
 import importlib
 import importlib.util
 import re
+import threading
+import time
 from enum import Enum, unique
-from typing import Callable, Dict, List, Optional, Tuple
-from tinyget.package import Package
-from tinyget.globals import global_configs
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type
+from tinyget.package import Package, PackageTable, FLAG_INSTALLED
+from tinyget.globals import (
+    DEFAULT_THIRD_PARTY_TIMEOUT,
+    DEFAULT_THIRD_PARTY_TTL,
+    global_configs,
+)
 from tinyget.common_utils import logger
 from rich.prompt import Prompt
 import os
-import requests
 
 ROLLING_SYSTEM = -1
 
@@ -154,6 +160,12 @@ class AllPkgInfo(str, Enum):
 
 
 class ThirdPartySofts:
+    """
+    A third party software. The packages are resolved concurrently, get_package runs
+    in its own thread and its result is cached until the installed versions of
+    PKG_NAME change.
+    """
+
     PKG_NAME = ""
 
     @abstractmethod
@@ -249,6 +261,8 @@ def get_os_version() -> Tuple[Optional[str], Optional[str], Optional[str]]:
 
 
 def download_file(url: str, output_file: str):
+    import requests
+
     logger.debug(f"Start download file from {url} to {output_file}")
     response = requests.get(url)
 
@@ -320,29 +334,157 @@ def get_pkg_url(softs: str = "") -> Optional[str]:
     return None
 
 
+def get_third_party_timeout() -> float:
+    try:
+        timeout = float(
+            global_configs.get("third_party_timeout", DEFAULT_THIRD_PARTY_TIMEOUT)
+        )
+    except (TypeError, ValueError):
+        return DEFAULT_THIRD_PARTY_TIMEOUT
+    return timeout if timeout > 0 else DEFAULT_THIRD_PARTY_TIMEOUT
+
+
+def get_third_party_softs() -> List[Type[ThirdPartySofts]]:
+    return ThirdPartySofts.__subclasses__()
+
+
+# packages resolved by the third party softwares: key -> (when, package)
+_resolved: Dict[Tuple[Any, ...], Tuple[float, Optional[Package]]] = {}
+_resolved_lock = threading.Lock()
+
+
+def get_installed_versions(
+    wrapper_softs: Optional[Sequence[Package]], name: str
+) -> Tuple[str, ...]:
+    """
+    Gets the installed versions of a package, what the third party softwares read
+    from the packages of the package manager.
+
+    Parameters:
+        wrapper_softs (Sequence[Package], optional): The packages of the package
+            manager.
+        name (str): The package name.
+
+    Returns:
+        Tuple[str, ...]: The installed versions.
+    """
+    if wrapper_softs is None:
+        return ()
+    if isinstance(wrapper_softs, PackageTable):
+        # the columns only, no package built
+        return tuple(
+            wrapper_softs.versions[i]
+            for i, n in enumerate(wrapper_softs.names)
+            if n == name and wrapper_softs.flags[i] & FLAG_INSTALLED
+        )
+    return tuple(
+        p.version for p in wrapper_softs if p.package_name == name and p.installed
+    )
+
+
+def resolve_package(
+    cls: Type[ThirdPartySofts],
+    wrapper_softs: Optional[Sequence[Package]],
+    key: Tuple[Any, ...],
+    results: Dict[Type[ThirdPartySofts], Optional[Package]],
+):
+    """
+    Gets the package of a third party software and caches it, run in a thread. A
+    failure is only logged, the other softwares are still listed.
+
+    Parameters:
+        cls (Type[ThirdPartySofts]): The third party software.
+        wrapper_softs (Sequence[Package], optional): The packages of the package
+            manager.
+        key (Tuple[Any, ...]): The cache key, see get_third_party_packages.
+        results (Dict[Type[ThirdPartySofts], Optional[Package]]): Where the package is
+            stored.
+    """
+    start = time.monotonic()
+    try:
+        pkg = cls().get_package(wrapper_softs=wrapper_softs)
+    except Exception as e:
+        logger.warning(f"Failed to get third party package {cls.PKG_NAME}: {e}")
+        return
+    logger.debug(
+        f"Third party package {cls.PKG_NAME} resolved in "
+        f"{(time.monotonic() - start) * 1000:.0f}ms"
+    )
+    with _resolved_lock:
+        _resolved[key] = (time.monotonic(), pkg)
+    results[cls] = pkg
+
+
+def get_resolved(key: Tuple[Any, ...]) -> Tuple[bool, Optional[Package]]:
+    """Gets a package cached by resolve_package: whether it is cached, the package"""
+    with _resolved_lock:
+        resolved = _resolved.get(key)
+    if resolved is None or time.monotonic() - resolved[0] >= DEFAULT_THIRD_PARTY_TTL:
+        return (False, None)
+    return (True, resolved[1])
+
+
 @import_libs
 def get_third_party_packages(
-    softs: str = "", wrapper_softs: Optional[List[Package]] = []
+    softs: str = "", wrapper_softs: Optional[Sequence[Package]] = []
 ) -> List[Package]:
+    """
+    Gets the packages of the third party softwares, resolved concurrently. A software
+    failing or taking more than the `third_party_timeout` setting is left out, its
+    package is cached once it arrives.
+
+    Parameters:
+        softs (str, optional): A regex the package names match. Defaults to all.
+        wrapper_softs (Sequence[Package], optional): The packages of the package
+            manager.
+
+    Returns:
+        List[Package]: The packages, in the order of the third party softwares.
+    """
+    clss = get_third_party_softs()
+    if softs != "":
+        search_regex = re.compile(softs)
+        clss = [cls for cls in clss if search_regex.search(cls.PKG_NAME)]
+    results: Dict[Type[ThirdPartySofts], Optional[Package]] = {}
+    threads = []
+    for cls in clss:
+        key = (
+            cls.__module__,
+            cls.__qualname__,
+            get_installed_versions(wrapper_softs, cls.PKG_NAME),
+        )
+        cached, pkg = get_resolved(key)
+        if cached:
+            results[cls] = pkg
+            continue
+        # daemon threads, a software never answering doesn't keep tinyget running
+        thread = threading.Thread(
+            target=resolve_package,
+            args=(cls, wrapper_softs, key, results),
+            name=f"tinyget-third-party-{cls.PKG_NAME}",
+            daemon=True,
+        )
+        thread.start()
+        threads.append((cls, thread))
+    # started together, one deadline is the timeout of every software
+    deadline = time.monotonic() + get_third_party_timeout()
+    for cls, thread in threads:
+        thread.join(max(deadline - time.monotonic(), 0))
+        if thread.is_alive():
+            logger.warning(
+                f"Third party package {cls.PKG_NAME} took more than "
+                f"{get_third_party_timeout()}s, skipped"
+            )
+
     package_list = []
-    clss = ThirdPartySofts.__subclasses__()
     for cls in clss:
-        in_repo = cls.__module__.split(":")[0]
-        instance = cls()
-        # find match softwares
-        if softs != "":
-            search_regex = re.compile(softs)
-            match = search_regex.search(cls.PKG_NAME)
-            if match:
-                pkg = instance.get_package(wrapper_softs=wrapper_softs)
-                if pkg is not None:
-                    pkg.remain["repo"] = [in_repo]
-                    package_list.append(pkg)
-        else:
-            pkg = instance.get_package(wrapper_softs=wrapper_softs)
-            if pkg is not None:
-                pkg.remain["repo"] = [in_repo]
-                package_list.append(pkg)
+        pkg = results.get(cls)
+        if pkg is None:
+            continue
+        # the cached package is shared, the callers get their own
+        pkg = dataclasses.replace(pkg, remain=dict(pkg.remain))
+        pkg.remain["repo"] = [cls.__module__.split(":")[0]]
+        package_list.append(pkg)
     return package_list
 
 
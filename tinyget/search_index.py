@@ -0,0 +1,570 @@
+"""
+Search index over the cached package lists, persisted next to them
+
+Trigrams of the package names (and descriptions for the package managers searching
+them) narrow a search down to the packages holding every literal part of the
+pattern, only those are matched against the pattern itself. An inverted index of the
+name and description words ranks the whole word matches.
+"""
+
+import fnmatch
+import os
+import re
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from tinyget.cache import (
+    cached_table,
+    get_index_path,
+    get_key_digest,
+    get_state_key,
+)
+from tinyget.common_utils import logger
+from tinyget.package import ManagerType, Package, PackageTable
+
+# bumped when the file layout changes
+INDEX_FORMAT_VERSION = 1
+INDEX_MAGIC = b"TGSI"
+# magic, format version, sha256 of the state key, package count, flags
+INDEX_HEADER = struct.Struct("<4sH32sII")
+# key bytes, key count, posting count of every map
+MAP_HEADER = struct.Struct("<III")
+KEY_SEPARATOR = "\x1f"
+
+FLAG_DESCRIPTIONS = 1
+
+TRIGRAM_SIZE = 3
+_token_regex = re.compile(r"[0-9a-z]+")
+
+# ranks of the matches, lower first
+RANK_EXACT = 0
+RANK_PREFIX = 1
+RANK_WORD = 2
+RANK_OTHER = 3
+
+# indexes already read by this process, keyed by package manager
+_loaded: Dict[str, Tuple[bytes, "SearchIndex"]] = {}
+
+
+def get_trigrams(text: str) -> Set[str]:
+    return {text[i : i + TRIGRAM_SIZE] for i in range(len(text) - TRIGRAM_SIZE + 1)}
+
+
+def get_tokens(text: str) -> Set[str]:
+    return set(_token_regex.findall(text))
+
+
+class PostingMap:
+    """
+    Keys mapped to the ascending ids of the packages holding them, all ids stored in
+    one array so that reading it from disk is a single copy.
+    """
+
+    def __init__(self, keys: List[str], offsets: array, postings: array):
+        self.keys = keys
+        self.offsets = offsets
+        self.postings = postings
+        self.positions = {key: i for i, key in enumerate(keys)}
+
+    @classmethod
+    def build(cls, keyed: Dict[str, List[int]]) -> "PostingMap":
+        # never in the package data, see cache.encode_packages
+        keys = sorted(key for key in keyed if KEY_SEPARATOR not in key)
+        offsets = array("I", [0])
+        postings = array("I")
+        for key in keys:
+            postings.extend(keyed[key])
+            offsets.append(len(postings))
+        return cls(keys, offsets, postings)
+
+    def get(self, key: str) -> array:
+        i = self.positions.get(key)
+        if i is None:
+            return array("I")
+        return self.postings[self.offsets[i] : self.offsets[i + 1]]
+
+    def intersect(self, keys: Iterable[str]) -> Set[int]:
+        """
+        Gets the ids of the packages holding every key.
+
+        Parameters:
+            keys (Iterable[str]): The keys, at least one.
+
+        Returns:
+            Set[int]: The package ids.
+        """
+        lists = sorted((self.get(key) for key in keys), key=len)
+        ids = set(lists[0])
+        for ids_ in lists[1:]:
+            if not ids:
+                break
+            ids.intersection_update(ids_)
+        return ids
+
+    def encode(self) -> bytes:
+        keys = KEY_SEPARATOR.join(self.keys).encode()
+        return b"".join(
+            [
+                MAP_HEADER.pack(len(keys), len(self.keys), len(self.postings)),
+                keys,
+                _array_bytes(self.offsets),
+                _array_bytes(self.postings),
+            ]
+        )
+
+    @classmethod
+    def decode(cls, data: memoryview, pos: int) -> Tuple["PostingMap", int]:
+        keys_size, key_count, posting_count = MAP_HEADER.unpack_from(data, pos)
+        pos += MAP_HEADER.size
+        keys = bytes(data[pos : pos + keys_size]).decode()
+        pos += keys_size
+        offsets, pos = _read_array(data, pos, key_count + 1)
+        postings, pos = _read_array(data, pos, posting_count)
+        return (
+            cls(keys.split(KEY_SEPARATOR) if key_count else [], offsets, postings),
+            pos,
+        )
+
+
+def _array_bytes(a: array) -> bytes:
+    # the files are little endian whatever the machine
+    if sys.byteorder == "big":
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def _read_array(data: memoryview, pos: int, count: int) -> Tuple[array, int]:
+    a = array("I")
+    end = pos + count * a.itemsize
+    if end > len(data):
+        raise ValueError("Truncated search index")
+    a.frombytes(data[pos:end])
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a, end
+
+
+class SearchIndex:
+    """
+    Trigram and word index of a package list, package ids are the positions in that
+    list.
+    """
+
+    def __init__(
+        self,
+        count: int,
+        names: PostingMap,
+        descriptions: Optional[PostingMap],
+        tokens: PostingMap,
+    ):
+        self.count = count
+        self.names = names
+        self.descriptions = descriptions
+        self.tokens = tokens
+
+    @classmethod
+    def build(cls, packages: Sequence[Package], descriptions: bool) -> "SearchIndex":
+        """
+        Builds the index of a package list.
+
+        Parameters:
+            packages (Sequence[Package]): The packages, a table is read from its
+                columns.
+            descriptions (bool): Also index the description trigrams, needed by the
+                searches matching the descriptions.
+
+        Returns:
+            SearchIndex: The index.
+        """
+        names: Dict[str, List[int]] = defaultdict(list)
+        texts: Dict[str, List[int]] = defaultdict(list)
+        tokens: Dict[str, List[int]] = defaultdict(list)
+        if isinstance(packages, PackageTable):
+            texts_of = zip(packages.names, packages.descriptions)
+        else:
+            texts_of = ((p.package_name, p.description) for p in packages)
+        for i, (name, description) in enumerate(texts_of):
+            name = name.lower()
+            description = description.lower()
+            for trigram in get_trigrams(name):
+                names[trigram].append(i)
+            if descriptions:
+                for trigram in get_trigrams(description):
+                    texts[trigram].append(i)
+            for token in get_tokens(name) | get_tokens(description):
+                tokens[token].append(i)
+        return cls(
+            len(packages),
+            PostingMap.build(names),
+            PostingMap.build(texts) if descriptions else None,
+            PostingMap.build(tokens),
+        )
+
+    def encode(self, key: Tuple) -> bytes:
+        maps = [self.names, self.tokens]
+        if self.descriptions is not None:
+            maps.append(self.descriptions)
+        return INDEX_HEADER.pack(
+            INDEX_MAGIC,
+            INDEX_FORMAT_VERSION,
+            get_key_digest(key),
+            self.count,
+            FLAG_DESCRIPTIONS if self.descriptions is not None else 0,
+        ) + b"".join(m.encode() for m in maps)
+
+    @classmethod
+    def decode(cls, data: bytes, key: Tuple) -> Optional["SearchIndex"]:
+        """
+        Decodes an index encoded by encode.
+
+        Parameters:
+            data (bytes): The encoded index.
+            key (Tuple): The state key of the package list, see cache.get_state_key.
+
+        Returns:
+            Optional[SearchIndex]: The index, None if built for another package list.
+
+        Raises:
+            ValueError: The data is broken.
+        """
+        if len(data) < INDEX_HEADER.size:
+            return None
+        magic, version, digest, count, flags = INDEX_HEADER.unpack_from(data)
+        if (
+            magic != INDEX_MAGIC
+            or version != INDEX_FORMAT_VERSION
+            or digest != get_key_digest(key)
+        ):
+            return None
+        view = memoryview(data)
+        names, pos = PostingMap.decode(view, INDEX_HEADER.size)
+        tokens, pos = PostingMap.decode(view, pos)
+        descriptions = None
+        if flags & FLAG_DESCRIPTIONS:
+            descriptions, pos = PostingMap.decode(view, pos)
+        return cls(count, names, descriptions, tokens)
+
+    def get_candidates(
+        self, literals: List[str], descriptions: bool
+    ) -> Optional[Set[int]]:
+        """
+        Gets the packages which may match a pattern.
+
+        Parameters:
+            literals (List[str]): The lowercase strings any match holds, see Query.
+            descriptions (bool): Whether the pattern also matches the descriptions.
+
+        Returns:
+            Optional[Set[int]]: The ids of the candidates, None if the literals are too
+                short to narrow the search down.
+        """
+        trigrams = set()
+        if any(KEY_SEPARATOR in literal for literal in literals):
+            return None
+        for literal in literals:
+            trigrams |= get_trigrams(literal)
+        if not trigrams:
+            return None
+        candidates = self.names.intersect(trigrams)
+        if descriptions and self.descriptions is not None:
+            candidates |= self.descriptions.intersect(trigrams)
+        return candidates
+
+
+@dataclass
+class Query:
+    """
+    A search pattern in the syntax of a package manager.
+
+    Attributes:
+        pattern (str): The pattern as given.
+        match (Callable[[Package], bool]): Whether a package matches the pattern.
+        literals (List[str]): Lowercase strings every match holds in its name (or in
+            its description if descriptions is set).
+        descriptions (bool): Whether the pattern also matches the descriptions.
+        term (str): The lowercase name ranked first.
+    """
+
+    pattern: str
+    match: Callable[[Package], bool]
+    literals: List[str] = field(default_factory=list)
+    descriptions: bool = False
+    term: str = ""
+
+
+def glob_query(pattern: str, with_arch: bool = False) -> Query:
+    """
+    Builds the query of a case sensitive glob pattern of package names, as
+    `apt list` and `dnf repoquery` take.
+
+    Parameters:
+        pattern (str): The glob pattern.
+        with_arch (bool): Also match `name.arch`, as dnf does.
+
+    Returns:
+        Query: The query.
+    """
+    regex = re.compile(fnmatch.translate(pattern))
+
+    def match(p: Package) -> bool:
+        return bool(
+            regex.match(p.package_name)
+            or (with_arch and regex.match(f"{p.package_name}.{p.architecture}"))
+        )
+
+    literals = [s.lower() for s in re.split(r"\*|\?|\[[^\]]*\]?", pattern)]
+    if with_arch:
+        # architectures have no dots: the part of a literal before its first dot
+        # is in the name, a literal without dots may be in the architecture unless
+        # it starts the pattern
+        literals = [
+            s.split(".")[0] if "." in s or i == 0 else ""
+            for i, s in enumerate(literals)
+        ]
+    literals = [s for s in literals if s != ""]
+    return Query(
+        pattern=pattern,
+        match=match,
+        literals=literals,
+        term=literals[0] if literals else "",
+    )
+
+
+def get_regex_literals(pattern: str) -> List[str]:
+    """
+    Gets the strings any match of a regex holds, conservatively: none for
+    alternations and groups.
+
+    Parameters:
+        pattern (str): The regex.
+
+    Returns:
+        List[str]: The literal runs, lowercase.
+    """
+    if any(c in pattern for c in "|()"):
+        return []
+    runs = []
+    run = ""
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c in "*?{":
+            # the quantified character may be missing
+            run = run[:-1]
+            if c == "{":
+                i = pattern.find("}", i)
+                if i < 0:
+                    return []
+        if c in "\\.^$[]*+?{":
+            runs.append(run)
+            run = ""
+            if c == "\\":
+                i += 1
+            elif c == "[":
+                i = pattern.find("]", i + 2)
+                if i < 0:
+                    return []
+        else:
+            run += c
+        i += 1
+    runs.append(run)
+    return [run.lower() for run in runs if run != ""]
+
+
+def regex_query(pattern: str) -> Query:
+    """
+    Builds the query of a case insensitive regex matching the package names or
+    descriptions, as `pacman -Ss` takes. Invalid regexes match literally.
+
+    Parameters:
+        pattern (str): The regex.
+
+    Returns:
+        Query: The query.
+    """
+    try:
+        regex = re.compile(pattern, re.IGNORECASE)
+        literals = get_regex_literals(pattern)
+    except re.error:
+        regex = re.compile(re.escape(pattern), re.IGNORECASE)
+        literals = [pattern.lower()]
+
+    def match(p: Package) -> bool:
+        return bool(regex.search(p.package_name) or regex.search(p.description))
+
+    return Query(
+        pattern=pattern,
+        match=match,
+        literals=literals,
+        descriptions=True,
+        term=literals[0] if literals else "",
+    )
+
+
+def load_index(manager: ManagerType, key: Tuple) -> Optional[SearchIndex]:
+    """
+    Loads the search index if it was built for the given package list.
+
+    Parameters:
+        manager (ManagerType): The package manager.
+        key (Tuple): The state key of the package list, see cache.get_state_key.
+
+    Returns:
+        Optional[SearchIndex]: The index, None if missing, stale or broken.
+    """
+    try:
+        with open(get_index_path(manager), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    try:
+        return SearchIndex.decode(data, key)
+    except (UnicodeDecodeError, ValueError, struct.error) as e:
+        logger.debug(f"Broken search index: {e}")
+        return None
+
+
+def store_index(manager: ManagerType, key: Tuple, index: SearchIndex):
+    """
+    Stores the search index, failures are only logged.
+
+    Parameters:
+        manager (ManagerType): The package manager.
+        key (Tuple): The state key of the package list, see cache.get_state_key.
+        index (SearchIndex): The index.
+    """
+    path = get_index_path(manager)
+    # the daemon may store from several threads
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(index.encode(key))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.debug(f"Can't write search index {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def get_index(
+    manager: ManagerType, key: Tuple, packages: Sequence[Package], descriptions: bool
+) -> SearchIndex:
+    """
+    Gets the search index of a package list, from memory, from disk or built.
+
+    Parameters:
+        manager (ManagerType): The package manager.
+        key (Tuple): The state key of the package list, see cache.get_state_key.
+        packages (Sequence[Package]): The package list.
+        descriptions (bool): Whether the index needs the description trigrams.
+
+    Returns:
+        SearchIndex: The index.
+    """
+    digest = get_key_digest(key)
+
+    def usable(index: Optional[SearchIndex]) -> bool:
+        return (
+            index is not None
+            and index.count == len(packages)
+            and (index.descriptions is not None or not descriptions)
+        )
+
+    loaded = _loaded.get(manager.name)
+    if loaded is not None and loaded[0] == digest and usable(loaded[1]):
+        return loaded[1]
+    start = time.perf_counter()
+    index = load_index(manager, key)
+    if not usable(index):
+        index = SearchIndex.build(packages, descriptions)
+        store_index(manager, key, index)
+        logger.debug(
+            f"Search index built, {len(packages)} packages in "
+            f"{(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+    else:
+        logger.debug(
+            f"Search index loaded in {(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+    _loaded[manager.name] = (digest, index)
+    return index
+
+
+def get_rank(package: Package, term: str, words: Set[int], i: int) -> int:
+    name = package.package_name.lower()
+    if term == "":
+        return RANK_OTHER
+    if name == term:
+        return RANK_EXACT
+    if name.startswith(term):
+        return RANK_PREFIX
+    if i in words:
+        return RANK_WORD
+    return RANK_OTHER
+
+
+def search_index(
+    index: SearchIndex, packages: Sequence[Package], query: Query
+) -> List[Package]:
+    """
+    Searches a package list with its index, only the candidates are read: a table
+    builds no other package.
+
+    Parameters:
+        index (SearchIndex): The index of the packages.
+        packages (Sequence[Package]): The packages.
+        query (Query): The query.
+
+    Returns:
+        List[Package]: The matching packages, exact name matches first, then the
+            names starting with the term, then the names or descriptions holding it
+            as a word, in the package list order otherwise.
+    """
+    candidates = index.get_candidates(query.literals, query.descriptions)
+    ids = range(len(packages)) if candidates is None else sorted(candidates)
+    matches = []
+    for i in ids:
+        package = packages[i]
+        if query.match(package):
+            matches.append((i, package))
+    words = set(index.tokens.get(query.term)) if query.term != "" else set()
+    matches.sort(key=lambda m: get_rank(m[1], query.term, words, m[0]))
+    return [package for _, package in matches]
+
+
+def search_packages(
+    manager: ManagerType,
+    backend: str,
+    load: Callable[[], List[Package]],
+    query: Query,
+) -> List[Package]:
+    """
+    Searches the cached package table, see cache.cached_table, only the matching
+    packages are built.
+
+    Parameters:
+        manager (ManagerType): The package manager.
+        backend (str): The backend `load` uses.
+        load (Callable[[], List[Package]]): Builds the list of all packages.
+        query (Query): The query.
+
+    Returns:
+        List[Package]: The matching packages, see search_index.
+    """
+    key = get_state_key(manager, backend)
+    table = cached_table(manager, backend, load, key)
+    index = get_index(manager, key, table, query.descriptions)
+    start = time.perf_counter()
+    result = search_index(index, table, query)
+    logger.debug(
+        f"Search {query.pattern!r} matched {len(result)} packages in "
+        f"{(time.perf_counter() - start) * 1000:.1f}ms"
+    )
+    return result
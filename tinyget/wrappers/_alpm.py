@@ -0,0 +1,269 @@
+"""
+Read the pacman local and sync databases directly instead of running pacman
+"""
+
+import bz2
+import gzip
+import lzma
+import os
+import re
+import tarfile
+from typing import Dict, IO, Iterator, List, Optional, Tuple
+from tinyget.common_utils import logger
+from tinyget.package import ManagerType, Package
+from ._vercmp import vercmp
+
+PACMAN_DB_PATH = "/var/lib/pacman"
+PACMAN_CONF = "/etc/pacman.conf"
+
+TAR_BLOCK_SIZE = 512
+TAR_EMPTY_BLOCK = b"\0" * TAR_BLOCK_SIZE
+
+# %REASON% of packages installed as a dependency of another package
+REASON_DEPEND = "1"
+
+
+def parse_desc(content: str) -> Dict[str, List[str]]:
+    """
+    Parses a `desc` file of the pacman databases, made of `%FIELD%` headers each
+    followed by its values, one per line, and a blank line.
+
+    Parameters:
+        content (str): The content of the file.
+
+    Returns:
+        Dict[str, List[str]]: The values keyed by the field names, e.g. `NAME`.
+    """
+    fields: Dict[str, List[str]] = {}
+    for block in content.split("\n\n"):
+        lines = block.strip("\n").split("\n")
+        header = lines[0]
+        if len(header) > 2 and header[0] == "%" and header[-1] == "%":
+            fields[header[1:-1]] = lines[1:]
+    return fields
+
+
+def iter_local_db(db_path: str = PACMAN_DB_PATH) -> Iterator[Dict[str, List[str]]]:
+    """
+    Yields the installed packages, read from `local/<name>-<version>/desc`.
+
+    Parameters:
+        db_path (str): The pacman database directory.
+
+    Yields:
+        Dict[str, List[str]]: The fields of every desc file.
+    """
+    local = os.path.join(db_path, "local")
+    with os.scandir(local) as entries:
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            try:
+                with open(os.path.join(entry.path, "desc"), "r") as f:
+                    yield parse_desc(f.read())
+            except FileNotFoundError:
+                # removed while being listed
+                continue
+
+
+def open_sync_db(path: str) -> IO[bytes]:
+    """
+    Opens a sync database, decompressing it on the fly.
+
+    Parameters:
+        path (str): The `<repo>.db` file.
+
+    Returns:
+        IO[bytes]: The tarball.
+
+    Raises:
+        tarfile.ReadError: If the compression is not supported, e.g. zstd.
+    """
+    with open(path, "rb") as f:
+        magic = f.read(6)
+    if magic.startswith(b"\x1f\x8b"):
+        return gzip.open(path, "rb")
+    if magic.startswith(b"BZh"):
+        return bz2.open(path, "rb")
+    if magic == b"\xfd7zXZ\x00":
+        return lzma.open(path, "rb")
+    if magic.startswith(b"\x28\xb5\x2f\xfd"):
+        raise tarfile.ReadError(f"zstd compressed database {path} is not supported")
+    return open(path, "rb")
+
+
+def iter_tar(f: IO[bytes]) -> Iterator[Tuple[str, bytes]]:
+    """
+    Yields the regular files of a tarball read sequentially.
+
+    tarfile spends most of its time building a TarInfo for every member, sync databases
+    hold tens of thousands of tiny files, so only the fields needed are decoded here.
+    ustar, pax `path` records and GNU long names are supported.
+
+    Parameters:
+        f (IO[bytes]): The uncompressed tarball.
+
+    Yields:
+        Tuple[str, bytes]: The path and the content of every regular file.
+
+    Raises:
+        tarfile.ReadError: If a header is malformed.
+    """
+    long_name: Optional[str] = None
+    while True:
+        header = f.read(TAR_BLOCK_SIZE)
+        if len(header) < TAR_BLOCK_SIZE or header == TAR_EMPTY_BLOCK:
+            return
+        try:
+            size = int(header[124:136].rstrip(b"\0 ") or b"0", 8)
+        except ValueError:
+            raise tarfile.ReadError(f"invalid tar header {header[:100]!r}")
+        data = f.read(size)
+        f.read(-size % TAR_BLOCK_SIZE)
+        kind = header[156:157]
+        if kind == b"x":
+            for record in data.decode(errors="replace").split("\n"):
+                # "<length> path=<value>"
+                key, sep, value = record.partition(" ")[2].partition("=")
+                if sep and key == "path":
+                    long_name = value
+            continue
+        if kind == b"L":
+            long_name = data.rstrip(b"\0").decode(errors="replace")
+            continue
+        if long_name is not None:
+            name, long_name = long_name, None
+        else:
+            name = header[:100].rstrip(b"\0").decode(errors="replace")
+            prefix = header[345:500].rstrip(b"\0")
+            if header[257:262] == b"ustar" and prefix:
+                name = f"{prefix.decode(errors='replace')}/{name}"
+        if kind in (b"0", b"\0"):
+            yield name, data
+
+
+def iter_sync_db(path: str) -> Iterator[Dict[str, List[str]]]:
+    """
+    Yields the packages of a sync database, a (compressed) tarball of
+    `<name>-<version>/desc` files. The tarball is streamed, never extracted.
+
+    Parameters:
+        path (str): The `<repo>.db` file.
+
+    Yields:
+        Dict[str, List[str]]: The fields of every desc file.
+
+    Raises:
+        tarfile.TarError: If the compression is not supported, e.g. zstd.
+    """
+    with open_sync_db(path) as f:
+        for name, data in iter_tar(f):
+            if name.endswith("/desc"):
+                yield parse_desc(data.decode(errors="replace"))
+
+
+def get_sync_repos(db_path: str = PACMAN_DB_PATH, conf: str = PACMAN_CONF) -> List[str]:
+    """
+    Gets the sync repositories in the order of pacman.conf, the first repository
+    providing a package wins as in pacman.
+
+    Parameters:
+        db_path (str): The pacman database directory.
+        conf (str): The pacman configuration.
+
+    Returns:
+        List[str]: The repositories having a database, the ones missing from the
+            configuration are appended in name order.
+    """
+    sync = os.path.join(db_path, "sync")
+    exist = sorted(
+        name[: -len(".db")] for name in os.listdir(sync) if name.endswith(".db")
+    )
+    repos = []
+    try:
+        with open(conf, "r") as f:
+            for line in f:
+                match = re.match(r"^\s*\[(?P<repo>[^\]]+)\]", line)
+                if match and match.group("repo") != "options":
+                    repos.append(match.group("repo"))
+    except OSError as e:
+        logger.debug(f"Can't read {conf}: {e}")
+    ordered = [repo for repo in repos if repo in exist]
+    return ordered + [repo for repo in exist if repo not in ordered]
+
+
+def get_field(fields: Dict[str, List[str]], key: str, default: str = "") -> str:
+    """Gets the first value of a desc field"""
+    values = fields.get(key)
+    return values[0] if values else default
+
+
+def iter_native_packages(
+    pattern: Optional[str] = None,
+    db_path: str = PACMAN_DB_PATH,
+    conf: str = PACMAN_CONF,
+) -> Iterator[Package]:
+    """
+    Yields the packages of the sync repositories, merged with the local database,
+    without running pacman.
+
+    Parameters:
+        pattern (str, optional): Only yield packages whose name or description
+            matches this case insensitive regex, as `pacman -Ss` does. Defaults to
+            all packages.
+        db_path (str): The pacman database directory.
+        conf (str): The pacman configuration.
+
+    Yields:
+        Package: The packages, in repository order.
+    """
+    search = None
+    if pattern is not None:
+        try:
+            search = re.compile(pattern, re.IGNORECASE)
+        except re.error:
+            search = re.compile(re.escape(pattern), re.IGNORECASE)
+
+    installed = {get_field(fields, "NAME"): fields for fields in iter_local_db(db_path)}
+    seen = set()
+    for repo in get_sync_repos(db_path, conf):
+        for fields in iter_sync_db(os.path.join(db_path, "sync", f"{repo}.db")):
+            name = get_field(fields, "NAME")
+            if name == "" or name in seen:
+                continue
+            seen.add(name)
+            description = get_field(fields, "DESC")
+            if search is not None and not (
+                search.search(name) or search.search(description)
+            ):
+                continue
+            version = get_field(fields, "VERSION")
+            local = installed.get(name)
+            if local is None:
+                yield Package(
+                    package_type=ManagerType.pacman,
+                    package_name=name,
+                    architecture=get_field(fields, "ARCH"),
+                    description=description,
+                    version=version,
+                    installed=False,
+                    automatically_installed=False,
+                    upgradable=False,
+                    available_version=None,
+                    remain={"repo": [repo]},
+                )
+                continue
+            local_version = get_field(local, "VERSION")
+            upgradable = vercmp(version, local_version) > 0
+            yield Package(
+                package_type=ManagerType.pacman,
+                package_name=name,
+                architecture=get_field(local, "ARCH"),
+                description=get_field(local, "DESC"),
+                version=local_version,
+                installed=True,
+                automatically_installed=get_field(local, "REASON") == REASON_DEPEND,
+                upgradable=upgradable,
+                available_version=version if upgradable else None,
+                remain={"repo": [repo]},
+            )
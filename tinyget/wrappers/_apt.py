@@ -1,31 +1,54 @@
 from datetime import datetime
-import re
+import itertools
 import traceback
-from tinyget.common_utils import logger
+from tinyget.cache import (
+    cached_packages,
+    cached_table,
+    invalidates_cache,
+    is_cache_enabled,
+    iter_cached_packages,
+)
+from tinyget.common_utils import get_backend, logger
 from tinyget.repos.third_party import get_pkg_url, get_third_party_packages
+from tinyget.search_index import glob_query, search_packages
 from tinyget.globals import ERROR_HANDLED, ERROR_UNKNOWN, SUCCESS, global_configs
 from tinyget.interact.process import CommandExecutionError
 from rich.console import Console
 from rich.panel import Panel
-from .pkg_manager import PackageManagerBase
+from .pkg_manager import PackageManagerBase, get_filters, get_third_party_matches
+from ._dpkg import iter_native_packages
 from ..interact import execute_command as _execute_command
-from tinyget.package import History, Package, ManagerType
-from typing import Optional, List
+from ..interact import stream_command as _stream_command
+from tinyget.package import History, Package, PackageTable, ManagerType
+from typing import Iterable, Iterator, Optional, List
 from tinyget.i18n import load_translation
-from tinyget.interact import try_to_get_ai_helper
-
-aihelper = try_to_get_ai_helper()
+from tinyget.interact import get_advice, print_advice
 
 _ = load_translation("_apt")
 
+# translated once, `apt list` prints them for every package
+STATUS_SEPARATOR = _(",")
+STATUS_INSTALLED = _("installed")
+STATUS_AUTO = _("auto")
+STATUS_UPGRADABLE = _("upgradable")
+# : 's format depends on the LANG
+STATUS_VERSION_SEPARATOR = _(":")
+
+APT_HISTORY_LOG = "/var/log/apt/history.log"
+
 
-def execute_apt_command(args: List[str], timeout: Optional[float] = None):
+def execute_apt_command(
+    args: List[str],
+    timeout: Optional[float] = None,
+    bounded: bool = False,
+):
     """
     Executes apt with the given arguments and optional timeout.
 
     Parameters:
         args (List[str]): The arguments to pass to the apt. Can be a list of strings or a single string.
         timeout (int, optional): The maximum time to wait for the apt to complete, in seconds. Defaults to None.
+        bounded (bool, optional): Keep only the tail of the live output, see global_configs['max_output_size']. Defaults to False.
 
     Returns:
         The result of executing the command.
@@ -33,7 +56,7 @@ def execute_apt_command(args: List[str], timeout: Optional[float] = None):
     """
     envp = {"DEBIAN_FRONTEND": "noninteractive"}
     args.insert(0, "apt")
-    out, err, retcode = _execute_command(args, envp, timeout)
+    out, err, retcode = _execute_command(args, envp, timeout, bounded=bounded)
     if retcode == 0:
         # Operation successful
         return (out, err, SUCCESS)
@@ -48,101 +71,233 @@ def execute_apt_command(args: List[str], timeout: Optional[float] = None):
         )
 
 
-def get_packages(softs: str = "", enable_third_party: bool = True) -> List[Package]:
+def stream_apt_command(args: List[str]) -> Iterator[str]:
     """
-    Retrieves a list of all installed and uninstalled packages.
+    Executes apt with the given arguments and yields its stdout line by line while apt
+    is still running.
 
     Parameters:
-        enable_third_party (bool): Enable third party softwares.
+        args (List[str]): The arguments to pass to the apt.
+
+    Yields:
+        str: Lines of stdout, without the line breaks.
+
+    Raises:
+        CommandExecutionError: After the last line, if apt failed.
+    """
+    envp = {"DEBIAN_FRONTEND": "noninteractive"}
+    args.insert(0, "apt")
+    stream = _stream_command(args, envp)
+    yield from stream.lines()
+    if stream.returncode != 0:
+        raise CommandExecutionError(
+            # 0: args the operation. 1: envp the execution environment
+            message=_("APT error during operation {0} with {1}").format(args, envp),
+            args=list(args),
+            envp=envp,
+            stdout="",
+            stderr=stream.stderr,
+        )
+
+
+def parse_install_status(status: str, version: str) -> dict:
+    """
+    Parses the install status shown in brackets by `apt list`.
+
+    Parameters:
+        status (str): The status, e.g. `installed,automatic` or `upgradable from: 1.0`.
+        version (str): The version listed before the status.
 
     Returns:
-        List[Package]: A list of Package objects representing the installed and uninstalled packages.
+        dict: The installed / automatically_installed / upgradable / version /
+            available_version fields of the Package.
+    """
+    installed = False
+    automatically_installed = False
+    upgradable = False
+    available_version = None
+    for s in status.split(STATUS_SEPARATOR):
+        if STATUS_INSTALLED in s:
+            installed = True
+        if STATUS_AUTO in s:
+            automatically_installed = True
+        if STATUS_UPGRADABLE in s:
+            upgradable = True
+            installed = True
+            # upgradable from: xxx, which is the current version
+            cv = s.split(STATUS_VERSION_SEPARATOR, maxsplit=1)
+            if len(cv) == 2:
+                available_version = cv[1].strip()
+            else:
+                logger.warning(
+                    # 0: The status captured
+                    _("Can't parse status is upgradable: {0}").format(s)
+                )
+    if upgradable:
+        t = version
+        version = available_version if available_version is not None else ""
+        available_version = t
+    return {
+        "installed": installed,
+        "automatically_installed": automatically_installed,
+        "upgradable": upgradable,
+        "version": version,
+        "available_version": available_version,
+    }
+
+
+def parse_apt_list(lines: Iterable[str]) -> Iterator[Package]:
+    """
+    Parses the output of `apt list -v` line by line, yields every package as soon as
+    its description line is read.
 
-    Explains:
-        This code defines a function get_packages() that retrieves a list of all installed and uninstalled packages on a system using the apt package manager. It executes the command apt list -v and parses the output to extract information about each package, such as the package name, repository, version, architecture, installation status, and description. It uses regular expressions to match and extract the relevant information from the output. The extracted information is then used to create Package objects, which are appended to a list and returned as the result.
+    Each package is a header line `name/repo[,repo] version arch [status]` followed
+    by its description indented by two spaces, packages are separated by blank lines.
+    Anything else (`Listing...`, notices) is skipped.
+
+    Parameters:
+        lines (Iterable[str]): The output lines, without the line breaks.
+
+    Yields:
+        Package: The parsed packages.
     """
-    args = ["list", "-v"]
-    if softs != "":
-        args.append(softs)
-    content, stderr, retcode = execute_apt_command(args)
-
-    blocks = content.split("\n\n")
-
-    package_name_regex = r"(?P<package_name>.+)"
-    repo_regex = r"(?P<repo>.+)"
-    version_regex = r"(?P<version>.+)"
-    architecture_regex = r"(?P<architecture>.+)"
-    install_status_regex = r"(?P<install_status>.+)"
-    description_regex = r"(?P<description>.+)"
-    installed_pattern = rf"^{package_name_regex}/{repo_regex}\s{version_regex}\s{architecture_regex}\s\[{install_status_regex}\]\n  {description_regex}$"
-    uninstalled_pattern = rf"^{package_name_regex}/{repo_regex}\s{version_regex}\s{architecture_regex}\n  {description_regex}$"
-    installed_regex = re.compile(installed_pattern, re.MULTILINE)
-    uninstalled_regex = re.compile(uninstalled_pattern, re.MULTILINE)
-
-    packages = []
-
-    for block in blocks:
-        match = installed_regex.search(block)
-        if match:
-            installed_status = match.group("install_status").split(_(","))
-            installed = False
-            automatically_installed = False
-            upgradable = False
-            available_version = None
-            for status in installed_status:
-                if _("installed") in status:
-                    installed = True
-                if _("auto") in status:
-                    automatically_installed = True
-                if _("upgradable") in status:
-                    upgradable = True
-                    installed = True
-                    # upgradable from: xxx, which is the current version
-                    # : 's format depends on the LANG
-                    cv = status.split(_(":"), maxsplit=1)
-                    if len(cv) == 2:
-                        available_version = cv[1].strip()
-                    else:
-                        logger.warning(
-                            # 0: The status captured
-                            _("Can't parse status is upgradable: {0}").format(status)
-                        )
-            version = match.group("version")
-            if upgradable:
-                t = version
-                version = available_version if available_version is not None else ""
-                available_version = t
-            package = Package(
+    header = None
+    for line in lines:
+        if line.startswith("  "):
+            if header is None:
+                continue
+            package_name, repo, version, architecture, status = header
+            header = None
+            if status is None:
+                fields = {
+                    "installed": False,
+                    "automatically_installed": False,
+                    "upgradable": False,
+                    "version": version,
+                    "available_version": None,
+                }
+            else:
+                fields = parse_install_status(status, version)
+            yield Package(
                 package_type=ManagerType.apt,
-                package_name=match.group("package_name"),
-                architecture=match.group("architecture"),
-                description=match.group("description"),
-                version=version,
-                installed=installed,
-                automatically_installed=automatically_installed,
-                upgradable=upgradable,
-                available_version=available_version,
-                remain={"repo": match.group("repo").split(",")},
+                package_name=package_name,
+                architecture=architecture,
+                description=line[2:],
+                remain={"repo": repo.split(",")},
+                **fields,
             )
-            packages.append(package)
             continue
 
-        match = uninstalled_regex.search(block)
-        if match:
-            package = Package(
-                package_type=ManagerType.apt,
-                package_name=match.group("package_name"),
-                architecture=match.group("architecture"),
-                description=match.group("description"),
-                version=match.group("version"),
-                installed=False,
-                automatically_installed=False,
-                upgradable=False,
-                available_version=None,
-                remain={"repo": match.group("repo").split(",")},
-            )
-            packages.append(package)
+        # header line, or a line which is not part of any package
+        header = None
+        if line == "" or line[0].isspace():
+            continue
+        head, sep, status = line.partition(" [")
+        if sep:
+            if not status.endswith("]"):
+                continue
+            status = status[:-1]
+        else:
+            status = None
+        blocks = head.split(" ")
+        if len(blocks) != 3:
             continue
+        package_name, slash, repo = blocks[0].partition("/")
+        if not slash or package_name == "" or repo == "":
+            continue
+        header = (package_name, repo, blocks[1], blocks[2], status)
+
+
+def iter_packages(softs: str = "") -> Iterator[Package]:
+    """
+    Yields the packages listed by `apt list -v` while apt is still printing them.
+
+    Parameters:
+        softs (str): The softwares search pattern. Defaults to all packages.
+
+    Yields:
+        Package: The parsed packages.
+    """
+    args = ["list", "-v"]
+    if softs != "":
+        args.append(softs)
+    yield from parse_apt_list(stream_apt_command(args))
+
+
+def load_packages(backend: str, softs: str = "") -> List[Package]:
+    """
+    Loads the packages with the given backend, bypassing the package cache.
+
+    Parameters:
+        backend (str): "cli" or "native".
+        softs (str): The softwares search pattern. Defaults to all packages.
+
+    Returns:
+        List[Package]: The packages.
+    """
+    return list(iter_backend_packages(backend, softs))
+
+
+def iter_backend_packages(backend: str, softs: str = "") -> Iterator[Package]:
+    """
+    Yields the packages with the given backend as they are parsed, bypassing the
+    package cache.
+
+    Parameters:
+        backend (str): "cli" or "native".
+        softs (str): The softwares search pattern. Defaults to all packages.
+
+    Yields:
+        Package: The packages.
+    """
+    if backend == "native":
+        return iter_native_packages(softs)
+    return iter_packages(softs)
+
+
+def get_package_table(backend: Optional[str] = None) -> PackageTable:
+    """
+    Retrieves all packages as a table, from the package cache when the dpkg / apt
+    state did not change.
+
+    Parameters:
+        backend (str, optional): "cli" or "native", see get_packages.
+
+    Returns:
+        PackageTable: The packages, without the third party ones.
+    """
+    backend = get_backend(backend)
+    return cached_table(ManagerType.apt, backend, lambda: load_packages(backend))
+
+
+def get_packages(
+    softs: str = "", enable_third_party: bool = True, backend: Optional[str] = None
+) -> List[Package]:
+    """
+    Retrieves a list of all installed and uninstalled packages. The list of all
+    packages is read from the package cache when the dpkg / apt state did not change,
+    searches use its search index.
+
+    Parameters:
+        softs (str): The softwares search pattern. Defaults to all packages.
+        enable_third_party (bool): Enable third party softwares.
+        backend (str, optional): "cli" parses `apt list -v`, "native" reads the dpkg
+            status and apt lists files. Defaults to global_configs['backend'].
+
+    Returns:
+        List[Package]: A list of Package objects representing the installed and uninstalled packages.
+    """
+    backend = get_backend(backend)
+
+    def load() -> List[Package]:
+        return load_packages(backend)
+
+    if softs == "":
+        packages = cached_packages(ManagerType.apt, backend, load)
+    elif is_cache_enabled():
+        packages = search_packages(ManagerType.apt, backend, load, glob_query(softs))
+    else:
+        packages = load_packages(backend, softs)
 
     # Append third party softs
     if enable_third_party:
@@ -151,6 +306,39 @@ def get_packages(softs: str = "", enable_third_party: bool = True) -> List[Packa
     return packages
 
 
+def iter_history(path: str = APT_HISTORY_LOG) -> Iterator[History]:
+    """
+    Yields the operations of apt's history log while it is read.
+
+    Parameters:
+        path (str): The history log. Defaults to /var/log/apt/history.log.
+
+    Yields:
+        History: The operations, the oldest first.
+    """
+    blocks: List[str] = []
+    i = 0
+    with open(path, "r") as f:
+        # the operations are separated by an empty line, the last one may not be
+        for line in itertools.chain(f, [""]):
+            line = line.rstrip("\n")
+            if line != "":
+                blocks.append(line)
+                continue
+            if not blocks:
+                continue
+            yield History(
+                id=str(i),
+                command=blocks[1].split(":")[1].strip(),
+                date=datetime.strptime(
+                    blocks[0].split(":", maxsplit=1)[1].strip(), "%Y-%m-%d %H:%M:%S"
+                ),
+                operations=[blocks[2].split(":")[0]],
+            )
+            i += 1
+            blocks = []
+
+
 class APT(PackageManagerBase):
     def __init__(self):
         pass
@@ -160,6 +348,9 @@ class APT(PackageManagerBase):
         only_installed: bool = False,
         only_upgradable: bool = False,
         enable_third_party: bool = True,
+        backend: Optional[str] = None,
+        architecture: Optional[str] = None,
+        repo: Optional[str] = None,
     ) -> List[Package]:
         """
         Returns a list of packages based on the specified filters.
@@ -169,13 +360,22 @@ class APT(PackageManagerBase):
                 Defaults to False.
             only_upgradable (bool, optional): If True, only return upgradable packages.
                 Defaults to False.
+            backend (str, optional): "cli" or "native", see get_packages.
+            architecture (str, optional): Only return the packages of this
+                architecture.
+            repo (str, optional): Only return the packages of this repository.
 
         Returns:
             List[Package]: A list of packages that match the specified filters.
         """
         console = Console()
         try:
-            packages = get_packages(enable_third_party=enable_third_party)
+            table = get_package_table(backend=backend)
+            filters = get_filters(only_installed, only_upgradable, architecture, repo)
+            packages = table.filter(**filters).to_packages()
+            # Append third party softs
+            if enable_third_party:
+                packages.extend(get_third_party_matches(table, filters))
         except CommandExecutionError as e:
             console.print(
                 Panel(
@@ -194,15 +394,78 @@ class APT(PackageManagerBase):
             logger.debug(f"{traceback.format_exc()}")
             return []
 
-        # Process filter
-        if only_upgradable:
-            packages = [package for package in packages if package.upgradable]
+        return packages
 
-        if only_installed:
-            packages = [package for package in packages if package.installed]
+    def iter_packages(
+        self, enable_third_party: bool = True, backend: Optional[str] = None
+    ) -> Iterator[Package]:
+        """
+        Yields all packages while apt lists them or the dpkg / apt files are read,
+        from the package cache when the dpkg / apt state did not change. The third
+        party packages come last.
 
-        return packages
+        Args:
+            enable_third_party (bool, optional): Enable third party softwares.
+                Defaults to True.
+            backend (str, optional): "cli" or "native", see get_packages.
+
+        Yields:
+            Package: The packages.
+        """
+        backend = get_backend(backend)
+        packages: List[Package] = []
+        for package in iter_cached_packages(
+            ManagerType.apt, backend, lambda: iter_backend_packages(backend)
+        ):
+            packages.append(package)
+            yield package
+        if enable_third_party:
+            yield from get_third_party_packages(wrapper_softs=packages)
+
+    def count_packages(
+        self,
+        only_installed: bool = False,
+        only_upgradable: bool = False,
+        enable_third_party: bool = True,
+        backend: Optional[str] = None,
+        architecture: Optional[str] = None,
+        repo: Optional[str] = None,
+    ) -> int:
+        """
+        Counts the packages matching the filters of list_packages, on the columns of
+        the package table without building any package.
+
+        Returns:
+            int: The number of packages.
+        """
+        console = Console()
+        try:
+            table = get_package_table(backend=backend)
+            filters = get_filters(only_installed, only_upgradable, architecture, repo)
+            count = table.count(**filters)
+            if enable_third_party:
+                count += len(get_third_party_matches(table, filters))
+        except CommandExecutionError as e:
+            console.print(
+                Panel(
+                    # 0: e.stdout the Output. 1: e.stderr the Error.
+                    _("Output: {0}\nError: {1}").format(e.stdout, e.stderr),
+                    border_style="red",
+                    title=_("Operation Failed"),
+                )
+            )
+            logger.debug(f"{traceback.format_exc()}")
+            return 0
+        except Exception as e:
+            console.print(
+                Panel(f"{e}", border_style="red", title=_("Operation Failed"))
+            )
+            logger.debug(f"{traceback.format_exc()}")
+            return 0
+
+        return count
 
+    @invalidates_cache
     def update(self):
         """
         Updates the system by running the 'apt update' command.
@@ -216,7 +479,7 @@ class APT(PackageManagerBase):
             args = ["update", "-y"]
         console = Console()
         try:
-            result = execute_apt_command(args)
+            result = execute_apt_command(args, bounded=True)
         except CommandExecutionError as e:
             if _("Permission denied") in e.stderr:
                 console.print(
@@ -251,6 +514,7 @@ class APT(PackageManagerBase):
             return (None, None, ERROR_UNKNOWN)
         return result
 
+    @invalidates_cache
     def upgrade(self):
         """
         Upgrade the system by running the 'apt upgrade' command with the '-y' flag.
@@ -268,7 +532,7 @@ class APT(PackageManagerBase):
             args = ["upgrade", "-y"]
         console = Console()
         try:
-            result = execute_apt_command(args)
+            result = execute_apt_command(args, bounded=True)
         except CommandExecutionError as e:
             if _("Permission denied") in e.stderr:
                 console.print(
@@ -303,6 +567,7 @@ class APT(PackageManagerBase):
             return (None, None, ERROR_UNKNOWN)
         return result
 
+    @invalidates_cache
     def install(self, packages: List[str]):
         """
         Installs the specified packages.
@@ -327,7 +592,7 @@ class APT(PackageManagerBase):
             args = ["install", "-y", *packages]
         console = Console()
         try:
-            result = execute_apt_command(args)
+            result = execute_apt_command(args, bounded=True)
         except CommandExecutionError as e:
             if _("Permission denied") in e.stderr:
                 console.print(
@@ -349,7 +614,9 @@ class APT(PackageManagerBase):
                     )
                 )
             logger.debug(f"{traceback.format_exc()}")
-            if aihelper is None:
+            # cached for the same failure, else the AI helper is contacted
+            advice = get_advice(args, e.stdout, e.stderr)
+            if advice is None:
                 console.print(
                     Panel(
                         _(
@@ -359,19 +626,11 @@ class APT(PackageManagerBase):
                     )
                 )
             else:
-                with console.status(
-                    "[bold green] {}".format(
-                        _("AI Helper started, getting command advise")
-                    ),
-                    spinner="bouncingBar",
-                ) as status:
-                    recommendation = aihelper.fix_command(args, e.stdout, e.stderr)
-                console.print(
-                    Panel(
-                        recommendation,
-                        border_style="green",
-                        title=_("Advise from AI Helper"),
-                    )
+                print_advice(
+                    console,
+                    advice,
+                    status=_("AI Helper started, getting command advise"),
+                    title=_("Advise from AI Helper"),
                 )
             return (None, None, ERROR_HANDLED)
         except Exception as e:
@@ -386,6 +645,7 @@ class APT(PackageManagerBase):
             return (None, None, ERROR_UNKNOWN)
         return result
 
+    @invalidates_cache
     def uninstall(self, packages: List[str]):
         """
         Uninstalls the specified packages.
@@ -403,7 +663,7 @@ class APT(PackageManagerBase):
             args = ["remove", "-y", *packages]
         console = Console()
         try:
-            result = execute_apt_command(args)
+            result = execute_apt_command(args, bounded=True)
         except CommandExecutionError as e:
             if _("Permission denied") in e.stderr:
                 console.print(
@@ -425,7 +685,9 @@ class APT(PackageManagerBase):
                     )
                 )
             logger.debug(f"{traceback.format_exc()}")
-            if aihelper is None:
+            # cached for the same failure, else the AI helper is contacted
+            advice = get_advice(args, e.stdout, e.stderr)
+            if advice is None:
                 console.print(
                     Panel(
                         _(
@@ -435,19 +697,11 @@ class APT(PackageManagerBase):
                     )
                 )
             else:
-                with console.status(
-                    "[bold green] {}".format(
-                        _("AI Helper started, getting command advise")
-                    ),
-                    spinner="bouncingBar",
-                ) as status:
-                    recommendation = aihelper.fix_command(args, e.stdout, e.stderr)
-                console.print(
-                    Panel(
-                        recommendation,
-                        border_style="green",
-                        title=_("Advise from AI Helper"),
-                    )
+                print_advice(
+                    console,
+                    advice,
+                    status=_("AI Helper started, getting command advise"),
+                    title=_("Advise from AI Helper"),
                 )
             return (None, None, ERROR_HANDLED)
         except Exception as e:
@@ -463,7 +717,10 @@ class APT(PackageManagerBase):
         return result
 
     def search(
-        self, package_name: str, enable_third_party: bool = True
+        self,
+        package_name: str,
+        enable_third_party: bool = True,
+        backend: Optional[str] = None,
     ) -> List[Package]:
         """
         Searches for the specified package.
@@ -471,6 +728,7 @@ class APT(PackageManagerBase):
         Args:
             package_name (str): The name of the package to search for.
             enable_third_party (bool): Enable third party softs.
+            backend (str, optional): "cli" or "native", see get_packages.
 
         Returns:
             The result of executing the command to search for the package.
@@ -479,7 +737,9 @@ class APT(PackageManagerBase):
         package_list = []
         try:
             package_list = get_packages(
-                softs=f"{package_name}", enable_third_party=enable_third_party
+                softs=f"{package_name}",
+                enable_third_party=enable_third_party,
+                backend=backend,
             )
         except CommandExecutionError as e:
             console.print(
@@ -506,24 +766,12 @@ class APT(PackageManagerBase):
         raise NotImplementedError
 
     def history(self) -> List[History]:
+        return list(self.iter_history())
+
+    def iter_history(self) -> Iterator[History]:
         console = Console()
-        histories = []
         try:
-            with open("/var/log/apt/history.log", "r") as f:
-                out = f.read()
-            out = out.strip().split("\n\n")
-            out = [block for block in out if block != ""]
-            for i, l in enumerate(out):
-                blocks = l.splitlines()
-                his = History(
-                    id=str(i),
-                    command=blocks[1].split(":")[1].strip(),
-                    date=datetime.strptime(
-                        blocks[0].split(":", maxsplit=1)[1].strip(), "%Y-%m-%d %H:%M:%S"
-                    ),
-                    operations=[blocks[2].split(":")[0]],
-                )
-                histories.append(his)
+            yield from iter_history()
         except Exception as e:
             console.print(
                 Panel(
@@ -533,7 +781,6 @@ class APT(PackageManagerBase):
                 )
             )
             logger.debug(f"{traceback.format_exc()}")
-        return histories
 
     def rollback(self, id: str):
         raise NotImplementedError
@@ -1,6 +1,8 @@
 from datetime import datetime
+from fnmatch import fnmatchcase
 import re
 import traceback
+from xml.etree import ElementTree
 
 from tinyget.globals import ERROR_HANDLED, ERROR_UNKNOWN, SUCCESS, global_configs
 from tinyget.interact.process import CommandExecutionError
@@ -8,26 +10,44 @@ from rich.console import Console
 from rich.panel import Panel
 
 from tinyget.repos.third_party import get_pkg_url, get_third_party_packages
-from .pkg_manager import PackageManagerBase
+from .pkg_manager import PackageManagerBase, get_filters, get_third_party_matches
+from ._rpmmd import (
+    UnsupportedMetadataError,
+    find_repositories,
+    iter_primary,
+    open_metadata,
+)
+from ._vercmp import vercmp
 from ..interact import execute_command as _execute_command
-from ..package import History, Package, ManagerType
-from ..common_utils import logger
+from ..interact import run_queries
+from ..package import History, Package, PackageTable, ManagerType
+from ..cache import (
+    cached_packages,
+    cached_table,
+    invalidates_cache,
+    is_cache_enabled,
+)
+from ..common_utils import get_backend, logger
+from ..search_index import glob_query, search_packages
 from typing import Optional, Union, List
 from tinyget.i18n import load_translation
-from tinyget.interact import try_to_get_ai_helper
-
-aihelper = try_to_get_ai_helper()
+from tinyget.interact import get_advice, print_advice
 
 _ = load_translation("_dnf")
 
 
-def execute_dnf_command(args: List[str], timeout: Optional[float] = None):
+def execute_dnf_command(
+    args: List[str],
+    timeout: Optional[float] = None,
+    bounded: bool = False,
+):
     """
     Executes dnf with the given arguments and optional timeout.
 
     Parameters:
         args (List[str]): The arguments to pass to the dnf. Should be a list of strings.
         timeout (int, optional): The maximum time to wait for the dnf to complete, in seconds. Defaults to None.
+        bounded (bool, optional): Keep only the tail of the live output, see global_configs['max_output_size']. Defaults to False.
 
     Returns:
         The result of executing the dnf.
@@ -35,7 +55,7 @@ def execute_dnf_command(args: List[str], timeout: Optional[float] = None):
     """
     envp = {}
     args.insert(0, "dnf")
-    out, err, retcode = _execute_command(args, envp, timeout)
+    out, err, retcode = _execute_command(args, envp, timeout, bounded=bounded)
     # see 'man dnf'
     if retcode == 0:
         # Operation successful
@@ -217,32 +237,144 @@ def check_update():
     return upgradable
 
 
-def get_packages(softs: str = "", enable_third_party: bool = True) -> List[Package]:
+def get_evr(package_info: dict) -> str:
     """
-    Retrieves information about specific packages. Default are all packages.
+    Formats `[epoch:]version-release` as `dnf check-update` prints it.
 
     Parameters:
-        enable_third_party (bool): Enable third party softwares
+        package_info (dict): The package information, with epoch, version and release.
+
+    Returns:
+        str: The full version.
+    """
+    evr = f"{package_info['version']}-{package_info['release']}"
+    if package_info["epoch"] not in ("", "0", "(none)"):
+        evr = f"{package_info['epoch']}:{evr}"
+    return evr
+
+
+def get_native_packages(softs: str = "") -> Optional[List[Package]]:
+    """
+    Retrieves the packages from the primary.xml metadata in dnf's cache, merged with
+    a single `repoquery --installed` which does not load any repository.
+
+    Upgradable packages are the installed ones with a higher version in the cached
+    metadata, excludes and obsoletes of `dnf check-update` are not taken into account.
+
+    Parameters:
+        softs (str): The softwares search pattern, matched against `name` and
+            `name.arch`. Defaults to all packages.
+
+    Returns:
+        Optional[List[Package]]: The packages, None if the metadata is not cached or
+            can't be read and dnf should be queried instead.
+    """
+    repositories = find_repositories()
+    if len(repositories) == 0:
+        logger.warning("No dnf metadata cached, fall back to dnf")
+        return None
+
+    available = {}
+    try:
+        for repo, primary in repositories:
+            with open_metadata(primary) as f:
+                for info in iter_primary(f):
+                    if softs != "" and not (
+                        fnmatchcase(info["name"], softs)
+                        or fnmatchcase(f"{info['name']}.{info['arch']}", softs)
+                    ):
+                        continue
+                    info["reponame"] = repo
+                    uid = get_unique_id(info)
+                    exist = available.get(uid)
+                    if exist is None or vercmp(get_evr(info), get_evr(exist)) > 0:
+                        available[uid] = info
+    except (OSError, ElementTree.ParseError, UnsupportedMetadataError) as e:
+        logger.warning(f"Can't read dnf metadata, fall back to dnf: {e}")
+        logger.debug(f"{traceback.format_exc()}")
+        return None
+
+    installed = {
+        get_unique_id(info): info
+        for info in repoquery(flags=["--installed", "--disablerepo=*"], softs=softs)
+    }
+
+    package_list = []
+    for uid, info in available.items():
+        local = installed.get(uid)
+        upgradable = local is not None and vercmp(get_evr(info), get_evr(local)) > 0
+        package_list.append(
+            Package(
+                package_type=ManagerType.dnf,
+                package_name=info["name"],
+                architecture=info["arch"],
+                description=info["summary"],
+                version=info["version"] if local is None else local["version"],
+                installed=local is not None,
+                automatically_installed=local is not None
+                and "dependency" in local["reason"],
+                upgradable=upgradable,
+                available_version=get_evr(info) if upgradable else None,
+                remain={"repo": [info["reponame"]]},
+            )
+        )
+    for uid, info in installed.items():
+        if uid in available:
+            continue
+        logger.debug(f"{uid} installed but not in any repo, see as userinstalled")
+        package_list.append(
+            Package(
+                package_type=ManagerType.dnf,
+                package_name=info["name"],
+                architecture=info["arch"],
+                description=info["summary"],
+                version=info["version"],
+                installed=True,
+                automatically_installed="dependency" in info["reason"],
+                upgradable=False,
+                available_version=None,
+                remain={"repo": [info["reponame"]]},
+            )
+        )
+    return package_list
+
+
+def get_cli_packages(softs: str = "") -> List[Package]:
+    """
+    Retrieves information about specific packages by running dnf. Default are all
+    packages.
+
+    Parameters:
+        softs (str): The softwares search pattern. Defaults to all packages.
 
     Returns:
         List[Package]: A list of Package objects representing the packages.
     """
-    package_info_list = repoquery(softs=softs)
+    results = run_queries(
+        {
+            "repoquery": lambda: repoquery(softs=softs),
+            "repoquery --installed": lambda: repoquery(
+                flags="--installed", softs=softs
+            ),
+            "check-update": check_update,
+        }
+    )
+    package_info_list = results["repoquery"]
     package_info_dict = {}
     for p in package_info_list:
         uid = get_unique_id(p)
-        if (
-            uid in package_info_dict
-            and p["version"] > package_info_dict[uid]["version"]
-        ) or uid not in package_info_dict:
+        exist = package_info_dict.get(uid)
+        if exist is None or vercmp(get_evr(p), get_evr(exist)) > 0:
             package_info_dict[uid] = p
 
     # Query installed packages
-    installed_package_info_list = repoquery(flags="--installed", softs=softs)
+    installed_package_info_list = results["repoquery --installed"]
     for info in installed_package_info_list:
         uid = get_unique_id(info)
         try:
             new_info = package_info_dict[uid]
+            # the installed version, as the native backend and apt report it
+            new_info["version"] = info["version"]
             new_info["reason"] = info["reason"]
             new_info["installtime"] = info["installtime"]
             package_info_dict[uid] = new_info
@@ -253,7 +385,7 @@ def get_packages(softs: str = "", enable_third_party: bool = True) -> List[Packa
             package_info_dict[uid] = info
 
     # Query upgradable packages
-    upgradable_package_info_list = check_update()
+    upgradable_package_info_list = results["check-update"]
     upgradable_dict = {}
     for info in upgradable_package_info_list:
         uid = get_unique_id(info)
@@ -278,6 +410,75 @@ def get_packages(softs: str = "", enable_third_party: bool = True) -> List[Packa
         )
         package_list.append(package)
 
+    return package_list
+
+
+def load_packages(backend: str, softs: str = "") -> List[Package]:
+    """
+    Loads the packages with the given backend, bypassing the package cache. The
+    native backend falls back to dnf.
+
+    Parameters:
+        backend (str): "cli" or "native".
+        softs (str): The softwares search pattern. Defaults to all packages.
+
+    Returns:
+        List[Package]: The packages.
+    """
+    if backend == "native":
+        native = get_native_packages(softs)
+        if native is not None:
+            return native
+    return get_cli_packages(softs)
+
+
+def get_package_table(backend: Optional[str] = None) -> PackageTable:
+    """
+    Retrieves all packages as a table, from the package cache when the rpm database
+    and dnf metadata did not change.
+
+    Parameters:
+        backend (str, optional): "cli" or "native", see get_packages.
+
+    Returns:
+        PackageTable: The packages, without the third party ones.
+    """
+    backend = get_backend(backend)
+    return cached_table(ManagerType.dnf, backend, lambda: load_packages(backend))
+
+
+def get_packages(
+    softs: str = "", enable_third_party: bool = True, backend: Optional[str] = None
+) -> List[Package]:
+    """
+    Retrieves information about specific packages. Default are all packages, read from
+    the package cache when the rpm database and dnf metadata did not change, searches
+    use its search index.
+
+    Parameters:
+        softs (str): The softwares search pattern. Defaults to all packages.
+        enable_third_party (bool): Enable third party softwares
+        backend (str, optional): "cli" runs dnf repoquery / check-update, "native"
+            reads the cached metadata and falls back to dnf on failure. Defaults to
+            global_configs['backend'].
+
+    Returns:
+        List[Package]: A list of Package objects representing the packages.
+    """
+    backend = get_backend(backend)
+
+    def load() -> List[Package]:
+        return load_packages(backend)
+
+    if softs == "":
+        package_list = cached_packages(ManagerType.dnf, backend, load)
+    elif is_cache_enabled():
+        package_list = search_packages(
+            ManagerType.dnf, backend, load, glob_query(softs, with_arch=True)
+        )
+    else:
+        package_list = load_packages(backend, softs)
+
     # Append third party softs
     if enable_third_party:
         package_list.extend(get_third_party_packages(softs, wrapper_softs=package_list))
@@ -294,6 +495,9 @@ class DNF(PackageManagerBase):
         only_installed: bool,
         only_upgradable: bool,
         enable_third_party: bool = True,
+        backend: Optional[str] = None,
+        architecture: Optional[str] = None,
+        repo: Optional[str] = None,
     ):
         """
         Retrieves a list of packages based on the specified filters.
@@ -302,13 +506,22 @@ class DNF(PackageManagerBase):
             only_installed (bool): If True, only return installed packages.
             only_upgradable (bool): If True, only return upgradable packages.
             enable_third_party (bool): Enable third party softwares.
+            backend (str, optional): "cli" or "native", see get_packages.
+            architecture (str, optional): Only return the packages of this
+                architecture.
+            repo (str, optional): Only return the packages of this repository.
 
         Returns:
             List[Package]: A list of packages that match the specified filters.
         """
         console = Console()
         try:
-            package_list = get_packages(enable_third_party=enable_third_party)
+            table = get_package_table(backend=backend)
+            filters = get_filters(only_installed, only_upgradable, architecture, repo)
+            package_list = table.filter(**filters).to_packages()
+            # Append third party softs
+            if enable_third_party:
+                package_list.extend(get_third_party_matches(table, filters))
         except CommandExecutionError as e:
             console.print(
                 Panel(
@@ -331,15 +544,56 @@ class DNF(PackageManagerBase):
             logger.debug(f"{traceback.format_exc()}")
             return []
 
-        # Process filter
-        if only_installed:
-            package_list = [p for p in package_list if p.installed]
+        return package_list
 
-        if only_upgradable:
-            package_list = [p for p in package_list if p.upgradable]
+    def count_packages(
+        self,
+        only_installed: bool = False,
+        only_upgradable: bool = False,
+        enable_third_party: bool = True,
+        backend: Optional[str] = None,
+        architecture: Optional[str] = None,
+        repo: Optional[str] = None,
+    ) -> int:
+        """
+        Counts the packages matching the filters of list_packages, on the columns of
+        the package table without building any package.
 
-        return package_list
+        Returns:
+            int: The number of packages.
+        """
+        console = Console()
+        try:
+            table = get_package_table(backend=backend)
+            filters = get_filters(only_installed, only_upgradable, architecture, repo)
+            count = table.count(**filters)
+            if enable_third_party:
+                count += len(get_third_party_matches(table, filters))
+        except CommandExecutionError as e:
+            console.print(
+                Panel(
+                    # 0: e.stdout the Output. 1: e.stderr the Error.
+                    _("Output: {0}\nError: {1}").format(e.stdout, e.stderr),
+                    border_style="red",
+                    title=_("Operation Failed"),
+                )
+            )
+            logger.debug(f"{traceback.format_exc()}")
+            return 0
+        except Exception as e:
+            console.print(
+                Panel(
+                    f"{e}",
+                    border_style="red",
+                    title=_("Operation Failed"),
+                )
+            )
+            logger.debug(f"{traceback.format_exc()}")
+            return 0
 
+        return count
+
+    @invalidates_cache
     def update(self):
         """
         Updates the system by checking for and applying available updates.
@@ -353,7 +607,7 @@ class DNF(PackageManagerBase):
             args = ["check-update", "-y"]
         console = Console()
         try:
-            result = execute_dnf_command(args)
+            result = execute_dnf_command(args, bounded=True)
         except CommandExecutionError as e:
             console.print(
                 Panel(
@@ -377,6 +631,7 @@ class DNF(PackageManagerBase):
             return (None, None, ERROR_UNKNOWN)
         return result
 
+    @invalidates_cache
     def upgrade(self):
         """
         Upgrade the system by running the `dnf upgrade` command with the specified arguments.
@@ -390,7 +645,7 @@ class DNF(PackageManagerBase):
             args = ["upgrade", "--refresh", "-y"]
         console = Console()
         try:
-            result = execute_dnf_command(args)
+            result = execute_dnf_command(args, bounded=True)
         except CommandExecutionError as e:
             if (
                 _(
@@ -430,6 +685,7 @@ class DNF(PackageManagerBase):
             return (None, None, ERROR_UNKNOWN)
         return result
 
+    @invalidates_cache
     def install(self, packages: List[str]):
         """
         Installs the specified packages using the DNF package manager.
@@ -454,7 +710,7 @@ class DNF(PackageManagerBase):
             args = ["install", "-y", *packages]
         console = Console()
         try:
-            result = execute_dnf_command(args)
+            result = execute_dnf_command(args, bounded=True)
         except CommandExecutionError as e:
             if (
                 _(
@@ -481,7 +737,9 @@ class DNF(PackageManagerBase):
                     )
                 )
             logger.debug(f"{traceback.format_exc()}")
-            if aihelper is None:
+            # cached for the same failure, else the AI helper is contacted
+            advice = get_advice(args, e.stdout, e.stderr)
+            if advice is None:
                 console.print(
                     Panel(
                         _(
@@ -491,19 +749,11 @@ class DNF(PackageManagerBase):
                     )
                 )
             else:
-                with console.status(
-                    "[bold green] {}".format(
-                        _("AI Helper started, getting command advise")
-                    ),
-                    spinner="bouncingBar",
-                ) as status:
-                    recommendation = aihelper.fix_command(args, e.stdout, e.stderr)
-                console.print(
-                    Panel(
-                        recommendation,
-                        border_style="green",
-                        title=_("Advise from AI Helper"),
-                    )
+                print_advice(
+                    console,
+                    advice,
+                    status=_("AI Helper started, getting command advise"),
+                    title=_("Advise from AI Helper"),
                 )
             return (None, None, ERROR_HANDLED)
         except Exception as e:
@@ -518,6 +768,7 @@ class DNF(PackageManagerBase):
             return (None, None, ERROR_UNKNOWN)
         return result
 
+    @invalidates_cache
     def uninstall(self, packages: List[str]):
         """
         Uninstalls a list of packages.
@@ -535,7 +786,7 @@ class DNF(PackageManagerBase):
             args = ["remove", "-y", *packages]
         console = Console()
         try:
-            result = execute_dnf_command(args)
+            result = execute_dnf_command(args, bounded=True)
         except CommandExecutionError as e:
             if (
                 _(
@@ -562,7 +813,9 @@ class DNF(PackageManagerBase):
                     )
                 )
             logger.debug(f"{traceback.format_exc()}")
-            if aihelper is None:
+            # cached for the same failure, else the AI helper is contacted
+            advice = get_advice(args, e.stdout, e.stderr)
+            if advice is None:
                 console.print(
                     Panel(
                         _(
@@ -572,19 +825,11 @@ class DNF(PackageManagerBase):
                     )
                 )
             else:
-                with console.status(
-                    "[bold green] {}".format(
-                        _("AI Helper started, getting command advise")
-                    ),
-                    spinner="bouncingBar",
-                ) as status:
-                    recommendation = aihelper.fix_command(args, e.stdout, e.stderr)
-                console.print(
-                    Panel(
-                        recommendation,
-                        border_style="green",
-                        title=_("Advise from AI Helper"),
-                    )
+                print_advice(
+                    console,
+                    advice,
+                    status=_("AI Helper started, getting command advise"),
+                    title=_("Advise from AI Helper"),
                 )
             return (None, None, ERROR_HANDLED)
         except Exception as e:
@@ -599,13 +844,19 @@ class DNF(PackageManagerBase):
             return (None, None, ERROR_UNKNOWN)
         return result
 
-    def search(self, package: str, enable_third_party: bool = True) -> List[Package]:
+    def search(
+        self,
+        package: str,
+        enable_third_party: bool = True,
+        backend: Optional[str] = None,
+    ) -> List[Package]:
         """
         Searches for a package using the DNF package manager.
 
         Parameters:
             package (str): The name of the package to search for.
             enable_third_party (bool): Enable third party softwares.
+            backend (str, optional): "cli" or "native", see get_packages.
 
         Returns:
             The return value of the execute_command function.
@@ -614,7 +865,9 @@ class DNF(PackageManagerBase):
         package_list = []
         try:
             package_list = get_packages(
-                softs=f"{package}", enable_third_party=enable_third_party
+                softs=f"{package}",
+                enable_third_party=enable_third_party,
+                backend=backend,
             )
         except CommandExecutionError as e:
             console.print(
@@ -667,6 +920,7 @@ class DNF(PackageManagerBase):
             logger.debug(f"{traceback.format_exc()}")
         return histories
 
+    @invalidates_cache
     def rollback(self, id: str):
         console = Console()
         use_input = global_configs["live_output"]
@@ -675,7 +929,7 @@ class DNF(PackageManagerBase):
         else:
             args = ["history", "undo", id, "-y"]
         try:
-            result = execute_dnf_command(args)
+            result = execute_dnf_command(args, bounded=True)
         except CommandExecutionError as e:
             console.print(
                 Panel(
@@ -0,0 +1,359 @@
+"""
+Read the dpkg / apt databases directly instead of parsing `apt list`
+"""
+
+from fnmatch import fnmatchcase
+import glob
+import gzip
+import os
+import re
+from typing import Dict, FrozenSet, IO, Iterator, List, Optional, Tuple
+from tinyget.common_utils import logger
+from tinyget.package import ManagerType, Package
+
+DPKG_STATUS = "/var/lib/dpkg/status"
+APT_EXTENDED_STATES = "/var/lib/apt/extended_states"
+APT_LISTS_DIR = "/var/lib/apt/lists"
+
+# the fields used from a stanza
+STATUS_FIELDS = frozenset(
+    [b"Package", b"Status", b"Architecture", b"Version", b"Description"]
+)
+INDEX_FIELDS = frozenset(
+    [b"Package", b"Architecture", b"Version", b"Description", b"Description-md5"]
+)
+TRANSLATION_FIELDS = frozenset([b"Description-md5", b"Description-en"])
+EXTENDED_STATES_FIELDS = frozenset([b"Package", b"Architecture", b"Auto-Installed"])
+RELEASE_FIELDS = frozenset([b"Suite", b"Codename"])
+
+# apt's name for the dpkg status "repository"
+INSTALLED_REPO = "now"
+
+_non_digits_regex = re.compile(r"\D*")
+_digits_regex = re.compile(r"\d*")
+
+
+def open_index(path: str) -> IO[bytes]:
+    """
+    Opens an index file, apt may store them gzip compressed.
+
+    Parameters:
+        path (str): The index file.
+
+    Returns:
+        IO[bytes]: The file opened in binary mode.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def iter_stanzas(path: str, fields: FrozenSet[bytes]) -> Iterator[Dict[str, str]]:
+    """
+    Iterates the stanzas (paragraphs separated by blank lines) of a deb822 file.
+
+    Only the first line of each field is kept, continuation lines are skipped, which
+    leaves the short description for `Description`.
+
+    Parameters:
+        path (str): The deb822 file.
+        fields (FrozenSet[bytes]): The field names to keep.
+
+    Yields:
+        Dict[str, str]: The kept fields of every stanza.
+    """
+    with open_index(path) as f:
+        stanza: Dict[str, str] = {}
+        for line in f:
+            if line[0] in b" \t":
+                continue
+            if line in (b"\n", b"\r\n"):
+                if stanza:
+                    yield stanza
+                    stanza = {}
+                continue
+            key, sep, value = line.partition(b":")
+            if sep and key in fields:
+                # keep trailing spaces of the value, apt shows them
+                stanza[key.decode()] = (
+                    value.lstrip(b" \t").rstrip(b"\r\n").decode(errors="replace")
+                )
+        if stanza:
+            yield stanza
+
+
+def _order(c: str) -> int:
+    # `~` sorts before everything, even the end of the part, letters before the rest
+    if c == "~":
+        return -1
+    if c.isalpha():
+        return ord(c)
+    return ord(c) + 256
+
+
+def _compare_part(a: str, b: str) -> int:
+    # alternate non digit / digit runs, compared the way dpkg does
+    while a or b:
+        a_alpha = _non_digits_regex.match(a).group()  # type: ignore
+        b_alpha = _non_digits_regex.match(b).group()  # type: ignore
+        a, b = a[len(a_alpha) :], b[len(b_alpha) :]
+        for i in range(max(len(a_alpha), len(b_alpha))):
+            ac = _order(a_alpha[i]) if i < len(a_alpha) else 0
+            bc = _order(b_alpha[i]) if i < len(b_alpha) else 0
+            if ac != bc:
+                return -1 if ac < bc else 1
+        a_digit = _digits_regex.match(a).group()  # type: ignore
+        b_digit = _digits_regex.match(b).group()  # type: ignore
+        a, b = a[len(a_digit) :], b[len(b_digit) :]
+        an, bn = int(a_digit or 0), int(b_digit or 0)
+        if an != bn:
+            return -1 if an < bn else 1
+    return 0
+
+
+def compare_versions(a: str, b: str) -> int:
+    """
+    Compares two Debian versions `[epoch:]upstream[-revision]`, see deb-version(7).
+
+    Parameters:
+        a (str): The first version.
+        b (str): The second version.
+
+    Returns:
+        int: -1, 0 or 1 when a is lower than, equal to or greater than b.
+    """
+
+    def split(v: str) -> Tuple[int, str, str]:
+        epoch, sep, rest = v.partition(":")
+        if not sep:
+            epoch, rest = "0", v
+        upstream, sep, revision = rest.rpartition("-")
+        if not sep:
+            upstream, revision = rest, ""
+        return int(epoch) if epoch.isdigit() else 0, upstream, revision
+
+    a_epoch, a_upstream, a_revision = split(a)
+    b_epoch, b_upstream, b_revision = split(b)
+    if a_epoch != b_epoch:
+        return -1 if a_epoch < b_epoch else 1
+    return _compare_part(a_upstream, b_upstream) or _compare_part(
+        a_revision, b_revision
+    )
+
+
+def get_list_suite(index: str, lists_dir: str) -> str:
+    """
+    Gets the suite apt shows for an index file, e.g. `stable` for
+    `deb.debian.org_debian_dists_bookworm_main_binary-amd64_Packages`.
+
+    Parameters:
+        index (str): The index file name.
+        lists_dir (str): The apt lists directory.
+
+    Returns:
+        str: The Suite of the Release file, falls back to the dist in the file name.
+    """
+    name = os.path.basename(index)
+    prefix, sep, rest = name.partition("_dists_")
+    if not sep:
+        # flat repositories
+        return name.split("_")[0]
+    dist = rest.split("_")[0]
+    for release in ("InRelease", "Release"):
+        release_path = os.path.join(lists_dir, f"{prefix}_dists_{dist}_{release}")
+        if not os.path.exists(release_path):
+            continue
+        try:
+            for stanza in iter_stanzas(release_path, RELEASE_FIELDS):
+                if "Suite" in stanza:
+                    return stanza["Suite"]
+                if "Codename" in stanza:
+                    return stanza["Codename"]
+        except OSError as e:
+            logger.debug(f"Can't read {release_path}: {e}")
+    return dist
+
+
+def get_installed(
+    status_path: str = DPKG_STATUS, extended_states_path: str = APT_EXTENDED_STATES
+) -> Dict[Tuple[str, str], Dict[str, str]]:
+    """
+    Reads the installed packages from the dpkg status file.
+
+    Parameters:
+        status_path (str): The dpkg status file.
+        extended_states_path (str): apt's extended states, telling the automatically
+            installed packages.
+
+    Returns:
+        Dict[Tuple[str, str], Dict[str, str]]: The stanzas keyed by (name, arch), with an
+            extra `Auto` field for automatically installed packages.
+    """
+    installed = {}
+    for stanza in iter_stanzas(status_path, STATUS_FIELDS):
+        # "want flag status", only fully installed packages are listed by apt
+        if stanza.get("Status", "").split(" ")[-1] != "installed":
+            continue
+        installed[(stanza["Package"], stanza.get("Architecture", ""))] = stanza
+
+    if os.path.exists(extended_states_path):
+        for stanza in iter_stanzas(extended_states_path, EXTENDED_STATES_FIELDS):
+            key = (stanza.get("Package", ""), stanza.get("Architecture", ""))
+            if key in installed and stanza.get("Auto-Installed") == "1":
+                installed[key]["Auto"] = "1"
+    return installed
+
+
+def get_available(
+    lists_dir: str = APT_LISTS_DIR,
+) -> Dict[Tuple[str, str], Dict[str, Dict[str, str]]]:
+    """
+    Reads the available packages from the downloaded `*_Packages` indexes.
+
+    Parameters:
+        lists_dir (str): The apt lists directory.
+
+    Returns:
+        Dict[Tuple[str, str], Dict[str, Dict[str, str]]]: For every (name, arch), the
+            stanzas keyed by version, with the suites providing it in a `Repos` field
+            (comma separated, as apt shows them).
+    """
+    available: Dict[Tuple[str, str], Dict[str, Dict[str, str]]] = {}
+    indexes = glob.glob(os.path.join(lists_dir, "*_Packages")) + glob.glob(
+        os.path.join(lists_dir, "*_Packages.gz")
+    )
+    for index in sorted(indexes):
+        suite = get_list_suite(index, lists_dir)
+        for stanza in iter_stanzas(index, INDEX_FIELDS):
+            if "Package" not in stanza or "Version" not in stanza:
+                continue
+            versions = available.setdefault(
+                (stanza["Package"], stanza.get("Architecture", "")), {}
+            )
+            exist = versions.get(stanza["Version"])
+            if exist is None:
+                stanza["Repos"] = suite
+                versions[stanza["Version"]] = stanza
+            elif suite not in exist["Repos"].split(","):
+                exist["Repos"] += f",{suite}"
+    return available
+
+
+def get_descriptions(lists_dir: str = APT_LISTS_DIR) -> Dict[str, str]:
+    """
+    Reads the English descriptions of the `*_i18n_Translation-en` indexes, Debian
+    leaves them out of the `*_Packages` indexes.
+
+    English is used whatever the locale, like the rest of the native backend.
+
+    Parameters:
+        lists_dir (str): The apt lists directory.
+
+    Returns:
+        Dict[str, str]: The short descriptions keyed by their Description-md5.
+    """
+    descriptions = {}
+    translations = glob.glob(
+        os.path.join(lists_dir, "*_i18n_Translation-en")
+    ) + glob.glob(os.path.join(lists_dir, "*_i18n_Translation-en.gz"))
+    for translation in sorted(translations):
+        for stanza in iter_stanzas(translation, TRANSLATION_FIELDS):
+            if "Description-md5" in stanza and "Description-en" in stanza:
+                descriptions[stanza["Description-md5"]] = stanza["Description-en"]
+    return descriptions
+
+
+def iter_native_packages(
+    softs: str = "",
+    status_path: str = DPKG_STATUS,
+    extended_states_path: str = APT_EXTENDED_STATES,
+    lists_dir: str = APT_LISTS_DIR,
+) -> Iterator[Package]:
+    """
+    Yields the packages `apt list -v` would show, read from the dpkg status file and
+    apt's indexes without spawning apt.
+
+    The candidate of a package is its highest available version, apt pinning is not
+    taken into account.
+
+    Parameters:
+        softs (str): The glob pattern of package names, as `apt list` takes. Defaults to
+            all packages.
+        status_path (str): The dpkg status file.
+        extended_states_path (str): apt's extended states.
+        lists_dir (str): The apt lists directory.
+
+    Yields:
+        Package: The packages, in the order `apt list` prints them.
+    """
+    installed = get_installed(status_path, extended_states_path)
+    available = get_available(lists_dir)
+    descriptions: Optional[Dict[str, str]] = None
+
+    def describe(stanza: Dict[str, str]) -> str:
+        nonlocal descriptions
+        if "Description" in stanza:
+            return stanza["Description"]
+        if descriptions is None:
+            descriptions = get_descriptions(lists_dir)
+        return descriptions.get(stanza.get("Description-md5", ""), "")
+
+    # in the order of `apt list`, which sorts by `name:arch`
+    keys = sorted(set(installed) | set(available), key=lambda k: f"{k[0]}:{k[1]}")
+    for key in keys:
+        name, architecture = key
+        if softs != "" and not fnmatchcase(name, softs):
+            continue
+        info = installed.get(key)
+        versions = available.get(key, {})
+        candidate = None
+        for version, stanza in versions.items():
+            if candidate is None or compare_versions(version, candidate["Version"]) > 0:
+                candidate = stanza
+
+        if info is None:
+            assert candidate is not None
+            yield Package(
+                package_type=ManagerType.apt,
+                package_name=name,
+                architecture=architecture,
+                description=describe(candidate),
+                version=candidate["Version"],
+                installed=False,
+                automatically_installed=False,
+                upgradable=False,
+                available_version=None,
+                remain={"repo": candidate["Repos"].split(",")},
+            )
+            continue
+
+        version = info.get("Version", "")
+        upgradable = (
+            candidate is not None
+            and compare_versions(candidate["Version"], version) > 0
+        )
+        current = versions.get(version)
+        if upgradable:
+            assert candidate is not None
+            repo: List[str] = candidate["Repos"].split(",")
+            available_version: Optional[str] = candidate["Version"]
+        else:
+            repo = (current["Repos"].split(",") if current else []) + [INSTALLED_REPO]
+            available_version = None
+        # apt shows `installed,local` instead of `automatic` for versions no
+        # repository provides
+        automatically_installed = info.get("Auto") == "1" and (
+            upgradable or current is not None
+        )
+        yield Package(
+            package_type=ManagerType.apt,
+            package_name=name,
+            architecture=architecture,
+            description=info.get("Description", ""),
+            version=version,
+            installed=True,
+            automatically_installed=automatically_installed,
+            upgradable=upgradable,
+            available_version=available_version,
+            remain={"repo": repo},
+        )
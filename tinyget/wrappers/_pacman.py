@@ -1,33 +1,46 @@
 from datetime import datetime
 import os
 import re
+import tarfile
 import traceback
-from tinyget.common_utils import logger
+from tinyget.cache import (
+    cached_packages,
+    cached_table,
+    invalidates_cache,
+    is_cache_enabled,
+)
+from tinyget.common_utils import get_backend, logger
 from tinyget.globals import ERROR_HANDLED, ERROR_UNKNOWN, SUCCESS, global_configs
 from tinyget.interact.process import CommandExecutionError
 from rich.console import Console
 from rich.panel import Panel
 
 from tinyget.repos.third_party import get_pkg_url, get_third_party_packages
-from .pkg_manager import PackageManagerBase
+from tinyget.search_index import regex_query, search_packages
+from .pkg_manager import PackageManagerBase, get_filters, get_third_party_matches
+from ._alpm import iter_native_packages
 from ..interact import execute_command as _execute_command
-from ..package import Package, ManagerType, History
+from ..interact import run_queries
+from ..package import Package, PackageTable, ManagerType, History
 from typing import Optional, Union, List, Dict
 from tinyget.i18n import load_translation
-from tinyget.interact import try_to_get_ai_helper
-
-aihelper = try_to_get_ai_helper()
+from tinyget.interact import get_advice, print_advice
 
 _ = load_translation("_pacman")
 
 
-def execute_pacman_command(args: List[str], timeout: Optional[float] = None):
+def execute_pacman_command(
+    args: List[str],
+    timeout: Optional[float] = None,
+    bounded: bool = False,
+):
     """
     Executes pacman with the given arguments and optional timeout.
 
     Parameters:
         args (List[str]): The arguments to pass to the pacman. Should be a list of strings.
         timeout (int, optional): The maximum time to wait for the pacman to complete, in seconds. Defaults to None.
+        bounded (bool, optional): Keep only the tail of the live output, see global_configs['max_output_size']. Defaults to False.
 
     Returns:
         The result of executing the dnf.
@@ -35,7 +48,7 @@ def execute_pacman_command(args: List[str], timeout: Optional[float] = None):
     """
     envp = {}
     args.insert(0, "pacman")
-    out, err, retcode = _execute_command(args, envp, timeout)
+    out, err, retcode = _execute_command(args, envp, timeout, bounded=bounded)
     if retcode == 0:
         # Operation successful
         return (out, err, SUCCESS)
@@ -303,26 +316,46 @@ def get_upgradable(package_name: Union[List[str], str] = []) -> Dict[str, str]:
     return upgradable
 
 
-def get_all_packages(enable_third_party: bool = True) -> List[Package]:
+def get_native_packages(pattern: Optional[str] = None) -> Optional[List[Package]]:
     """
-    Retrieves information about all packages.
+    Reads the packages from the pacman databases, see _alpm.iter_native_packages.
 
     Parameters:
-        enable_third_party (bool): Enable third party softwares.
+        pattern (str, optional): The search regex. Defaults to all packages.
+
+    Returns:
+        Optional[List[Package]]: The packages, None if the databases can't be read
+            (e.g. zstd compressed sync databases) and pacman should be run instead.
+    """
+    try:
+        return list(iter_native_packages(pattern))
+    except (OSError, tarfile.TarError) as e:
+        logger.warning(f"Can't read pacman databases, fall back to pacman: {e}")
+        logger.debug(f"{traceback.format_exc()}")
+        return None
+
+
+def get_cli_packages() -> List[Package]:
+    """
+    Retrieves information about all packages by running pacman.
 
     Returns:
         List[Package]: A list of Package objects representing the information
         about each package.
     """
-    installed_packages = get_all_installed_package_name()
-    packages = get_all_package_name()
-    installed_info = get_installed_info(installed_packages)
-    package_info = get_available_info(packages)
+    # -Qi / -Si need the names, each chain runs while the other ones do
+    results = run_queries(
+        {
+            "-Qq, -Qi": lambda: get_installed_info(get_all_installed_package_name()),
+            "-Ssq, -Si": lambda: get_available_info(get_all_package_name()),
+            "-Qu": get_upgradable,
+        }
+    )
 
-    installed_info_dict = {info["name"]: info for info in installed_info}
-    package_info_dict = {info["name"]: info for info in package_info}
+    installed_info_dict = {info["name"]: info for info in results["-Qq, -Qi"]}
+    package_info_dict = {info["name"]: info for info in results["-Ssq, -Si"]}
 
-    upgradable_dict = get_upgradable()
+    upgradable_dict = results["-Qu"]
 
     packages = []
     for name, info in package_info_dict.items():
@@ -357,6 +390,63 @@ def get_all_packages(enable_third_party: bool = True) -> List[Package]:
         )
         packages.append(package)
 
+    return packages
+
+
+def load_packages(backend: str) -> List[Package]:
+    """
+    Loads all packages with the given backend, the native one falling back to pacman.
+
+    Parameters:
+        backend (str): "cli" or "native".
+
+    Returns:
+        List[Package]: The packages.
+    """
+    if backend == "native":
+        native = get_native_packages()
+        if native is not None:
+            return native
+    return get_cli_packages()
+
+
+def get_package_table(backend: Optional[str] = None) -> PackageTable:
+    """
+    Retrieves all packages as a table, from the package cache when the pacman
+    databases did not change.
+
+    Parameters:
+        backend (str, optional): "cli" or "native", see get_all_packages.
+
+    Returns:
+        PackageTable: The packages, without the third party ones.
+    """
+    backend = get_backend(backend)
+    return cached_table(ManagerType.pacman, backend, lambda: load_packages(backend))
+
+
+def get_all_packages(
+    enable_third_party: bool = True, backend: Optional[str] = None
+) -> List[Package]:
+    """
+    Retrieves information about all packages, from the package cache when the pacman
+    databases did not change.
+
+    Parameters:
+        enable_third_party (bool): Enable third party softwares.
+        backend (str, optional): "cli" runs pacman, "native" reads the local and sync
+            databases and falls back to pacman on failure. Defaults to
+            global_configs['backend'].
+
+    Returns:
+        List[Package]: A list of Package objects representing the information
+        about each package.
+    """
+    backend = get_backend(backend)
+    packages = cached_packages(
+        ManagerType.pacman, backend, lambda: load_packages(backend)
+    )
+
     # Append third party softs
     if enable_third_party:
         packages.extend(get_third_party_packages(wrapper_softs=packages))
@@ -369,7 +459,13 @@ class PACMAN(PackageManagerBase):
         pass
 
     def list_packages(
-        self, only_installed, only_upgradable, enable_third_party: bool = True
+        self,
+        only_installed,
+        only_upgradable,
+        enable_third_party: bool = True,
+        backend: Optional[str] = None,
+        architecture: Optional[str] = None,
+        repo: Optional[str] = None,
     ) -> List[Package]:
         """
         Retrieve a list of packages based on filter criteria.
@@ -377,13 +473,22 @@ class PACMAN(PackageManagerBase):
         Args:
             only_installed (bool): If True, only return installed packages.
             only_upgradable (bool): If True, only return upgradable packages.
+            backend (str, optional): "cli" or "native", see get_all_packages.
+            architecture (str, optional): Only return the packages of this
+                architecture.
+            repo (str, optional): Only return the packages of this repository.
 
         Returns:
             List[Package]: A list of packages that match the filter criteria.
         """
         console = Console()
         try:
-            packages = get_all_packages(enable_third_party=enable_third_party)
+            table = get_package_table(backend=backend)
+            filters = get_filters(only_installed, only_upgradable, architecture, repo)
+            packages = table.filter(**filters).to_packages()
+            # Append third party softs
+            if enable_third_party:
+                packages.extend(get_third_party_matches(table, filters))
         except CommandExecutionError as e:
             console.print(
                 Panel(
@@ -402,15 +507,52 @@ class PACMAN(PackageManagerBase):
             logger.debug(f"{traceback.format_exc()}")
             return []
 
-        # Process filter
-        if only_installed:
-            packages = [package for package in packages if package.installed]
+        return packages
 
-        if only_upgradable:
-            packages = [package for package in packages if package.upgradable]
+    def count_packages(
+        self,
+        only_installed: bool = False,
+        only_upgradable: bool = False,
+        enable_third_party: bool = True,
+        backend: Optional[str] = None,
+        architecture: Optional[str] = None,
+        repo: Optional[str] = None,
+    ) -> int:
+        """
+        Counts the packages matching the filters of list_packages, on the columns of
+        the package table without building any package.
 
-        return packages
+        Returns:
+            int: The number of packages.
+        """
+        console = Console()
+        try:
+            table = get_package_table(backend=backend)
+            filters = get_filters(only_installed, only_upgradable, architecture, repo)
+            count = table.count(**filters)
+            if enable_third_party:
+                count += len(get_third_party_matches(table, filters))
+        except CommandExecutionError as e:
+            console.print(
+                Panel(
+                    # 0: e.stdout the Output. 1: e.stderr the Error.
+                    _("Output: {0}\nError: {1}").format(e.stdout, e.stderr),
+                    border_style="red",
+                    title=_("Operation Failed"),
+                )
+            )
+            logger.debug(f"{traceback.format_exc()}")
+            return 0
+        except Exception as e:
+            console.print(
+                Panel(f"{e}", border_style="red", title=_("Operation Failed"))
+            )
+            logger.debug(f"{traceback.format_exc()}")
+            return 0
 
+        return count
+
+    @invalidates_cache
     def update(self):
         """
         Updates the object with the latest information by executing the command "pacman -Sy --noconfirm" and returns the result.
@@ -424,7 +566,7 @@ class PACMAN(PackageManagerBase):
             args = ["-Sy", "--noconfirm"]
         console = Console()
         try:
-            result = execute_pacman_command(args)
+            result = execute_pacman_command(args, bounded=True)
         except CommandExecutionError as e:
             if (
                 _("error: you cannot perform this operation unless you are root.")
@@ -462,6 +604,7 @@ class PACMAN(PackageManagerBase):
             return (None, None, ERROR_UNKNOWN)
         return result
 
+    @invalidates_cache
     def upgrade(self):
         """
         Upgrade the system by executing the command "pacman -Syu --noconfirm".
@@ -475,7 +618,7 @@ class PACMAN(PackageManagerBase):
             args = ["-Syu", "--noconfirm"]
         console = Console()
         try:
-            result = execute_pacman_command(args)
+            result = execute_pacman_command(args, bounded=True)
         except CommandExecutionError as e:
             if (
                 _("error: you cannot perform this operation unless you are root.")
@@ -513,6 +656,7 @@ class PACMAN(PackageManagerBase):
             return (None, None, ERROR_UNKNOWN)
         return result
 
+    @invalidates_cache
     def install(self, packages: List[str]):
         """
         Installs the specified packages using the `pacman` package manager.
@@ -537,7 +681,7 @@ class PACMAN(PackageManagerBase):
             args = ["-S", "--noconfirm", *packages]
         console = Console()
         try:
-            result = execute_pacman_command(args)
+            result = execute_pacman_command(args, bounded=True)
         except CommandExecutionError as e:
             if (
                 _("error: you cannot perform this operation unless you are root.")
@@ -562,7 +706,9 @@ class PACMAN(PackageManagerBase):
                     )
                 )
             logger.debug(f"{traceback.format_exc()}")
-            if aihelper is None:
+            # cached for the same failure, else the AI helper is contacted
+            advice = get_advice(args, e.stdout, e.stderr)
+            if advice is None:
                 console.print(
                     Panel(
                         _(
@@ -572,19 +718,11 @@ class PACMAN(PackageManagerBase):
                     )
                 )
             else:
-                with console.status(
-                    "[bold green] {}".format(
-                        _("AI Helper started, getting command advise")
-                    ),
-                    spinner="bouncingBar",
-                ) as status:
-                    recommendation = aihelper.fix_command(args, e.stdout, e.stderr)
-                console.print(
-                    Panel(
-                        recommendation,
-                        border_style="green",
-                        title=_("Advise from AI Helper"),
-                    )
+                print_advice(
+                    console,
+                    advice,
+                    status=_("AI Helper started, getting command advise"),
+                    title=_("Advise from AI Helper"),
                 )
             return (None, None, ERROR_HANDLED)
         except Exception as e:
@@ -599,6 +737,7 @@ class PACMAN(PackageManagerBase):
             return (None, None, ERROR_UNKNOWN)
         return result
 
+    @invalidates_cache
     def uninstall(self, packages: List[str]):
         """
         Uninstalls the specified packages.
@@ -616,7 +755,7 @@ class PACMAN(PackageManagerBase):
             args = ["-Rns", "--noconfirm", *packages]
         console = Console()
         try:
-            result = execute_pacman_command(args)
+            result = execute_pacman_command(args, bounded=True)
         except CommandExecutionError as e:
             if (
                 _("error: you cannot perform this operation unless you are root.")
@@ -641,7 +780,9 @@ class PACMAN(PackageManagerBase):
                     )
                 )
             logger.debug(f"{traceback.format_exc()}")
-            if aihelper is None:
+            # cached for the same failure, else the AI helper is contacted
+            advice = get_advice(args, e.stdout, e.stderr)
+            if advice is None:
                 console.print(
                     Panel(
                         _(
@@ -651,19 +792,11 @@ class PACMAN(PackageManagerBase):
                     )
                 )
             else:
-                with console.status(
-                    "[bold green] {}".format(
-                        _("AI Helper started, getting command advise")
-                    ),
-                    spinner="bouncingBar",
-                ) as status:
-                    recommendation = aihelper.fix_command(args, e.stdout, e.stderr)
-                console.print(
-                    Panel(
-                        recommendation,
-                        border_style="green",
-                        title=_("Advise from AI Helper"),
-                    )
+                print_advice(
+                    console,
+                    advice,
+                    status=_("AI Helper started, getting command advise"),
+                    title=_("Advise from AI Helper"),
                 )
             return (None, None, ERROR_HANDLED)
         except Exception as e:
@@ -678,13 +811,20 @@ class PACMAN(PackageManagerBase):
             return (None, None, ERROR_UNKNOWN)
         return result
 
-    def search(self, package: str, enable_third_party: bool = True) -> List[Package]:
+    def search(
+        self,
+        package: str,
+        enable_third_party: bool = True,
+        backend: Optional[str] = None,
+    ) -> List[Package]:
         """
-        Searches for a package in the source.
+        Searches for a package in the source, in the search index of the package
+        cache when it is enabled.
 
         Args:
             package (str): The name of the package to search for.
             enable_third_party (bool): Enable third party softwares.
+            backend (str, optional): "cli" or "native", see get_all_packages.
 
         Returns:
             The result of the execute_pacman_command function.
@@ -692,20 +832,42 @@ class PACMAN(PackageManagerBase):
         args = ["-Ss", package]
         console = Console()
         package_list = []
+        backend = get_backend(backend)
+        if backend == "native" and not is_cache_enabled():
+            native = get_native_packages(package)
+            if native is not None:
+                if enable_third_party:
+                    native.extend(get_third_party_packages(package, native))
+                return native
         try:
+            if is_cache_enabled():
+                package_list = search_packages(
+                    ManagerType.pacman,
+                    backend,
+                    lambda: load_packages(backend),
+                    regex_query(package),
+                )
+                if enable_third_party:
+                    package_list.extend(get_third_party_packages(package, package_list))
+                return package_list
             out, err, retcode = execute_pacman_command(args)
             pkgs = []
             out = out.strip()
             for l in out.split("\n"):
                 if not l.startswith(" "):
                     pkgs.append(l.split(" ")[0].split("/")[-1])
-            installed_info = get_installed_info(pkgs)
-            package_info = get_available_info(pkgs)
+            infos = run_queries(
+                {
+                    "-Qi": lambda: get_installed_info(pkgs),
+                    "-Si": lambda: get_available_info(pkgs),
+                    "-Qu": lambda: get_upgradable(pkgs),
+                }
+            )
 
-            installed_info_dict = {info["name"]: info for info in installed_info}
-            package_info_dict = {info["name"]: info for info in package_info}
+            installed_info_dict = {info["name"]: info for info in infos["-Qi"]}
+            package_info_dict = {info["name"]: info for info in infos["-Si"]}
 
-            upgradable_dict = get_upgradable(pkgs)
+            upgradable_dict = infos["-Qu"]
 
             for name, info in package_info_dict.items():
                 if name in installed_info_dict:
@@ -0,0 +1,194 @@
+"""
+Read the rpm-md repository metadata (primary.xml) dnf already downloaded
+"""
+
+import bz2
+import configparser
+import glob
+import gzip
+import lzma
+import os
+from typing import Dict, IO, Iterator, List, Optional, Set, Tuple
+from xml.etree import ElementTree
+from tinyget.common_utils import logger
+
+# dnf4, dnf5
+DNF_CACHE_DIRS = ["/var/cache/dnf", "/var/cache/libdnf5"]
+# the repositories configured, the cache keeps the disabled and removed ones
+REPOS_DIRS = ["/etc/yum.repos.d", "/etc/distro.repos.d"]
+
+REPO_NAMESPACE = "{http://linux.duke.edu/metadata/repo}"
+COMMON_NAMESPACE = "{http://linux.duke.edu/metadata/common}"
+PACKAGE_TAG = f"{COMMON_NAMESPACE}package"
+NAME_TAG = f"{COMMON_NAMESPACE}name"
+ARCH_TAG = f"{COMMON_NAMESPACE}arch"
+VERSION_TAG = f"{COMMON_NAMESPACE}version"
+SUMMARY_TAG = f"{COMMON_NAMESPACE}summary"
+
+
+class UnsupportedMetadataError(Exception):
+    """The metadata is compressed with an algorithm that can't be read"""
+
+
+def find_primary(repo_dir: str) -> Optional[str]:
+    """
+    Finds the primary metadata of a cached repository, from its repomd.xml.
+
+    Parameters:
+        repo_dir (str): The cache directory of the repository.
+
+    Returns:
+        Optional[str]: The primary.xml(.gz|.xz|.bz2|.zst) path, None if not cached.
+    """
+    repomd = os.path.join(repo_dir, "repodata", "repomd.xml")
+    if os.path.exists(repomd):
+        try:
+            root = ElementTree.parse(repomd).getroot()
+            for data in root.iter(f"{REPO_NAMESPACE}data"):
+                if data.get("type") != "primary":
+                    continue
+                location = data.find(f"{REPO_NAMESPACE}location")
+                if location is None:
+                    continue
+                path = os.path.join(repo_dir, location.get("href", ""))
+                if os.path.exists(path):
+                    return path
+        except ElementTree.ParseError as e:
+            logger.debug(f"Can't parse {repomd}: {e}")
+    found = sorted(glob.glob(os.path.join(repo_dir, "repodata", "*primary.xml*")))
+    return found[0] if found else None
+
+
+def get_enabled_repositories(
+    repos_dirs: Optional[List[str]] = None,
+) -> Optional[Set[str]]:
+    """
+    Reads the enabled repository ids from the .repo files, as dnf does.
+
+    Parameters:
+        repos_dirs (List[str], optional): The repository configuration directories.
+            Defaults to REPOS_DIRS.
+
+    Returns:
+        Optional[Set[str]]: The enabled repository ids, None if no .repo file is
+            found and the repositories can't be told apart.
+    """
+    paths = []
+    for repos_dir in repos_dirs if repos_dirs is not None else REPOS_DIRS:
+        paths.extend(sorted(glob.glob(os.path.join(repos_dir, "*.repo"))))
+    if len(paths) == 0:
+        return None
+    enabled = set()
+    for path in paths:
+        parser = configparser.ConfigParser(strict=False, interpolation=None)
+        try:
+            parser.read(path, encoding="utf-8")
+        except (configparser.Error, UnicodeDecodeError) as e:
+            logger.debug(f"Can't parse {path}: {e}")
+            continue
+        for repo in parser.sections():
+            value = parser.get(repo, "enabled", fallback="1").strip().lower()
+            if value in ("1", "true", "yes", "on"):
+                enabled.add(repo)
+            else:
+                enabled.discard(repo)
+    return enabled
+
+
+def find_repositories(
+    cache_dirs: Optional[List[str]] = None, enabled: Optional[Set[str]] = None
+) -> List[Tuple[str, str]]:
+    """
+    Finds the enabled repositories cached by dnf.
+
+    Parameters:
+        cache_dirs (List[str], optional): The dnf cache directories. Defaults to
+            DNF_CACHE_DIRS.
+        enabled (Set[str], optional): The enabled repository ids. Defaults to the
+            ones of get_enabled_repositories.
+
+    Returns:
+        List[Tuple[str, str]]: The repository ids and their primary metadata paths,
+            e.g. `("fedora", "/var/cache/dnf/fedora-5b4b5e7e1c0f6a2f/...")`.
+    """
+    if enabled is None:
+        enabled = get_enabled_repositories()
+    repositories = []
+    for cache_dir in cache_dirs if cache_dirs is not None else DNF_CACHE_DIRS:
+        for repo_dir in sorted(glob.glob(os.path.join(cache_dir, "*", "repodata"))):
+            repo_dir = os.path.dirname(repo_dir)
+            # <repoid>-<hash of the baseurl>
+            repo = os.path.basename(repo_dir).rsplit("-", 1)[0]
+            if enabled is not None and repo not in enabled:
+                logger.debug(f"Skip {repo_dir}, the repository is not enabled")
+                continue
+            primary = find_primary(repo_dir)
+            if primary is None:
+                continue
+            repositories.append((repo, primary))
+    return repositories
+
+
+def open_metadata(path: str) -> IO[bytes]:
+    """
+    Opens a metadata file, decompressing it on the fly.
+
+    Parameters:
+        path (str): The metadata file.
+
+    Returns:
+        IO[bytes]: The XML document.
+
+    Raises:
+        UnsupportedMetadataError: If zstd compressed and zstandard is not installed.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".xz"):
+        return lzma.open(path, "rb")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise UnsupportedMetadataError(
+                f"Install zstandard to read zstd compressed metadata {path}"
+            )
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+    return open(path, "rb")
+
+
+def iter_primary(f: IO[bytes]) -> Iterator[Dict[str, str]]:
+    """
+    Parses a primary.xml incrementally, every `<package>` is dropped once read so the
+    memory used does not grow with the repository.
+
+    Parameters:
+        f (IO[bytes]): The XML document.
+
+    Yields:
+        Dict[str, str]: The name, arch, epoch, version, release and summary of every
+            package.
+    """
+    events = ElementTree.iterparse(f, events=("start", "end"))
+    root = None
+    for event, elem in events:
+        if root is None:
+            root = elem
+        if event != "end" or elem.tag != PACKAGE_TAG:
+            continue
+        version = elem.find(VERSION_TAG)
+        info = {
+            "name": elem.findtext(NAME_TAG, ""),
+            "arch": elem.findtext(ARCH_TAG, ""),
+            "epoch": version.get("epoch", "0") if version is not None else "0",
+            "version": version.get("ver", "") if version is not None else "",
+            "release": version.get("rel", "") if version is not None else "",
+            "summary": elem.findtext(SUMMARY_TAG, ""),
+        }
+        # the parsed packages stay attached to the root otherwise
+        root.clear()
+        if info["arch"] == "src":
+            continue
+        yield info
@@ -0,0 +1,104 @@
+"""
+Version comparison of the rpm family (rpm, pacman), without librpm / libalpm
+"""
+
+from typing import Optional, Tuple
+
+
+def rpmvercmp(a: str, b: str) -> int:
+    """
+    Compares two version strings segment by segment, as rpmvercmp() of rpm and libalpm.
+
+    Parameters:
+        a (str): The first version.
+        b (str): The second version.
+
+    Returns:
+        int: -1, 0 or 1 when a is lower than, equal to or greater than b.
+    """
+    if a == b:
+        return 0
+    i = j = 0
+    # end of the previous segments
+    pi = pj = 0
+    while i < len(a) and j < len(b):
+        while i < len(a) and not a[i].isalnum():
+            i += 1
+        while j < len(b) and not b[j].isalnum():
+            j += 1
+        if i >= len(a) or j >= len(b):
+            break
+        # longer separators win
+        if i - pi != j - pj:
+            return -1 if i - pi < j - pj else 1
+        pi, pj = i, j
+        isnum = a[pi].isdigit()
+        if isnum:
+            while pi < len(a) and a[pi].isdigit():
+                pi += 1
+            while pj < len(b) and b[pj].isdigit():
+                pj += 1
+        else:
+            while pi < len(a) and a[pi].isalpha():
+                pi += 1
+            while pj < len(b) and b[pj].isalpha():
+                pj += 1
+        one, two = a[i:pi], b[j:pj]
+        if two == "":
+            # numeric segments are newer than alpha ones
+            return 1 if isnum else -1
+        if isnum:
+            one, two = one.lstrip("0"), two.lstrip("0")
+            if len(one) != len(two):
+                return -1 if len(one) < len(two) else 1
+        if one != two:
+            return -1 if one < two else 1
+        i, j = pi, pj
+    if i >= len(a) and j >= len(b):
+        return 0
+    # a remaining alpha segment never beats the end of the other version
+    if (i >= len(a) and not b[j].isalpha()) or (i < len(a) and a[i].isalpha()):
+        return -1
+    return 1
+
+
+def split_evr(version: str) -> Tuple[str, str, Optional[str]]:
+    """
+    Splits `[epoch:]version[-release]`.
+
+    Parameters:
+        version (str): The full version.
+
+    Returns:
+        Tuple[str, str, Optional[str]]: The epoch ("0" when missing), the version and
+            the release (None when missing).
+    """
+    epoch, sep, rest = version.partition(":")
+    if not sep or not epoch.isdigit():
+        epoch, rest = "0", version
+    rest, sep, release = rest.rpartition("-")
+    if not sep:
+        return epoch or "0", release, None
+    return epoch or "0", rest, release
+
+
+def vercmp(a: str, b: str) -> int:
+    """
+    Compares two `[epoch:]version[-release]` versions, as alpm_pkg_vercmp() and
+    rpmVersionCompare() do. The releases are only compared when both have one.
+
+    Parameters:
+        a (str): The first version.
+        b (str): The second version.
+
+    Returns:
+        int: -1, 0 or 1 when a is lower than, equal to or greater than b.
+    """
+    if a == b:
+        return 0
+    a_epoch, a_version, a_release = split_evr(a)
+    b_epoch, b_version, b_release = split_evr(b)
+    ret = rpmvercmp(a_epoch, b_epoch) or rpmvercmp(a_version, b_version)
+    if ret == 0 and a_release is not None and b_release is not None:
+        ret = rpmvercmp(a_release, b_release)
+    return ret
@@ -1,18 +1,78 @@
 from tempfile import mkdtemp
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 from venv import logger
-from ..package import History, Package
+from ..package import History, Package, PackageTable, package_matches
 from tinyget.repos.third_party import (
     get_third_party_mirror_template,
     get_third_party_mirrors,
+    get_third_party_packages,
 )
 import os
 
 
+def get_filters(
+    only_installed: bool = False,
+    only_upgradable: bool = False,
+    architecture: Optional[str] = None,
+    repo: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Builds the filters of PackageTable.mask from the list options.
+
+    Returns:
+        Dict[str, Any]: The filters, None for the unfiltered columns.
+    """
+    return {
+        "installed": True if only_installed else None,
+        "upgradable": True if only_upgradable else None,
+        "architecture": architecture,
+        "repo": repo,
+    }
+
+
+def get_third_party_matches(
+    table: PackageTable, filters: Dict[str, Any]
+) -> List[Package]:
+    """
+    Gets the third party packages matching the filters.
+
+    Parameters:
+        table (PackageTable): The packages of the package manager, read lazily by the
+            third party softwares.
+        filters (Dict[str, Any]): The filters, see get_filters.
+
+    Returns:
+        List[Package]: The matching third party packages.
+    """
+    return [
+        p
+        for p in get_third_party_packages(wrapper_softs=table)
+        if package_matches(p, **filters)
+    ]
+
+
 class PackageManagerBase:
     def list(self, enable_third_party: bool) -> List[Package]:
         raise NotImplementedError
 
+    def count_packages(
+        self,
+        only_installed: bool = False,
+        only_upgradable: bool = False,
+        enable_third_party: bool = True,
+        backend: Optional[str] = None,
+        architecture: Optional[str] = None,
+        repo: Optional[str] = None,
+    ) -> int:
+        raise NotImplementedError
+
+    def iter_packages(self, enable_third_party: bool = True) -> Iterator[Package]:
+        """
+        Yields all packages, as soon as each is parsed for the package managers which
+        list them one by one. Defaults to the full listing of list_packages.
+        """
+        yield from self.list_packages(enable_third_party=enable_third_party)
+
     def update(self):
         raise NotImplementedError
 
@@ -34,6 +94,13 @@ class PackageManagerBase:
     def history(self) -> List[History]:
         raise NotImplementedError
 
+    def iter_history(self) -> Iterator[History]:
+        """
+        Yields the history, as soon as each operation is read for the package managers
+        which log them one by one. Defaults to history.
+        """
+        yield from self.history()
+
     def rollback(self, id):
         raise NotImplementedError
 